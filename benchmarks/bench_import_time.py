@@ -0,0 +1,139 @@
+# ./00_html_content_collector/benchmarks/bench_import_time.py
+"""Import-time benchmark for the scraper modules and the CLI.
+
+Each measurement runs in a fresh interpreter with `-X importtime`, so nothing is
+cached between runs. For every module it reports the median cumulative import
+time, which heavy third-party packages got pulled in, and whether importing it
+loaded core_manifest.yaml or started logging threads. `main.py --help` is timed
+end to end as the CLI startup figure.
+
+    python benchmarks/bench_import_time.py --output imports.json
+    python benchmarks/bench_import_time.py --baseline imports.json
+"""
+import os
+import re
+import sys
+import json
+import argparse
+import statistics
+import subprocess
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SOURCE_DIRS = ('config', 'core', 'data', 'logging', 'processing', 'modules')
+
+DEFAULT_MODULES = (
+    'config', 'logger', 'utils', 'link_extractor', 'content_processor', 'webdriver_manager',
+    'proxy_manager', 'scraper', 'scraper_core',
+)
+# Packages that should only be imported when a page is actually rendered or processed
+HEAVY_PACKAGES = ('selenium', 'bs4', 'cairosvg', 'extruct', 'langdetect', 'bleach', 'w3lib', 'dateutil', 'xmltodict', 'yaml', 'lxml')
+
+# Printed by the child after the import; the parent reads it from stdout
+PROBE = """
+import sys, json, threading
+import {module}
+config = sys.modules.get('config')
+print(json.dumps({{
+    'heavy': sorted(name for name in {heavy!r} if name in sys.modules),
+    'manifest_loaded': bool(config is not None and getattr(config, '_manifest', None) is not None),
+    'threads': threading.active_count(),
+}}))
+"""
+
+IMPORTTIME_LINE = re.compile(r'^import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)')
+
+
+def child_env():
+    env = dict(os.environ)
+    paths = [os.path.join(ROOT, subdir) for subdir in SOURCE_DIRS]
+    env['PYTHONPATH'] = os.pathsep.join(paths + ([env['PYTHONPATH']] if env.get('PYTHONPATH') else []))
+    return env
+
+
+def measure_module(module):
+    """Cumulative import time of `module` in microseconds, plus what the import dragged in."""
+    code = PROBE.format(module=module, heavy=HEAVY_PACKAGES)
+    proc = subprocess.run([sys.executable, '-X', 'importtime', '-c', code], cwd=ROOT, env=child_env(),
+                          capture_output=True, text=True)
+    if proc.returncode != 0:
+        raise RuntimeError(f"import {module} failed:\n{proc.stderr[-2000:]}")
+    cumulative = None
+    for line in proc.stderr.splitlines():
+        match = IMPORTTIME_LINE.match(line)
+        # Top-level entries have a single space of indentation
+        if match and match.group(4) == module and len(match.group(3)) == 1:
+            cumulative = int(match.group(2))
+    info = json.loads(proc.stdout.strip().splitlines()[-1])
+    info['cumulative_us'] = cumulative
+    return info
+
+
+def measure_cli():
+    """Wall-clock seconds for `python main.py --help` in a fresh interpreter."""
+    code = (
+        "import time, runpy, sys; start = time.perf_counter(); sys.argv = ['main.py', '--help']\n"
+        "try:\n    runpy.run_path('main.py', run_name='__main__')\n"
+        "except SystemExit:\n    pass\n"
+        "sys.stderr.write('elapsed=%f' % (time.perf_counter() - start))"
+    )
+    proc = subprocess.run([sys.executable, '-c', code], cwd=ROOT, env=child_env(), capture_output=True, text=True)
+    match = re.search(r'elapsed=([\d.]+)', proc.stderr)
+    if match is None:
+        raise RuntimeError(f"main.py --help failed:\n{proc.stderr[-2000:]}")
+    return float(match.group(1))
+
+
+def run(modules, repeat):
+    results = {}
+    for module in modules:
+        samples = [measure_module(module) for _ in range(repeat)]
+        results[module] = {
+            'median_ms': statistics.median(s['cumulative_us'] or 0 for s in samples) / 1000,
+            'heavy': samples[-1]['heavy'],
+            'manifest_loaded': samples[-1]['manifest_loaded'],
+            'threads': samples[-1]['threads'],
+        }
+    cli = statistics.median(measure_cli() for _ in range(repeat))
+    return {'modules': results, 'cli_help_ms': cli * 1000}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure import time of the scraper modules in fresh interpreters")
+    parser.add_argument("modules", nargs='*', default=list(DEFAULT_MODULES))
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--output", default=None, help="Write results JSON here")
+    parser.add_argument("--baseline", default=None, help="Compare against a previous results JSON")
+    args = parser.parse_args()
+
+    result = run(args.modules, args.repeat)
+    baseline = None
+    if args.baseline:
+        with open(args.baseline, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+
+    for module, stats in result['modules'].items():
+        line = f"{module:>18}: {stats['median_ms']:8.1f} ms"
+        old = (baseline or {}).get('modules', {}).get(module)
+        if old and old.get('median_ms'):
+            line += f" (was {old['median_ms']:.1f} ms, {(stats['median_ms'] - old['median_ms']) / old['median_ms'] * 100:+.1f}%)"
+        flags = []
+        if stats['heavy']:
+            flags.append('loads ' + ','.join(stats['heavy']))
+        if stats['manifest_loaded']:
+            flags.append('loads manifest')
+        if stats['threads'] > 1:
+            flags.append(f"{stats['threads'] - 1} extra threads")
+        print(line + (f"  [{'; '.join(flags)}]" if flags else ''))
+    line = f"{'main.py --help':>18}: {result['cli_help_ms']:8.1f} ms"
+    if baseline and baseline.get('cli_help_ms'):
+        line += f" (was {baseline['cli_help_ms']:.1f} ms)"
+    print(line)
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(result, f, indent=2)
+        print(f"\nResults written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+# ./00_html_content_collector/benchmarks/bench_normalize_url.py
+"""Microbenchmark for normalize_url.
+
+Simulates a crawl of link-heavy documentation pages: every page repeats the same
+sidebar links and adds a handful of unique ones. Reports the per-URL cost with
+a cold memo (every URL parsed) and with the memo warm, as in a real crawl.
+
+    python benchmarks/bench_normalize_url.py --pages 500 --sidebar 200 --unique 20
+"""
+import os
+import sys
+import time
+import random
+import argparse
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# utils imports the fetcher (core) and the content fingerprint (config, data) at module level
+for subdir in ('config', 'core', 'data', 'logging', 'processing'):
+    sys.path.insert(0, os.path.join(ROOT, subdir))
+
+from utils import URLNormalizer  # noqa: E402
+
+
+def build_links(pages, sidebar, unique, seed=0):
+    rng = random.Random(seed)
+    sidebar_links = [f"https://docs.example.com/en/stable/guide/section-{i}/?utm_source=nav&b={i}&a=1#top" for i in range(sidebar)]
+    links = []
+    for page in range(pages):
+        links.extend(sidebar_links)
+        for i in range(unique):
+            links.append(f"https://Docs.Example.com:443/en/stable/api/page-{page}/./item-{i}/../item-{i}?sid={rng.random()}&q={i}")
+    return links
+
+
+def run(links, normalizer):
+    start = time.perf_counter()
+    for link in links:
+        normalizer.normalize(link)
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark URL normalization")
+    parser.add_argument("--pages", type=int, default=500)
+    parser.add_argument("--sidebar", type=int, default=200, help="Links repeated on every page")
+    parser.add_argument("--unique", type=int, default=20, help="Links unique to each page")
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    links = build_links(args.pages, args.sidebar, args.unique)
+    distinct = len(set(links))
+
+    cold = URLNormalizer(cache_size=0)
+    warm = URLNormalizer()
+    cold_time = min(run(links, cold) for _ in range(args.repeat))
+    warm_times = []
+    for _ in range(args.repeat):
+        warm.cache_clear()
+        warm_times.append(run(links, warm))
+    warm_time = min(warm_times)
+
+    print(f"links: {len(links)} ({distinct} distinct)")
+    print(f"no memo:   {cold_time / len(links) * 1e6:8.2f} us/url")
+    print(f"with memo: {warm_time / len(links) * 1e6:8.2f} us/url  {warm.cache_info()}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,207 @@
+# ./00_html_content_collector/benchmarks/crawl_benchmark.py
+"""End-to-end crawl benchmark against a local synthetic documentation site.
+
+Modes:
+    crawl     start_scraping_from with the full pipeline (needs Chrome)
+    rendered  fetch_page through Selenium for every page, no processing (needs Chrome)
+    static    requests + clean_and_normalize_content + extract_metadata + extract_links
+
+Results (pages/sec, p50/p99 page latency, requests per page, peak RSS, DB size)
+are written as JSON and optionally compared against a previous result:
+
+    python benchmarks/crawl_benchmark.py --mode static --pages 300 --output bench.json
+    python benchmarks/crawl_benchmark.py --mode static --pages 300 --baseline bench.json
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import platform
+import resource
+import subprocess
+import tempfile
+from collections import deque
+from urllib.parse import urlparse
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+for subdir in ('config', 'core', 'data', 'logging', 'processing', 'modules'):
+    sys.path.insert(0, os.path.join(ROOT, subdir))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from synthetic_site import SiteConfig, SyntheticDocSite  # noqa: E402
+
+DOC_NAME = 'synthetic-bench'
+VERSION = 'bench'
+
+
+def peak_rss_mb():
+    # ru_maxrss is KiB on Linux and bytes on macOS
+    divisor = 1024 * 1024 if sys.platform == 'darwin' else 1024
+    own = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / divisor
+    children = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / divisor
+    return {'self': own, 'children': children}
+
+
+def git_revision():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_crawl(site, args):
+    from scraper_core import start_scraping_from
+    start_scraping_from(site.start_url, DOC_NAME, VERSION, initial_delay=args.initial_delay, max_workers=args.workers)
+
+
+def run_rendered(site, args):
+    from metrics import metrics
+    from scraper import fetch_page, setup_webdriver
+    from webdriver_manager import quit_webdriver
+
+    driver = setup_webdriver(DOC_NAME)
+    try:
+        for index in range(site.config.pages):
+            url = f'{site.base_url}/docs/page-{index}/'
+            with metrics.timed('page'):
+                fetch_page(driver, url)
+            metrics.page_done('rendered')
+    finally:
+        quit_webdriver(driver)
+
+
+def run_static(site, args):
+    import requests
+    from metrics import metrics
+    from content_processor import clean_and_normalize_content, extract_metadata
+    from link_extractor import extract_links
+    from bs4 import BeautifulSoup
+
+    parsed = urlparse(site.start_url)
+    base_domain = parsed.netloc
+    start_path = os.path.dirname(parsed.path)
+    session = requests.Session()
+
+    queue = deque([f'{site.base_url}/docs/page-0/'])
+    seen = set(queue)
+    while queue:
+        url = queue.popleft()
+        with metrics.timed('page'):
+            response = session.get(url, timeout=30)
+            if response.status_code == 429:
+                time.sleep(float(response.headers.get('Retry-After', 1)))
+                queue.append(url)
+                continue
+            response.raise_for_status()
+            cleaned, _ = clean_and_normalize_content(response.text, url)
+            extract_metadata(BeautifulSoup(cleaned, 'html.parser'), url, cleaned)
+            links, pagination_links = extract_links(url, response.text, base_domain, start_path)
+        metrics.page_done('static')
+        for link in links | pagination_links:
+            if link not in seen:
+                seen.add(link)
+                queue.append(link)
+
+
+MODES = {'crawl': run_crawl, 'rendered': run_rendered, 'static': run_static}
+
+
+def compare(result, baseline):
+    rows = []
+    for key, value in result['results'].items():
+        old = baseline.get('results', {}).get(key)
+        if isinstance(value, (int, float)) and isinstance(old, (int, float)) and old:
+            rows.append((key, old, value, (value - old) / old * 100))
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the crawler against a synthetic documentation site")
+    parser.add_argument("--mode", choices=sorted(MODES), default='static')
+    parser.add_argument("--pages", type=int, default=200)
+    parser.add_argument("--links_per_page", type=int, default=20)
+    parser.add_argument("--page_size", type=int, default=20000)
+    parser.add_argument("--svgs_per_page", type=int, default=1)
+    parser.add_argument("--assets_per_page", type=int, default=3)
+    parser.add_argument("--latency_ms", type=float, default=0.0)
+    parser.add_argument("--rate_limit_every", type=int, default=0)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--initial_delay", type=float, default=0.5)
+    parser.add_argument("--output", default=None, help="Write results JSON here")
+    parser.add_argument("--baseline", default=None, help="Compare against a previous results JSON")
+    parser.add_argument("--keep_workdir", action="store_true")
+    args = parser.parse_args()
+
+    config = SiteConfig(
+        pages=args.pages, links_per_page=args.links_per_page, page_size=args.page_size,
+        svgs_per_page=args.svgs_per_page, assets_per_page=args.assets_per_page,
+        latency_ms=args.latency_ms, rate_limit_every=args.rate_limit_every,
+    )
+
+    # The scraper writes scraper_data.db and logs relative to the working directory
+    workdir = tempfile.mkdtemp(prefix='crawl-bench-')
+    original_cwd = os.getcwd()
+    os.chdir(workdir)
+    try:
+        from metrics import metrics
+        metrics.reset()
+        with SyntheticDocSite(config) as site:
+            start = time.perf_counter()
+            MODES[args.mode](site, args)
+            elapsed = time.perf_counter() - start
+            site_stats = site.stats()
+
+        snapshot = metrics.snapshot()
+        page_stats = snapshot['stages'].get('page', {})
+        pages = page_stats.get('count', 0)
+        db_path = os.path.join(workdir, 'scraper_data.db')
+        rss = peak_rss_mb()
+        result = {
+            'mode': args.mode,
+            'site': config.to_dict(),
+            'environment': {
+                'python': platform.python_version(),
+                'platform': platform.platform(),
+                'git_revision': git_revision(),
+                'timestamp': time.time(),
+            },
+            'results': {
+                'elapsed_seconds': elapsed,
+                'pages': pages,
+                'pages_per_second': pages / elapsed if elapsed else 0,
+                'p50_page_seconds': page_stats.get('p50_seconds'),
+                'p99_page_seconds': page_stats.get('p99_seconds'),
+                'requests': site_stats['total_requests'],
+                'requests_per_page': site_stats['total_requests'] / pages if pages else None,
+                'peak_rss_mb': rss['self'],
+                'peak_children_rss_mb': rss['children'],
+                'db_size_bytes': os.path.getsize(db_path) if os.path.exists(db_path) else 0,
+            },
+            'requests_by_kind': site_stats['by_kind'],
+            'stages': snapshot['stages'],
+        }
+    finally:
+        os.chdir(original_cwd)
+        if not args.keep_workdir:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    for key, value in result['results'].items():
+        print(f"{key:>22}: {value:.4f}" if isinstance(value, float) else f"{key:>22}: {value}")
+
+    if args.baseline:
+        with open(args.baseline, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+        print(f"\nCompared with {args.baseline} ({baseline.get('environment', {}).get('git_revision')}):")
+        for key, old, new, change in compare(result, baseline):
+            print(f"{key:>22}: {old:12.4f} -> {new:12.4f} ({change:+.1f}%)")
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(result, f, indent=2)
+        print(f"\nResults written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
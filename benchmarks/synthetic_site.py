@@ -0,0 +1,214 @@
+# ./00_html_content_collector/benchmarks/synthetic_site.py
+"""A local HTTP server serving a generated documentation site for benchmarks.
+
+Pages live under /docs/page-<n>/ and link to each other deterministically, so
+every run with the same SiteConfig sees the same site. Latency and 429
+responses can be injected to exercise the rate limiter and retry paths.
+"""
+import random
+import threading
+import time
+import zlib
+from collections import Counter
+from dataclasses import dataclass, asdict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+FILLER_WORDS = (
+    "configure", "parameter", "returns", "example", "module", "function", "default",
+    "value", "option", "request", "response", "version", "deprecated", "argument",
+)
+
+
+@dataclass
+class SiteConfig:
+    pages: int = 200
+    links_per_page: int = 20
+    page_size: int = 20000  # approximate bytes of body text per page
+    svgs_per_page: int = 1
+    assets_per_page: int = 3  # stylesheets, scripts and images each
+    latency_ms: float = 0.0
+    rate_limit_every: int = 0  # answer every Nth request with 429; 0 disables
+    seed: int = 42
+
+    def to_dict(self):
+        return asdict(self)
+
+
+def _svg(index):
+    return (
+        f'<svg xmlns="http://www.w3.org/2000/svg" width="120" height="60">'
+        f'<rect width="120" height="60" fill="#ddd"/><text x="10" y="35">Diagram {index}</text></svg>'
+    )
+
+
+def build_page(config, index):
+    rng = random.Random(config.seed * 100003 + index)
+    links = sorted({rng.randrange(config.pages) for _ in range(config.links_per_page)})
+    nav = ''.join(f'<li><a href="/docs/page-{n}/">Page {n}</a></li>' for n in links)
+
+    paragraphs = []
+    size = 0
+    while size < config.page_size:
+        text = ' '.join(rng.choice(FILLER_WORDS) for _ in range(60))
+        paragraphs.append(f'<p>{text}</p>')
+        size += len(text) + 7
+    svgs = ''.join(_svg(i) for i in range(config.svgs_per_page))
+
+    assets = config.assets_per_page
+    head_assets = ''.join(f'<link rel="stylesheet" href="/docs/assets/style-{i}.css">' for i in range(assets))
+    scripts = ''.join(f'<script src="/docs/assets/script-{i}.js"></script>' for i in range(assets))
+    images = ''.join(f'<img src="/docs/assets/image-{i}.png" alt="">' for i in range(assets))
+
+    pagination = ''
+    if index + 1 < config.pages:
+        pagination = f'<a href="/docs/page-{index + 1}/">Next</a>'
+
+    return (
+        f'<!DOCTYPE html><html lang="en"><head><meta charset="utf-8">'
+        f'<title>Page {index}</title><meta name="description" content="Synthetic page {index}">'
+        f'<link rel="canonical" href="/docs/page-{index}/">{head_assets}</head>'
+        f'<body><nav><ul>{nav}</ul></nav><main><h1>Page {index}</h1>'
+        f'{"".join(paragraphs)}{svgs}{images}<pre><code>print({index})</code></pre>{pagination}</main>'
+        f'{scripts}</body></html>'
+    )
+
+
+def build_sitemap(base_url, config):
+    entries = ''.join(
+        f'<url><loc>{base_url}/docs/page-{i}/</loc><lastmod>2024-01-01</lastmod></url>'
+        for i in range(config.pages)
+    )
+    return f'<?xml version="1.0" encoding="UTF-8"?><urlset xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">{entries}</urlset>'
+
+
+# 1x1 transparent PNG
+PNG_BYTES = bytes.fromhex(
+    '89504e470d0a1a0a0000000d4948445200000001000000010806000000'
+    '1f15c4890000000d49444154789c6360000002000100e221bc330000000049454e44ae426082'
+)
+
+
+class SyntheticDocSite:
+    def __init__(self, config=None, host='127.0.0.1', port=0):
+        self.config = config or SiteConfig()
+        self.host = host
+        self.port = port
+        self.requests = Counter()
+        self.lock = threading.Lock()
+        self.request_count = 0
+        self.server = None
+        self._page_cache = {}
+
+    @property
+    def base_url(self):
+        return f'http://{self.host}:{self.server.server_port}'
+
+    @property
+    def start_url(self):
+        return f'{self.base_url}/docs/index.html'
+
+    def _route(self, path):
+        path = path.split('?', 1)[0].split('#', 1)[0]
+        if path in ('/docs/index.html', '/docs/', '/docs'):
+            return 'page', 'text/html; charset=utf-8', self._page(0)
+        if path.startswith('/docs/page-'):
+            try:
+                index = int(path[len('/docs/page-'):].strip('/'))
+            except ValueError:
+                return None
+            if 0 <= index < self.config.pages:
+                return 'page', 'text/html; charset=utf-8', self._page(index)
+            return None
+        if path == '/docs/sitemap.xml':
+            return 'sitemap', 'application/xml', build_sitemap(self.base_url, self.config).encode('utf-8')
+        if path.startswith('/docs/assets/'):
+            name = path.rsplit('/', 1)[-1]
+            if name.endswith('.css'):
+                return 'asset', 'text/css', b'body { font-family: sans-serif; }\n' * 20
+            if name.endswith('.js'):
+                return 'asset', 'application/javascript', b'console.log("synthetic");\n' * 20
+            if name.endswith('.png'):
+                return 'asset', 'image/png', PNG_BYTES
+        return None
+
+    def _page(self, index):
+        page = self._page_cache.get(index)
+        if page is None:
+            page = self._page_cache[index] = build_page(self.config, index).encode('utf-8')
+        return page
+
+    def _make_handler(self):
+        site = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def _serve(self, include_body):
+                with site.lock:
+                    site.request_count += 1
+                    count = site.request_count
+                if site.config.latency_ms:
+                    time.sleep(site.config.latency_ms / 1000.0)
+
+                every = site.config.rate_limit_every
+                if every and count % every == 0:
+                    with site.lock:
+                        site.requests['429'] += 1
+                    self.send_response(429)
+                    self.send_header('Retry-After', '1')
+                    self.send_header('Content-Length', '0')
+                    self.end_headers()
+                    return
+
+                route = site._route(self.path)
+                if route is None:
+                    with site.lock:
+                        site.requests['404'] += 1
+                    self.send_response(404)
+                    self.send_header('Content-Length', '0')
+                    self.end_headers()
+                    return
+
+                kind, content_type, body = route
+                with site.lock:
+                    site.requests[f'{self.command} {kind}'] += 1
+                self.send_response(200)
+                self.send_header('Content-Type', content_type)
+                self.send_header('Content-Length', str(len(body)))
+                self.send_header('Last-Modified', 'Mon, 01 Jan 2024 00:00:00 GMT')
+                self.send_header('ETag', f'"{zlib.crc32(body):08x}"')
+                self.end_headers()
+                if include_body:
+                    self.wfile.write(body)
+
+            def do_GET(self):
+                self._serve(True)
+
+            def do_HEAD(self):
+                self._serve(False)
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+    def start(self):
+        self.server = ThreadingHTTPServer((self.host, self.port), self._make_handler())
+        self.server.daemon_threads = True
+        threading.Thread(target=self.server.serve_forever, name='synthetic-site', daemon=True).start()
+        return self
+
+    def stop(self):
+        if self.server is not None:
+            self.server.shutdown()
+            self.server.server_close()
+
+    def stats(self):
+        with self.lock:
+            return {'total_requests': self.request_count, 'by_kind': dict(self.requests)}
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
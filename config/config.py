@@ -1,21 +1,37 @@
 # ./00_html_content_collector/config.py
-import yaml
 import os
 import logging
+import threading
 from custom_exceptions import ConfigurationError
 
 logger = logging.getLogger(__name__)
 
-def load_manifest():
+# MANIFEST, PROJECT_NAME and OUTPUT_DIR are resolved on first access (see __getattr__),
+# so importing this module does not parse YAML or touch the filesystem
+DEFAULT_PROJECT_NAME = "00_html_content_collector"
+DEFAULT_OUTPUT_DIR = '~/tradeInsightDataSet/raw/docs'
+
+_manifest = None
+_output_dir = None
+_load_lock = threading.Lock()
+
+
+def get_manifest_path():
     parent_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
-    manifest_path = os.path.join(parent_dir, 'core_manifest.yaml')
+    return os.path.join(parent_dir, 'core_manifest.yaml')
+
+
+def load_manifest():
+    import yaml
+
+    manifest_path = get_manifest_path()
     try:
         with open(manifest_path, 'r') as f:
             manifest = yaml.safe_load(f)
         logger.info("Successfully loaded core_manifest.yaml")
         return manifest
     except FileNotFoundError:
-        error_msg = f"core_manifest.yaml not found in {parent_dir}"
+        error_msg = f"core_manifest.yaml not found in {os.path.dirname(manifest_path)}"
         logger.error(error_msg)
         raise ConfigurationError(error_msg)
     except yaml.YAMLError as e:
@@ -28,43 +44,62 @@ def load_manifest():
         raise ConfigurationError(error_msg)
 
 
-try:
-    MANIFEST = load_manifest()
-    logger.info("Manifest loaded successfully")
-except ConfigurationError as e:
-    logger.critical(f"Failed to load manifest: {str(e)}")
-    raise
-
-# Add any project-specific configurations here
-PROJECT_NAME = MANIFEST.get('project_name', "00_html_content_collector")
-OUTPUT_DIR = os.path.expanduser(MANIFEST.get('dataset_structure', {}).get('base_dir', '~/tradeInsightDataSet/raw/docs'))
-
-# Validate crucial configuration
-if not os.path.exists(OUTPUT_DIR):
-    try:
-        os.makedirs(OUTPUT_DIR)
-        logger.info(f"Created OUTPUT_DIR: {OUTPUT_DIR}")
-    except OSError as e:
-        error_msg = f"Failed to create OUTPUT_DIR {OUTPUT_DIR}: {str(e)}"
-        logger.critical(error_msg)
-        raise ConfigurationError(error_msg)
-
 # You can add more configuration validations here
-def validate_config():
-    if not MANIFEST:
+def validate_config(manifest):
+    if not manifest:
         raise ConfigurationError("MANIFEST is empty or not properly loaded")
-    if not PROJECT_NAME:
+    if not manifest.get('project_name', DEFAULT_PROJECT_NAME):
         raise ConfigurationError("PROJECT_NAME is not set")
-    if not OUTPUT_DIR:
+    if not manifest.get('dataset_structure', {}).get('base_dir', DEFAULT_OUTPUT_DIR):
         raise ConfigurationError("OUTPUT_DIR is not set")
     # Add more validations as needed
 
 
-try:
-    validate_config()
-    logger.info("Configuration validated successfully")
-except ConfigurationError as e:
-    logger.critical(f"Configuration validation failed: {str(e)}")
-    raise
+def get_manifest():
+    """Load and validate core_manifest.yaml once, on first use."""
+    global _manifest
+    if _manifest is None:
+        with _load_lock:
+            if _manifest is None:
+                try:
+                    manifest = load_manifest()
+                    validate_config(manifest)
+                except ConfigurationError as e:
+                    logger.critical(f"Failed to load configuration: {str(e)}")
+                    raise
+                logger.info("Configuration loaded and validated successfully")
+                _manifest = manifest
+    return _manifest
+
+
+def get_project_name():
+    return get_manifest().get('project_name', DEFAULT_PROJECT_NAME)
+
+
+def get_output_dir():
+    """OUTPUT_DIR from the manifest, created the first time it is asked for."""
+    global _output_dir
+    if _output_dir is None:
+        output_dir = os.path.expanduser(get_manifest().get('dataset_structure', {}).get('base_dir', DEFAULT_OUTPUT_DIR))
+        try:
+            os.makedirs(output_dir, exist_ok=True)
+        except OSError as e:
+            error_msg = f"Failed to create OUTPUT_DIR {output_dir}: {str(e)}"
+            logger.critical(error_msg)
+            raise ConfigurationError(error_msg)
+        _output_dir = output_dir
+    return _output_dir
+
+
+_LAZY_SETTINGS = {
+    'MANIFEST': get_manifest,
+    'PROJECT_NAME': get_project_name,
+    'OUTPUT_DIR': get_output_dir,
+}
+
 
-logger.info("Configuration loaded and validated successfully")
+def __getattr__(name):
+    # `from config import OUTPUT_DIR` still works; it just loads the manifest at that point
+    if name in _LAZY_SETTINGS:
+        return _LAZY_SETTINGS[name]()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
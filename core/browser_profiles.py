@@ -0,0 +1,244 @@
+# ./00_html_content_collector/browser_profiles.py
+import os
+import re
+import time
+import shutil
+import threading
+from logger import setup_logging, log_error, log_info, log_warning, log_debug
+
+try:
+    import fcntl
+except ImportError:  # Windows; slots are then only guarded within this process
+    fcntl = None
+
+# Initialize loggers
+loggers = setup_logging(output_dir='logs', doc_name='browser_profiles', version='v1')
+
+# The parts of a Chrome user-data-dir that are kept between uses
+CACHE_SUBDIRS = (os.path.join('Default', 'Cache'), os.path.join('Default', 'Code Cache'))
+# Left behind by a Chrome that did not shut down cleanly; they make the next launch refuse the profile
+CHROME_SINGLETON_FILES = ('SingletonLock', 'SingletonSocket', 'SingletonCookie')
+
+_UNSAFE_DIRNAME_CHARS = re.compile(r'[^A-Za-z0-9._-]+')
+
+
+def _directory_size(path):
+    total = 0
+    for dirpath, _dirnames, filenames in os.walk(path):
+        for filename in filenames:
+            try:
+                total += os.lstat(os.path.join(dirpath, filename)).st_size
+            except OSError:
+                pass
+    return total
+
+
+class ProfileLease:
+    """Exclusive use of one profile slot until release() is called."""
+
+    def __init__(self, manager, doc_name, path, lock_handle):
+        self.manager = manager
+        self.doc_name = doc_name
+        self.path = path
+        self.lock_handle = lock_handle
+        self.released = False
+
+    def release(self):
+        if not self.released:
+            self.released = True
+            self.manager._release(self)
+
+
+class BrowserProfileManager:
+    """Persistent Chrome profiles per documentation source, so repeat renders hit Chrome's disk cache.
+
+    A user-data-dir can only be used by one Chrome at a time, so each source gets
+    a pool of slot directories, each guarded by a flock'd lock file that the OS
+    releases if the crawler dies. A new slot is seeded with the cache of the most
+    recently used one. Only the HTTP and code caches survive between uses; cookies
+    and storage are wiped when a slot is acquired. Idle slots are evicted, least
+    recently used first, while a source's slots exceed max_size_bytes.
+    """
+
+    def __init__(self, root=None, max_size_bytes=2 * 1024 ** 3, slot_cache_bytes=512 * 1024 ** 2,
+                 cleanup_interval=60, enabled=False):
+        self.root = root
+        self.max_size_bytes = max_size_bytes
+        self.slot_cache_bytes = slot_cache_bytes
+        self.cleanup_interval = cleanup_interval
+        self.enabled = enabled
+        self.lock = threading.Lock()
+        self.held = set()
+        self.last_cleanup = {}
+
+    def enable(self, root, max_size_bytes=None):
+        self.root = root
+        if max_size_bytes is not None:
+            self.max_size_bytes = max_size_bytes
+            self.slot_cache_bytes = min(self.slot_cache_bytes, max_size_bytes)
+        self.enabled = True
+        log_info(loggers, f"Persistent browser cache enabled in {root} (limit {self.max_size_bytes // 1024 ** 2} MiB per source)")
+
+    def source_dir(self, doc_name):
+        return os.path.join(self.root, _UNSAFE_DIRNAME_CHARS.sub('_', doc_name or 'default'))
+
+    def chrome_arguments(self, lease):
+        return [f'--user-data-dir={lease.path}', f'--disk-cache-size={self.slot_cache_bytes}']
+
+    def _slots(self, source_dir):
+        return sorted(
+            name for name in os.listdir(source_dir)
+            if name.startswith('slot-') and os.path.isdir(os.path.join(source_dir, name))
+        )
+
+    def _try_lock(self, path):
+        lock_path = path + '.lock'
+        if path in self.held:
+            return None
+        handle = open(lock_path, 'a+')
+        if fcntl is not None:
+            try:
+                fcntl.flock(handle.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                handle.close()
+                return None
+        # Eviction deletes the slot and its lock file while holding the lock; a lock taken on
+        # the deleted file, or on a new one next to a deleted slot, guards nothing
+        try:
+            stale = os.stat(lock_path).st_ino != os.fstat(handle.fileno()).st_ino
+        except FileNotFoundError:
+            stale = True
+        if not stale and not os.path.isdir(path):
+            # open() recreated the lock file of an evicted slot
+            os.remove(lock_path)
+            stale = True
+        if stale:
+            if fcntl is not None:
+                fcntl.flock(handle.fileno(), fcntl.LOCK_UN)
+            handle.close()
+            return None
+        self.held.add(path)
+        return handle
+
+    def _unlock(self, path, handle):
+        self.held.discard(path)
+        if fcntl is not None:
+            fcntl.flock(handle.fileno(), fcntl.LOCK_UN)
+        handle.close()
+
+    def _last_used(self, path):
+        try:
+            return os.path.getmtime(path + '.lock')
+        except OSError:
+            return 0
+
+    def acquire(self, doc_name=None):
+        source_dir = self.source_dir(doc_name)
+        os.makedirs(source_dir, exist_ok=True)
+        with self.lock:
+            slots = self._slots(source_dir)
+            # Prefer the warmest idle slot
+            for name in sorted(slots, key=lambda name: self._last_used(os.path.join(source_dir, name)), reverse=True):
+                path = os.path.join(source_dir, name)
+                handle = self._try_lock(path)
+                if handle is not None:
+                    break
+            else:
+                path, handle = self._create_slot(source_dir, slots)
+
+        self._strip_profile(path)
+        log_debug(loggers, f"Acquired browser profile {path}")
+        return ProfileLease(self, doc_name, path, handle)
+
+    def _create_slot(self, source_dir, slots):
+        taken = {int(name.split('-', 1)[1]) for name in slots if name.split('-', 1)[1].isdigit()}
+        index = 0
+        while True:
+            if index not in taken:
+                path = os.path.join(source_dir, f'slot-{index}')
+                os.makedirs(path, exist_ok=True)
+                handle = self._try_lock(path)
+                if handle is not None:
+                    break
+                # Another crawler created and locked this slot since _slots() listed the directory
+            index += 1
+
+        # Seed from the most recently used slot; Chrome discards any entries copied mid-write
+        if slots:
+            seed = max((os.path.join(source_dir, name) for name in slots), key=self._last_used)
+            for subdir in CACHE_SUBDIRS:
+                source = os.path.join(seed, subdir)
+                if os.path.isdir(source):
+                    try:
+                        shutil.copytree(source, os.path.join(path, subdir), dirs_exist_ok=True)
+                    except (OSError, shutil.Error) as e:
+                        log_warning(loggers, f"Could not seed {path} from {seed}: {str(e)}")
+            log_info(loggers, f"Created browser profile {path} seeded from {seed}")
+        else:
+            log_info(loggers, f"Created browser profile {path}")
+        return path, handle
+
+    def _strip_profile(self, path):
+        """Remove everything but the caches, so cookies and storage never leak between runs."""
+        keep_default = {os.path.basename(subdir) for subdir in CACHE_SUBDIRS}
+        for name in os.listdir(path):
+            if name == 'Default':
+                default_dir = os.path.join(path, name)
+                for entry in os.listdir(default_dir):
+                    if entry not in keep_default:
+                        self._remove(os.path.join(default_dir, entry))
+            else:
+                self._remove(os.path.join(path, name))
+
+    @staticmethod
+    def _remove(path):
+        try:
+            if os.path.isdir(path) and not os.path.islink(path):
+                shutil.rmtree(path)
+            else:
+                os.remove(path)
+        except OSError as e:
+            log_warning(loggers, f"Could not remove {path}: {str(e)}")
+
+    def _release(self, lease):
+        with self.lock:
+            try:
+                os.utime(lease.path + '.lock')
+            except OSError:
+                pass
+            self._unlock(lease.path, lease.lock_handle)
+        self.cleanup(lease.doc_name)
+
+    def cleanup(self, doc_name=None, force=False):
+        """Delete idle slots, least recently used first, until the source fits in max_size_bytes."""
+        source_dir = self.source_dir(doc_name)
+        now = time.monotonic()
+        if not force and now - self.last_cleanup.get(source_dir, float('-inf')) < self.cleanup_interval:
+            return
+        self.last_cleanup[source_dir] = now
+        if not os.path.isdir(source_dir):
+            return
+
+        with self.lock:
+            paths = [os.path.join(source_dir, name) for name in self._slots(source_dir)]
+            sizes = {path: _directory_size(path) for path in paths}
+            total = sum(sizes.values())
+            for path in sorted(paths, key=self._last_used):
+                if total <= self.max_size_bytes:
+                    break
+                handle = self._try_lock(path)
+                if handle is None:
+                    continue  # in use
+                try:
+                    shutil.rmtree(path, ignore_errors=True)
+                    os.remove(path + '.lock')
+                    total -= sizes[path]
+                    log_info(loggers, f"Evicted browser profile {path} ({sizes[path] // 1024 ** 2} MiB)")
+                except OSError as e:
+                    log_error(loggers, f"Failed to evict browser profile {path}: {str(e)}")
+                finally:
+                    self._unlock(path, handle)
+
+
+# Shared instance used by setup_webdriver and the CDP renderer
+browser_profiles = BrowserProfileManager()
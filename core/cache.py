@@ -0,0 +1,153 @@
+# ./00_html_content_collector/cache.py
+import time
+import threading
+from functools import wraps
+from collections import OrderedDict
+from metrics import metrics
+from logger import setup_logging, log_info
+
+# Initialize loggers
+loggers = setup_logging(output_dir='logs', doc_name='cache', version='v1')
+
+_MISSING = object()
+
+
+class TTLCache:
+    """Thread-safe LRU cache with an optional time to live and hit/miss/eviction counters.
+
+    None is a value like any other, so "not stored yet" results are cached too;
+    writers call invalidate() (or put()) for the keys they change.
+    """
+
+    def __init__(self, name, max_entries=1024, ttl=None):
+        self.name = name
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.lock = threading.Lock()
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def _lookup(self, key):
+        entry = self.entries.get(key)
+        if entry is None:
+            return _MISSING
+        value, expires_at = entry
+        if expires_at is not None and expires_at <= time.monotonic():
+            del self.entries[key]
+            self.expirations += 1
+            return _MISSING
+        self.entries.move_to_end(key)
+        return value
+
+    def get(self, key, default=None):
+        with self.lock:
+            value = self._lookup(key)
+            if value is _MISSING:
+                self.misses += 1
+                return default
+            self.hits += 1
+            return value
+
+    def put(self, key, value):
+        expires_at = time.monotonic() + self.ttl if self.ttl is not None else None
+        with self.lock:
+            self.entries[key] = (value, expires_at)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+                self.evictions += 1
+
+    def get_or_load(self, key, loader):
+        """The cached value, or loader() stored under key. Loads run outside the lock; a race loads twice."""
+        with self.lock:
+            value = self._lookup(key)
+            if value is not _MISSING:
+                self.hits += 1
+                return value
+            self.misses += 1
+        value = loader()
+        self.put(key, value)
+        return value
+
+    def invalidate(self, key=_MISSING):
+        """Drop one key, or everything when called without one."""
+        with self.lock:
+            if key is _MISSING:
+                self.entries.clear()
+            else:
+                self.entries.pop(key, None)
+
+    def stats(self):
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self.entries),
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'expirations': self.expirations,
+                'hit_rate': self.hits / lookups if lookups else None,
+            }
+
+
+class CacheRegistry:
+    """Named caches, so writers can invalidate a cache without importing the module that owns it."""
+
+    def __init__(self):
+        self.caches = {}
+        self.lock = threading.Lock()
+
+    def create(self, name, max_entries=1024, ttl=None):
+        with self.lock:
+            cache = self.caches.get(name)
+        return cache if cache is not None else self.register(name, TTLCache(name, max_entries, ttl))
+
+    def register(self, name, cache):
+        """Add any object with invalidate(key=...) and stats(), e.g. a preloaded index."""
+        with self.lock:
+            self.caches[name] = cache
+        for counter in ('hits', 'misses', 'evictions', 'entries'):
+            metrics.register_gauge(f'cache_{name}_{counter}', lambda counter=counter: cache.stats()[counter])
+        return cache
+
+    def invalidate(self, name, key=_MISSING):
+        cache = self.caches.get(name)
+        if cache is None:
+            return
+        if key is _MISSING:
+            cache.invalidate()
+        else:
+            cache.invalidate(key)
+
+    def clear(self):
+        for cache in list(self.caches.values()):
+            cache.invalidate()
+
+    def stats(self):
+        return {name: cache.stats() for name, cache in list(self.caches.items())}
+
+    def log_stats(self):
+        for name, stats in sorted(self.stats().items()):
+            if stats['hits'] or stats['misses']:
+                log_info(loggers, f"Cache {name}: {stats['hits']} hits, {stats['misses']} misses, "
+                                  f"{stats['evictions']} evicted, {stats['expirations']} expired, {stats['entries']} entries")
+
+
+caches = CacheRegistry()
+
+
+def cached(name, max_entries=1024, ttl=None):
+    """Cache a function's results in the named cache; a single argument is used as the key directly."""
+    def decorator(func):
+        cache = caches.create(name, max_entries, ttl)
+
+        @wraps(func)
+        def wrapper(*args):
+            key = args[0] if len(args) == 1 else args
+            return cache.get_or_load(key, lambda: func(*args))
+        wrapper.cache = cache
+        return wrapper
+    return decorator
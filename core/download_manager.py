@@ -0,0 +1,280 @@
+# ./00_html_content_collector/download_manager.py
+import os
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+from requests.exceptions import RequestException
+from custom_exceptions import NetworkError
+from fetcher import fetcher
+from logger import setup_logging, log_error, log_info, log_warning, log_debug
+
+try:
+    import fcntl
+except ImportError:  # Windows; partial files are then only guarded within this process
+    fcntl = None
+
+# Initialize loggers
+loggers = setup_logging(output_dir='logs', doc_name='download_manager', version='v1')
+
+DEFAULT_CHUNK_SIZE = 64 * 1024
+PARTIAL_SUFFIX = '.part'
+LOCK_SUFFIX = '.lock'
+
+
+def private_temp_path(save_path):
+    """A temp file next to save_path that no other thread or process writes to."""
+    return f'{save_path}.{os.getpid()}.{threading.get_ident()}.tmp'
+
+
+def write_file_atomic(save_path, body):
+    temp_path = private_temp_path(save_path)
+    try:
+        with open(temp_path, 'wb') as f:
+            f.write(body)
+        os.replace(temp_path, save_path)
+    finally:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+
+
+class ResponseStore:
+    """Response bodies the browser already downloaded, keyed by URL.
+
+    fetch_page fills it from Network.getResponseBody when enabled; download_asset
+    and download_media_file write from it instead of fetching the URL again.
+    Bounded by total bytes with least-recently-used eviction, since bundles shared
+    by every page of a site are looked up over and over.
+    """
+
+    def __init__(self, max_bytes=256 * 1024 * 1024, max_body_bytes=20 * 1024 * 1024, enabled=False):
+        self.max_bytes = max_bytes
+        self.max_body_bytes = max_body_bytes
+        self.enabled = enabled
+        self.entries = OrderedDict()
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+    def enable(self):
+        self.enabled = True
+        log_info(loggers, f"Reusing browser-captured responses (up to {self.max_bytes // (1024 * 1024)} MiB in memory)")
+
+    def put(self, url, body, content_type=''):
+        if not self.enabled or len(body) > self.max_body_bytes:
+            return
+        with self.lock:
+            previous = self.entries.pop(url, None)
+            if previous is not None:
+                self.size -= len(previous[0])
+            self.entries[url] = (body, content_type)
+            self.size += len(body)
+            while self.size > self.max_bytes and self.entries:
+                _, (evicted, _) = self.entries.popitem(last=False)
+                self.size -= len(evicted)
+
+    def get(self, url):
+        with self.lock:
+            entry = self.entries.get(url)
+            if entry is None:
+                self.misses += 1
+                return None
+            self.entries.move_to_end(url)
+            self.hits += 1
+            return entry
+
+    def save(self, url, save_path, entry=None):
+        """Write a captured body to save_path; returns stream_download's result dict, or None if not captured."""
+        if entry is None and self.enabled:
+            entry = self.get(url)
+        if entry is None:
+            return None
+        body, content_type = entry
+        os.makedirs(os.path.dirname(save_path) or '.', exist_ok=True)
+        write_file_atomic(save_path, body)
+        log_debug(loggers, f"Saved {url} to {save_path} from the browser capture ({len(body)} bytes)")
+        return {
+            'path': save_path,
+            'size': len(body),
+            'sha256': hashlib.sha256(body).hexdigest(),
+            'content_type': content_type,
+        }
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.size = 0
+
+
+# Shared instance filled by the renderers
+response_store = ResponseStore()
+
+
+_held_partials = set()
+_held_partials_lock = threading.Lock()
+
+
+def _claim_partial(partial_path):
+    """Lock partial_path for this download; returns the lock handle, or None if another download holds it."""
+    with _held_partials_lock:
+        if partial_path in _held_partials:
+            return None
+        handle = open(partial_path + LOCK_SUFFIX, 'a+')
+        if fcntl is not None:
+            try:
+                fcntl.flock(handle.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                handle.close()
+                return None
+            try:
+                # The previous owner removes the lock file before unlocking; a lock on a removed file guards nothing
+                if os.stat(partial_path + LOCK_SUFFIX).st_ino != os.fstat(handle.fileno()).st_ino:
+                    raise FileNotFoundError(partial_path + LOCK_SUFFIX)
+            except FileNotFoundError:
+                fcntl.flock(handle.fileno(), fcntl.LOCK_UN)
+                handle.close()
+                return None
+        _held_partials.add(partial_path)
+        return handle
+
+
+def _release_partial(partial_path, handle):
+    with _held_partials_lock:
+        _held_partials.discard(partial_path)
+        try:
+            os.remove(partial_path + LOCK_SUFFIX)
+        except OSError:
+            pass
+        if fcntl is not None:
+            fcntl.flock(handle.fileno(), fcntl.LOCK_UN)
+        handle.close()
+
+
+def _hash_existing_partial(partial_path, hasher, chunk_size):
+    """Feed the bytes already on disk into the hasher and return their count."""
+    size = 0
+    with open(partial_path, 'rb') as f:
+        while True:
+            chunk = f.read(chunk_size)
+            if not chunk:
+                break
+            hasher.update(chunk)
+            size += len(chunk)
+    return size
+
+
+def _expected_total_length(response, offset):
+    """Work out the full file size from a 200 or 206 response, or None if unknown."""
+    content_range = response.headers.get('Content-Range')
+    if response.status_code == 206 and content_range and '/' in content_range:
+        total = content_range.rsplit('/', 1)[1]
+        if total.isdigit():
+            return int(total)
+    content_length = response.headers.get('Content-Length')
+    if content_length and content_length.isdigit():
+        return int(content_length) + (offset if response.status_code == 206 else 0)
+    return None
+
+
+def stream_download(url, save_path, session=None, chunk_size=DEFAULT_CHUNK_SIZE, max_retries=3,
+                    timeout=30, headers=None, proxies=None):
+    """Download url to save_path with bounded memory.
+
+    The body is streamed into `save_path + '.part'` in chunk_size pieces while the
+    SHA-256 is computed on the fly. If the partial file is left over from an earlier
+    attempt, the transfer resumes with an HTTP Range request. The length is checked
+    against the server's declared size before the file is atomically moved into place.
+    Only the download holding the partial file's lock writes or resumes it; a
+    concurrent download of the same path streams into a private temp file instead.
+
+    Returns a dict with 'path', 'size', 'sha256' and 'content_type'.
+    """
+    http = session or fetcher.session()
+    os.makedirs(os.path.dirname(save_path) or '.', exist_ok=True)
+    claim = _claim_partial(save_path + PARTIAL_SUFFIX)
+    if claim is not None:
+        partial_path = save_path + PARTIAL_SUFFIX
+    else:
+        log_debug(loggers, f"Another download of {save_path} is in progress, downloading {url} separately")
+        partial_path = private_temp_path(save_path)
+    try:
+        return _stream_to(http, url, save_path, partial_path, chunk_size, max_retries, timeout, headers, proxies)
+    finally:
+        if claim is not None:
+            _release_partial(save_path + PARTIAL_SUFFIX, claim)
+        elif os.path.exists(partial_path):
+            os.remove(partial_path)
+
+
+def _stream_to(http, url, save_path, partial_path, chunk_size, max_retries, timeout, headers, proxies):
+    attempt = 0
+    while True:
+        hasher = hashlib.sha256()
+        offset = 0
+        if os.path.exists(partial_path):
+            offset = _hash_existing_partial(partial_path, hasher, chunk_size)
+
+        request_headers = dict(headers or {})
+        # Compressed transfer would make byte offsets and Content-Length meaningless
+        request_headers['Accept-Encoding'] = 'identity'
+        if offset:
+            request_headers['Range'] = f'bytes={offset}-'
+
+        try:
+            with http.get(url, stream=True, timeout=timeout, headers=request_headers, proxies=proxies) as response:
+                if response.status_code == 416 and offset:
+                    # Our partial file is already complete (or the server disagrees); start over
+                    log_warning(loggers, f"Range not satisfiable for {url}, restarting download")
+                    os.remove(partial_path)
+                    continue
+                response.raise_for_status()
+
+                if offset and response.status_code != 206:
+                    # Server ignored the Range header and is sending the whole body again
+                    log_debug(loggers, f"Server does not support resume for {url}, restarting from zero")
+                    hasher = hashlib.sha256()
+                    offset = 0
+
+                expected_size = _expected_total_length(response, offset)
+                content_type = response.headers.get('Content-Type', '').split(';')[0]
+
+                size = offset
+                with open(partial_path, 'ab' if offset else 'wb') as f:
+                    for chunk in response.iter_content(chunk_size=chunk_size):
+                        if not chunk:
+                            continue
+                        f.write(chunk)
+                        hasher.update(chunk)
+                        size += len(chunk)
+                    f.flush()
+                    os.fsync(f.fileno())
+
+            if expected_size is not None and size > expected_size:
+                # More bytes than announced means the partial file cannot be trusted
+                os.remove(partial_path)
+            if expected_size is not None and size != expected_size:
+                raise NetworkError(f"Incomplete download for {url}: got {size} of {expected_size} bytes", url=url)
+
+            os.replace(partial_path, save_path)
+            log_info(loggers, f"Downloaded {url} to {save_path} ({size} bytes)")
+            return {
+                'path': save_path,
+                'size': size,
+                'sha256': hasher.hexdigest(),
+                'content_type': content_type,
+            }
+        except (RequestException, NetworkError) as e:
+            status_code = getattr(getattr(e, 'response', None), 'status_code', None)
+            if status_code is not None and status_code < 500 and status_code != 429:
+                # Client errors will not go away by retrying
+                raise NetworkError(f"Failed to download {url}: {str(e)}", url=url, status_code=status_code, original_error=e)
+            attempt += 1
+            if attempt > max_retries:
+                log_error(loggers, f"Giving up on {url} after {max_retries} retries: {str(e)}")
+                if isinstance(e, NetworkError):
+                    raise
+                raise NetworkError(f"Failed to download {url}: {str(e)}", url=url, status_code=status_code, original_error=e)
+            wait_time = min(2 ** attempt, 30)
+            log_warning(loggers, f"Download of {url} interrupted ({str(e)}), resuming in {wait_time}s")
+            time.sleep(wait_time)
@@ -0,0 +1,149 @@
+# ./00_html_content_collector/fetcher.py
+import io
+import threading
+import requests
+from requests.adapters import BaseAdapter, HTTPAdapter
+from requests.structures import CaseInsensitiveDict
+from requests.utils import get_encoding_from_headers
+from warc_store import WarcWriter, WarcArchive, EmptyArchive, DEFAULT_WARC_BYTES
+from logger import setup_logging, log_info, log_warning
+
+# Initialize loggers
+loggers = setup_logging(output_dir='logs', doc_name='fetcher', version='v1')
+
+# Describe the encoded body on the wire; the archive keeps the decoded body
+WIRE_HEADERS = ('content-encoding', 'transfer-encoding')
+
+
+class RecordingAdapter(HTTPAdapter):
+    """Normal HTTP transport that also writes every exchange to a WarcWriter."""
+
+    def __init__(self, writer, **kwargs):
+        super().__init__(**kwargs)
+        self.writer = writer
+
+    def send(self, request, **kwargs):
+        response = super().send(request, **kwargs)
+        try:
+            # Also reads streamed bodies; iter_content then serves them from memory
+            body = response.content
+            headers = [(name, value) for name, value in response.headers.items() if name.lower() not in WIRE_HEADERS]
+            if request.method != 'HEAD' and any(name.lower() in WIRE_HEADERS for name in response.headers):
+                headers = [(name, value) for name, value in headers if name.lower() != 'content-length']
+                headers.append(('Content-Length', str(len(body))))
+            self.writer.write_response(request.method, request.url, response.status_code, response.reason or '',
+                                       headers, body, request.headers.items())
+        except Exception as e:
+            log_warning(loggers, f"Could not record {request.method} {request.url}: {str(e)}")
+        return response
+
+
+class ReplayAdapter(BaseAdapter):
+    """Serves requests from a WarcArchive. Nothing goes to the network; a URL missing
+    from the archive gets a 404 so callers treat it like a dead link, without retries."""
+
+    def __init__(self, archive):
+        super().__init__()
+        self.archive = archive
+
+    def send(self, request, stream=False, timeout=None, verify=True, cert=None, proxies=None):
+        captured = self.archive.get_response(request.method, request.url)
+        if captured is None:
+            captured = (404, 'Not In Archive', [('X-Archive-Miss', '1')], b'')
+        status, reason, headers, body = captured
+        response = requests.Response()
+        response.status_code = status
+        response.reason = reason
+        response.headers = CaseInsensitiveDict(headers)
+        response.encoding = get_encoding_from_headers(response.headers)
+        response.url = request.url
+        response.request = request
+        response.connection = self
+        response.raw = io.BytesIO(body)
+        response._content = body
+        response._content_consumed = True
+        return response
+
+    def close(self):
+        pass
+
+
+class Fetcher:
+    """The crawl's HTTP entry point: per-thread sessions with a live, recording or replay transport.
+
+    With recording on, raw responses (and, through record_rendered, rendered DOM
+    snapshots) go to WARC files; with replay on, every request and every render is
+    served from those files instead.
+    """
+
+    def __init__(self):
+        self.writer = None
+        self.archive = None
+        self.offline = False
+        self.generation = 0
+        self.local = threading.local()
+
+    @property
+    def recording(self):
+        return self.writer is not None
+
+    @property
+    def replaying(self):
+        return self.archive is not None
+
+    def enable_recording(self, directory, max_file_bytes=DEFAULT_WARC_BYTES):
+        self.writer = WarcWriter(directory, max_file_bytes=max_file_bytes)
+        self.generation += 1
+        log_info(loggers, f"Recording responses to WARC files in {directory}")
+
+    def enable_replay(self, directory):
+        self.archive = WarcArchive(directory)
+        self.generation += 1
+        log_info(loggers, f"Replaying all fetches from {directory}; no network or browser will be used")
+
+    def enable_offline(self):
+        """Answer every request with an archive miss, e.g. while reprocessing stored pages."""
+        self.archive = EmptyArchive()
+        self.offline = True
+        self.generation += 1
+        log_info(loggers, "Network access disabled")
+
+    def new_session(self):
+        session = requests.Session()
+        if self.archive is not None:
+            adapter = ReplayAdapter(self.archive)
+        elif self.writer is not None:
+            adapter = RecordingAdapter(self.writer)
+        else:
+            return session
+        session.mount('http://', adapter)
+        session.mount('https://', adapter)
+        return session
+
+    def session(self):
+        """This thread's session; rebuilt if the mode changed since it was created."""
+        if getattr(self.local, 'generation', None) != self.generation:
+            self.local.session = self.new_session()
+            self.local.generation = self.generation
+        return self.local.session
+
+    def get(self, url, **kwargs):
+        return self.session().get(url, **kwargs)
+
+    def head(self, url, **kwargs):
+        return self.session().head(url, **kwargs)
+
+    def record_rendered(self, url, html, final_url=None, last_modified=None, etag=None):
+        if self.writer is None:
+            return
+        try:
+            self.writer.write_rendered(url, html, final_url, last_modified, etag)
+        except Exception as e:
+            log_warning(loggers, f"Could not record rendered page {url}: {str(e)}")
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
+
+
+fetcher = Fetcher()
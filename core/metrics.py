@@ -0,0 +1,244 @@
+# ./00_html_content_collector/metrics.py
+import json
+import time
+import threading
+from bisect import bisect_left
+from collections import deque
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from logger import setup_logging, log_error, log_info, log_context
+
+# Initialize loggers
+loggers = setup_logging(output_dir='logs', doc_name='metrics', version='v1')
+
+# Upper bounds in seconds; spans cache hits through slow page renders
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+
+class Histogram:
+    def __init__(self, buckets=DEFAULT_BUCKETS, sample_size=2048):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+        # Recent observations, for quantiles in JSON snapshots
+        self.samples = deque(maxlen=sample_size)
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+        self.samples.append(value)
+
+    def quantile(self, q):
+        if not self.samples:
+            return None
+        ordered = sorted(self.samples)
+        return ordered[min(int(q * len(ordered)), len(ordered) - 1)]
+
+
+class CrawlMetrics:
+    """Counters, gauges and per-stage latency histograms for a running crawl.
+
+    Exposed in Prometheus text format over a local HTTP endpoint and as
+    periodic JSON snapshots. All updates take a single short lock.
+    """
+
+    def __init__(self, rate_window=60):
+        self.lock = threading.Lock()
+        self.started_at = time.time()
+        self.rate_window = rate_window
+        self.counters = {}
+        self.gauges = {}
+        self.gauge_callbacks = {}
+        self.histograms = {}
+        self.page_completions = deque()
+
+    def reset(self):
+        with self.lock:
+            self.started_at = time.time()
+            self.counters.clear()
+            self.gauges.clear()
+            self.histograms.clear()
+            self.page_completions.clear()
+
+    def inc(self, name, value=1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def set_gauge(self, name, value):
+        with self.lock:
+            self.gauges[name] = value
+
+    def add_gauge(self, name, delta):
+        with self.lock:
+            self.gauges[name] = self.gauges.get(name, 0) + delta
+
+    def register_gauge(self, name, callback):
+        """Register a callable evaluated whenever metrics are read, e.g. queue depth."""
+        with self.lock:
+            self.gauge_callbacks[name] = callback
+
+    def unregister_gauge(self, name):
+        with self.lock:
+            self.gauge_callbacks.pop(name, None)
+
+    def observe(self, stage, seconds):
+        with self.lock:
+            histogram = self.histograms.get(stage)
+            if histogram is None:
+                histogram = self.histograms[stage] = Histogram()
+            histogram.observe(seconds)
+
+    @contextmanager
+    def timed(self, stage):
+        start = time.perf_counter()
+        try:
+            with log_context(stage=stage):
+                yield
+        finally:
+            self.observe(stage, time.perf_counter() - start)
+
+    @contextmanager
+    def in_flight(self):
+        self.add_gauge('in_flight_workers', 1)
+        try:
+            yield
+        finally:
+            self.add_gauge('in_flight_workers', -1)
+
+    def page_done(self, result):
+        now = time.time()
+        with self.lock:
+            key = ('pages', (('result', result),))
+            self.counters[key] = self.counters.get(key, 0) + 1
+            self.page_completions.append(now)
+            while self.page_completions and self.page_completions[0] < now - self.rate_window:
+                self.page_completions.popleft()
+
+    def pages_per_second(self):
+        now = time.time()
+        window = min(self.rate_window, max(now - self.started_at, 1e-9))
+        with self.lock:
+            recent = sum(1 for t in self.page_completions if t >= now - self.rate_window)
+        return recent / window
+
+    def _read_gauges(self):
+        with self.lock:
+            gauges = dict(self.gauges)
+            callbacks = dict(self.gauge_callbacks)
+        for name, callback in callbacks.items():
+            try:
+                gauges[name] = callback()
+            except Exception as e:
+                log_error(loggers, f"Gauge callback {name} failed: {str(e)}")
+        gauges['pages_per_second'] = self.pages_per_second()
+        return gauges
+
+    def snapshot(self):
+        gauges = self._read_gauges()
+        with self.lock:
+            counters = {}
+            for (name, labels), value in self.counters.items():
+                label_str = ','.join(f'{k}={v}' for k, v in labels)
+                counters[f'{name}{{{label_str}}}' if label_str else name] = value
+            stages = {
+                stage: {
+                    'count': h.count,
+                    'total_seconds': h.sum,
+                    'mean_seconds': h.sum / h.count if h.count else None,
+                    'p50_seconds': h.quantile(0.5),
+                    'p99_seconds': h.quantile(0.99),
+                }
+                for stage, h in self.histograms.items()
+            }
+        return {
+            'timestamp': time.time(),
+            'uptime_seconds': time.time() - self.started_at,
+            'counters': counters,
+            'gauges': gauges,
+            'stages': stages,
+        }
+
+    def render_prometheus(self, prefix='scraper'):
+        gauges = self._read_gauges()
+        lines = []
+        with self.lock:
+            counter_names = sorted({name for name, _ in self.counters})
+            for name in counter_names:
+                lines.append(f'# TYPE {prefix}_{name}_total counter')
+                for (counter_name, labels), value in sorted(self.counters.items()):
+                    if counter_name != name:
+                        continue
+                    label_str = ','.join(f'{k}="{v}"' for k, v in labels)
+                    lines.append(f'{prefix}_{name}_total{{{label_str}}} {value}' if label_str else f'{prefix}_{name}_total {value}')
+
+            lines.append(f'# TYPE {prefix}_stage_duration_seconds histogram')
+            for stage, h in sorted(self.histograms.items()):
+                cumulative = 0
+                for bound, count in zip(h.buckets, h.counts):
+                    cumulative += count
+                    lines.append(f'{prefix}_stage_duration_seconds_bucket{{stage="{stage}",le="{bound}"}} {cumulative}')
+                lines.append(f'{prefix}_stage_duration_seconds_bucket{{stage="{stage}",le="+Inf"}} {h.count}')
+                lines.append(f'{prefix}_stage_duration_seconds_sum{{stage="{stage}"}} {h.sum}')
+                lines.append(f'{prefix}_stage_duration_seconds_count{{stage="{stage}"}} {h.count}')
+
+        for name, value in sorted(gauges.items()):
+            lines.append(f'# TYPE {prefix}_{name} gauge')
+            lines.append(f'{prefix}_{name} {value}')
+        return '\n'.join(lines) + '\n'
+
+
+def _make_handler(crawl_metrics):
+    class MetricsHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.startswith('/metrics.json'):
+                body = json.dumps(crawl_metrics.snapshot()).encode('utf-8')
+                content_type = 'application/json'
+            elif self.path.startswith('/metrics'):
+                body = crawl_metrics.render_prometheus().encode('utf-8')
+                content_type = 'text/plain; version=0.0.4'
+            else:
+                self.send_error(404)
+                return
+            self.send_response(200)
+            self.send_header('Content-Type', content_type)
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            # Scrapes every few seconds would otherwise flood stderr
+            pass
+
+    return MetricsHandler
+
+
+def start_metrics_server(crawl_metrics, port=9108, host='127.0.0.1'):
+    """Serve /metrics (Prometheus text) and /metrics.json on a daemon thread."""
+    server = ThreadingHTTPServer((host, port), _make_handler(crawl_metrics))
+    thread = threading.Thread(target=server.serve_forever, name='metrics-server', daemon=True)
+    thread.start()
+    log_info(loggers, f"Metrics endpoint listening on http://{host}:{server.server_port}/metrics")
+    return server
+
+
+def start_snapshot_writer(crawl_metrics, path, interval=30):
+    """Append a JSON snapshot to path every interval seconds. Returns an Event that stops it."""
+    stop = threading.Event()
+
+    def write_snapshots():
+        while not stop.wait(interval):
+            try:
+                with open(path, 'a', encoding='utf-8') as f:
+                    f.write(json.dumps(crawl_metrics.snapshot()) + '\n')
+            except OSError as e:
+                log_error(loggers, f"Failed to write metrics snapshot to {path}: {str(e)}")
+
+    threading.Thread(target=write_snapshots, name='metrics-snapshots', daemon=True).start()
+    return stop
+
+
+# Shared instance used by the scraper
+metrics = CrawlMetrics()
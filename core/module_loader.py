@@ -0,0 +1,266 @@
+# ./00_html_content_collector/module_loader.py
+import os
+import time
+import importlib
+import threading
+import multiprocessing
+import concurrent.futures
+from concurrent.futures.process import BrokenProcessPool
+from base_module import STAGE_KINDS, ProcessingStage
+from config import get_manifest
+from metrics import metrics
+from custom_exceptions import ConfigurationError, ParsingError
+from logger import setup_logging, log_error, log_info, log_warning, log_debug
+
+# Initialize loggers
+loggers = setup_logging(output_dir='logs', doc_name='module_loader', version='v1')
+
+HTML_CONTENT_TYPES = ('text/html', 'application/xhtml+xml')
+
+
+class StageSpec:
+    """Registry entry for a processing stage: enough to decide whether it applies without importing it.
+
+    `target` is "module:Class". `markers` are lowercase substrings of the page HTML;
+    the stage is only imported and run if one of them occurs (no markers: every page).
+    """
+
+    def __init__(self, name, target, markers=(), order=100, enabled=True, content_types=HTML_CONTENT_TYPES):
+        self.name = name
+        self.target = target
+        self.markers = tuple(marker.lower() for marker in markers)
+        self.order = order
+        self.enabled = enabled
+        self.content_types = tuple(content_types)
+
+    def matches(self, page):
+        if not page.content_type.startswith(self.content_types):
+            return False
+        return not self.markers or any(marker in page.html_lower for marker in self.markers)
+
+
+# Order matches the old hard-coded sequence in save_content and process_html_content
+DEFAULT_STAGES = (
+    StageSpec('assets', 'asset_module:AssetStage', markers=('<link', '<script', '<img'), order=10),
+    StageSpec('latex', 'preserve_module:LatexStage', markers=('math/tex',), order=20),
+    StageSpec('math', 'preserve_module:MathStage', markers=('math-inline', 'math-block', 'mathjax', 'katex'), order=30),
+    StageSpec('code_blocks', 'preserve_module:CodeBlockStage', markers=('<pre', '<code'), order=40),
+    StageSpec('svg', 'svg_module:SvgStage', markers=('<svg',), order=50),
+    StageSpec('iframe_svg', 'svg_module:IframeSvgStage', markers=('<iframe',), order=60),
+    # Opt-in: needs a local OCR engine and reads the images the assets stage downloaded
+    StageSpec('ocr', 'image_ocr_module:ImageOcrStage', markers=('<img',), order=70, enabled=False),
+)
+
+
+def _import_target(target):
+    module_name, _, class_name = target.partition(':')
+    return getattr(importlib.import_module(module_name), class_name)
+
+
+def _run_compute(target, payload):
+    """Executor entry point; also runs in pool processes, so it only gets the target name."""
+    start = time.perf_counter()
+    result = _import_target(target).compute(payload)
+    return result, time.perf_counter() - start
+
+
+def get_stage_settings(doc_name=None):
+    """The `processing_stages` section of a documentation source, mapping stage names to on/off.
+
+    Example core_manifest.yaml entry:
+
+        documentation_sources:
+          - name: numpy
+            url: https://numpy.org/doc/stable/
+            processing_stages:
+              iframe_svg: false
+              ocr: true
+    """
+    if doc_name is None:
+        return {}
+    source = next((source for source in get_manifest().get('documentation_sources', []) if source.get('name') == doc_name), None)
+    settings = (source or {}).get('processing_stages') or {}
+    if not isinstance(settings, dict):
+        raise ConfigurationError(f"processing_stages for {doc_name} must be a mapping of stage name to true/false")
+    return settings
+
+
+class StageRegistry:
+    """Known stages and the ones imported so far; a stage module is imported the first time a page needs it."""
+
+    def __init__(self, specs=DEFAULT_STAGES):
+        self.specs = {}
+        self.stages = {}
+        self.source_specs = {}
+        self.lock = threading.Lock()
+        for spec in specs:
+            self.register(spec)
+
+    def register(self, spec):
+        with self.lock:
+            self.specs[spec.name] = spec
+            self.stages.pop(spec.name, None)
+            self.source_specs.clear()
+
+    def specs_for(self, doc_name=None):
+        """Enabled stages for a source, in order; computed once per source."""
+        specs = self.source_specs.get(doc_name)
+        if specs is None:
+            settings = get_stage_settings(doc_name)
+            unknown = set(settings) - set(self.specs)
+            if unknown:
+                log_warning(loggers, f"Unknown processing stages configured for {doc_name}: {', '.join(sorted(unknown))}")
+            specs = sorted(
+                (spec for spec in self.specs.values() if settings.get(spec.name, spec.enabled)),
+                key=lambda spec: spec.order,
+            )
+            disabled = sorted(spec.name for spec in self.specs.values() if spec not in specs)
+            if disabled:
+                log_info(loggers, f"Processing stages disabled for {doc_name}: {', '.join(disabled)}")
+            self.source_specs[doc_name] = specs
+        return specs
+
+    def load(self, spec):
+        stage = self.stages.get(spec.name)
+        if stage is None:
+            with self.lock:
+                stage = self.stages.get(spec.name)
+                if stage is None:
+                    stage_class = _import_target(spec.target)
+                    if not issubclass(stage_class, ProcessingStage) or stage_class.kind not in STAGE_KINDS:
+                        raise ConfigurationError(f"{spec.target} is not a ProcessingStage with a kind in {STAGE_KINDS}")
+                    stage = self.stages[spec.name] = stage_class()
+                    log_debug(loggers, f"Loaded processing stage {spec.name} ({spec.target}, {stage.kind})")
+        return stage
+
+
+class StageRunner:
+    """Runs the applicable stages on a page.
+
+    Inline stages run in order on the calling thread. 'io' and 'cpu' stages are
+    prepared in order, computed on a shared thread or process pool while the
+    rest of the page is processed, and applied in order at the end. A stage
+    whose `after` names a stage still pending waits for the next round.
+    """
+
+    def __init__(self, registry, io_workers=8, cpu_workers=None, inline=False):
+        self.registry = registry
+        self.io_workers = io_workers
+        self.cpu_workers = cpu_workers or os.cpu_count() or 1
+        # Compute every stage on the calling thread, e.g. inside reprocess worker processes
+        self.inline = inline
+        self.lock = threading.Lock()
+        self.io_pool = None
+        self.cpu_pool = None
+
+    def _executor(self, kind):
+        with self.lock:
+            if kind == 'io':
+                if self.io_pool is None:
+                    self.io_pool = concurrent.futures.ThreadPoolExecutor(max_workers=self.io_workers, thread_name_prefix='stage-io')
+                return self.io_pool
+            if self.cpu_pool is None:
+                # spawn, not fork: the crawler is multi-threaded by the time the first CPU stage runs
+                self.cpu_pool = concurrent.futures.ProcessPoolExecutor(max_workers=self.cpu_workers, mp_context=multiprocessing.get_context('spawn'))
+            return self.cpu_pool
+
+    def _submit(self, spec, stage, payload):
+        if self.inline:
+            future = concurrent.futures.Future()
+            future.set_result(_run_compute(spec.target, payload))
+            return future
+        try:
+            return self._executor(stage.kind).submit(_run_compute, spec.target, payload)
+        except (BrokenProcessPool, RuntimeError, OSError) as e:
+            log_warning(loggers, f"Cannot use the {stage.kind} pool for {spec.name}, running it on this thread: {str(e)}")
+            self._discard_pool(stage.kind)
+            future = concurrent.futures.Future()
+            future.set_result(_run_compute(spec.target, payload))
+            return future
+
+    def _discard_pool(self, kind):
+        with self.lock:
+            pool = self.cpu_pool if kind == 'cpu' else self.io_pool
+            if kind == 'cpu':
+                self.cpu_pool = None
+            else:
+                self.io_pool = None
+        if pool is not None:
+            pool.shutdown(wait=False)
+
+    def run(self, page):
+        """Process a PageContext in place; returns the names of the stages that ran."""
+        ran = []
+        specs = self.registry.specs_for(page.doc_name)
+        while specs:
+            specs = self._run_wave(page, specs, ran)
+        return ran
+
+    def _run_wave(self, page, specs, ran):
+        """Run the stages that can start now; returns those waiting on a stage still pending in this wave."""
+        pending = []
+        deferred = []
+        for spec in specs:
+            if not spec.matches(page):
+                continue
+            try:
+                stage = self.registry.load(spec)
+                if any(other.name in stage.after for other, _, _ in pending):
+                    deferred.append(spec)
+                    continue
+                if not stage.applies_to(page):
+                    continue
+                if stage.kind == 'inline':
+                    with metrics.timed(f'stage_{spec.name}'):
+                        stage.process(page)
+                    ran.append(spec.name)
+                else:
+                    pending.append((spec, stage, self._submit(spec, stage, stage.prepare(page))))
+            except Exception as e:
+                self._stage_failed(spec, page, e)
+
+        for spec, stage, future in pending:
+            try:
+                try:
+                    result, seconds = future.result()
+                except BrokenProcessPool as e:
+                    log_warning(loggers, f"Process pool failed during {spec.name}, retrying on this thread: {str(e)}")
+                    self._discard_pool(stage.kind)
+                    result, seconds = _run_compute(spec.target, stage.prepare(page))
+                metrics.observe(f'stage_{spec.name}', seconds)
+                stage.apply(page, result)
+                ran.append(spec.name)
+            except Exception as e:
+                self._stage_failed(spec, page, e)
+        return deferred
+
+    def _stage_failed(self, spec, page, error):
+        # One broken stage costs that stage's output, not the page
+        metrics.inc('errors', kind=f'stage_{spec.name}')
+        log_error(loggers, ParsingError(f"Processing stage {spec.name} failed: {str(error)}", url=page.url))
+
+    def shutdown(self):
+        with self.lock:
+            pools = [self.io_pool, self.cpu_pool]
+            self.io_pool = self.cpu_pool = None
+        for pool in pools:
+            if pool is not None:
+                pool.shutdown(wait=True)
+
+
+# Shared registry and runner used by save_content and process_html_content
+stage_registry = StageRegistry()
+stage_runner = StageRunner(stage_registry)
+
+
+def register_stage(name, target, markers=(), order=100, enabled=True, content_types=HTML_CONTENT_TYPES):
+    """Add or replace a stage; `enabled=False` makes it opt-in through a source's processing_stages."""
+    stage_registry.register(StageSpec(name, target, markers, order, enabled, content_types))
+
+
+def run_stages(page):
+    return stage_runner.run(page)
+
+
+def shutdown_stage_executors():
+    stage_runner.shutdown()
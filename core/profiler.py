@@ -0,0 +1,190 @@
+# ./00_html_content_collector/profiler.py
+import os
+import re
+import sys
+import time
+import random
+import signal
+import cProfile
+import threading
+import tracemalloc
+from collections import Counter
+from contextlib import contextmanager
+from logger import setup_logging, log_error, log_info, log_warning
+
+# Initialize loggers
+loggers = setup_logging(output_dir='logs', doc_name='profiler', version='v1')
+
+_UNSAFE_FILENAME_CHARS = re.compile(r'[^A-Za-z0-9._-]+')
+
+
+class _StackSampler(threading.Thread):
+    """Samples one thread's Python stack at a fixed interval into collapsed-stack counts."""
+
+    def __init__(self, thread_id, interval, counts):
+        super().__init__(name='profile-sampler', daemon=True)
+        self.thread_id = thread_id
+        self.interval = interval
+        self.counts = counts
+        self.stop_event = threading.Event()
+
+    def run(self):
+        while not self.stop_event.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                continue
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                frame = frame.f_back
+            self.counts[';'.join(reversed(stack))] += 1
+
+    def stop(self):
+        self.stop_event.set()
+        self.join()
+
+
+class PageProfiler:
+    """Opt-in per-URL CPU and memory profiling for scrape_single_page.
+
+    A URL is profiled when profiling is enabled, it matches url_pattern (if set)
+    and it wins the sample_rate draw. Each profiled URL gets a cProfile dump
+    and a tracemalloc top-allocations report, and its sampled stacks are added to
+    a crawl-wide collapsed-stack table that can be rendered as a flame graph.
+    When disabled, `profile` costs one attribute check.
+    """
+
+    def __init__(self, output_dir='profiles', enabled=False, url_pattern=None, sample_rate=1.0,
+                 track_memory=True, stack_sample_interval=0.005, top_allocations=25):
+        self.output_dir = output_dir
+        self.enabled = enabled
+        self.url_pattern = re.compile(url_pattern) if url_pattern else None
+        self.sample_rate = sample_rate
+        self.track_memory = track_memory
+        self.stack_sample_interval = stack_sample_interval
+        self.top_allocations = top_allocations
+        self.collapsed_stacks = Counter()
+        self.profiled_urls = 0
+        # cProfile and tracemalloc are process-wide, so only one page is profiled at a time
+        self._busy = threading.Lock()
+
+    def configure(self, output_dir=None, url_pattern=None, sample_rate=None, track_memory=None):
+        if output_dir is not None:
+            self.output_dir = output_dir
+        if url_pattern is not None:
+            self.url_pattern = re.compile(url_pattern) if url_pattern else None
+        if sample_rate is not None:
+            self.sample_rate = sample_rate
+        if track_memory is not None:
+            self.track_memory = track_memory
+
+    def enable(self):
+        self.enabled = True
+        log_info(loggers, f"Page profiling enabled (pattern={self.url_pattern.pattern if self.url_pattern else None}, sample_rate={self.sample_rate})")
+
+    def disable(self):
+        self.enabled = False
+        log_info(loggers, "Page profiling disabled")
+
+    def toggle(self, *_args):
+        if self.enabled:
+            self.disable()
+        else:
+            self.enable()
+
+    def install_signal_toggle(self, signum=getattr(signal, 'SIGUSR1', None)):
+        """Let `kill -USR1 <pid>` switch profiling on and off in a running crawl."""
+        if signum is None:
+            log_warning(loggers, "Signal-based profiling toggle is not available on this platform")
+            return
+        signal.signal(signum, self.toggle)
+
+    def should_profile(self, url):
+        if not self.enabled:
+            return False
+        if self.url_pattern is not None and not self.url_pattern.search(url):
+            return False
+        return self.sample_rate >= 1.0 or random.random() < self.sample_rate
+
+    def _output_prefix(self, url):
+        slug = _UNSAFE_FILENAME_CHARS.sub('_', url.split('://', 1)[-1]).strip('_')[:120]
+        return os.path.join(self.output_dir, f"{time.strftime('%Y%m%d-%H%M%S')}_{slug}")
+
+    @contextmanager
+    def profile(self, url):
+        if not self.enabled or not self.should_profile(url):
+            yield
+            return
+        if not self._busy.acquire(blocking=False):
+            # Another worker is being profiled; run this page normally
+            yield
+            return
+
+        try:
+            os.makedirs(self.output_dir, exist_ok=True)
+            prefix = self._output_prefix(url)
+            page_stacks = Counter()
+            sampler = _StackSampler(threading.get_ident(), self.stack_sample_interval, page_stacks)
+            started_tracemalloc = False
+            if self.track_memory and not tracemalloc.is_tracing():
+                tracemalloc.start(25)
+                started_tracemalloc = True
+            profile = cProfile.Profile()
+            start = time.perf_counter()
+            sampler.start()
+            profile.enable()
+            try:
+                yield
+            finally:
+                profile.disable()
+                sampler.stop()
+                elapsed = time.perf_counter() - start
+                try:
+                    profile.dump_stats(prefix + '.prof')
+                    self._write_collapsed(prefix + '.collapsed', page_stacks)
+                    self.collapsed_stacks.update(page_stacks)
+                    if started_tracemalloc:
+                        self._write_allocations(prefix + '_alloc.txt', url, elapsed)
+                    self.profiled_urls += 1
+                    log_info(loggers, f"Profiled {url} in {elapsed:.2f}s, reports at {prefix}.*")
+                except OSError as e:
+                    log_error(loggers, f"Failed to write profile for {url}: {str(e)}")
+                finally:
+                    if started_tracemalloc:
+                        tracemalloc.stop()
+        finally:
+            self._busy.release()
+
+    def _write_allocations(self, path, url, elapsed):
+        snapshot = tracemalloc.take_snapshot().filter_traces((
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, '<frozen importlib._bootstrap>'),
+        ))
+        current, peak = tracemalloc.get_traced_memory()
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(f"URL: {url}\nElapsed: {elapsed:.3f}s\n")
+            f.write(f"Traced memory: current {current / 1024:.1f} KiB, peak {peak / 1024:.1f} KiB\n\n")
+            f.write(f"Top {self.top_allocations} allocation sites still alive:\n")
+            for stat in snapshot.statistics('lineno')[:self.top_allocations]:
+                f.write(f"{stat}\n")
+
+    @staticmethod
+    def _write_collapsed(path, stacks):
+        with open(path, 'w', encoding='utf-8') as f:
+            for stack, count in stacks.most_common():
+                f.write(f"{stack} {count}\n")
+
+    def write_collapsed_stacks(self, path=None):
+        """Write crawl-wide collapsed stacks (input for flamegraph.pl, speedscope, inferno)."""
+        if not self.collapsed_stacks:
+            return None
+        path = path or os.path.join(self.output_dir, 'crawl.collapsed')
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        self._write_collapsed(path, self.collapsed_stacks)
+        log_info(loggers, f"Wrote collapsed stacks for {self.profiled_urls} profiled URLs to {path}")
+        return path
+
+
+# Shared instance used by the scraper
+profiler = PageProfiler()
@@ -2,7 +2,8 @@
 import time
 import requests
 from requests.exceptions import RequestException
-from scraper import get_proxy_url
+from proxy_config import get_proxy_url
+from fetcher import fetcher
 from custom_exceptions import ConnectionError, NetworkError, ConfigurationError
 from logger import setup_logging, log_error, log_info, log_warning, log_debug
 
@@ -38,6 +39,9 @@ class ProxyManager:
             raise NetworkError(f"Failed to get proxy: {str(e)}")
 
     def check_proxy_health(self):
+        if fetcher.replaying:
+            # Nothing goes through the proxy during replay
+            return
         try:
             response = requests.get('https://httpbin.org/ip', proxies=self.proxy, timeout=10)
             response.raise_for_status()
@@ -0,0 +1,334 @@
+# ./00_html_content_collector/reprocess.py
+import os
+import json
+import time
+import hashlib
+import mimetypes
+import multiprocessing
+import concurrent.futures
+from urllib.parse import urlparse
+from config import get_manifest, get_output_dir
+from db_manager import iter_page_urls, count_pages, load_pages, load_output_hashes, save_output_hashes
+from scraper import get_version_path, get_scrape_state_dir, process_page_content, build_metadata
+from shard_writer import shard_output
+from version_store import VersionStore
+from fetcher import fetcher
+from metrics import metrics
+from custom_exceptions import ConfigurationError, DatabaseError
+from logger import setup_logging, log_error, log_info, log_warning
+
+# Initialize loggers
+loggers = setup_logging(output_dir='logs', doc_name='reprocess', version='v1')
+
+REPROCESS_SOURCES = ('pages', 'tree')
+DEFAULT_BATCH_SIZE = 50
+PROGRESS_INTERVAL = 10  # seconds between progress lines
+METADATA_SUFFIX = '_metadata.json'
+# Changes on every run, so it is left out of the output hash
+VOLATILE_METADATA = ('extraction_date',)
+
+
+def get_url_prefix(doc_name):
+    """Stored pages of a source are the ones under the directory of its manifest URL."""
+    doc_url = next((source['url'] for source in get_manifest().get('documentation_sources', []) if source.get('name') == doc_name), None)
+    if not doc_url:
+        raise ConfigurationError(f"Documentation source '{doc_name}' not found in core_manifest.yaml")
+    parsed_url = urlparse(doc_url)
+    return f"{parsed_url.scheme}://{parsed_url.netloc}{os.path.dirname(parsed_url.path)}"
+
+
+def guess_content_type(path):
+    # The pages table only holds documents fetched through the renderer; xml and txt keep their own handling
+    content_type = mimetypes.guess_type(path)[0]
+    return content_type if content_type in ('application/xml', 'text/xml', 'text/plain') else 'text/html'
+
+
+def output_hash(content, metadata):
+    stable = {key: value for key, value in (metadata or {}).items() if key not in VOLATILE_METADATA}
+    digest = hashlib.blake2b(content.encode('utf-8'), digest_size=16)
+    digest.update(json.dumps(stable, sort_keys=True, ensure_ascii=False, default=str).encode('utf-8'))
+    return digest.hexdigest()
+
+
+def list_tree_pages(version_dir):
+    """Relative paths of every page's metadata file in the tree layout, sorted so a checkpoint is a position."""
+    paths = []
+    for root, dirs, files in os.walk(version_dir):
+        dirs[:] = [name for name in dirs if name != 'shards']
+        paths.extend(os.path.relpath(os.path.join(root, name), version_dir) for name in files if name.endswith(METADATA_SUFFIX))
+    return sorted(paths)
+
+
+def _read_tree_url(version_dir, metadata_path):
+    """URL of a page saved in the tree layout, or None."""
+    try:
+        with open(os.path.join(version_dir, metadata_path), 'r', encoding='utf-8') as f:
+            return json.load(f).get('url')
+    except (OSError, ValueError):
+        return None
+
+
+def _load_raw_bodies(doc_name, version, urls):
+    """{url: raw body} for pages listed in the tree.
+
+    The saved tree files are processed output, and several stages are not
+    idempotent, so the body the crawler fetched is used instead: the copy kept
+    for diffs under metadata/previous_versions, else the pages table.
+    """
+    # Each worker reads every body once, so nothing is cached
+    versions = VersionStore(os.path.join(get_output_dir(), 'metadata', 'previous_versions'), max_cache_bytes=0)
+    bodies = {}
+    for url in urls:
+        try:
+            content = versions.get(doc_name, version, url)
+        except DatabaseError:
+            content = None
+        if content is not None:
+            bodies[url] = content
+    missing = [url for url in urls if url not in bodies]
+    if missing:
+        bodies.update(load_pages(missing))
+    return bodies
+
+
+def _read_tree_output(filepath):
+    """(content, metadata) currently on disk for a page, or None."""
+    try:
+        with open(filepath, 'r', encoding='utf-8') as f:
+            content = f.read()
+        with open(os.path.splitext(filepath)[0] + METADATA_SUFFIX, 'r', encoding='utf-8') as f:
+            return content, json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _init_worker(warc_dir):
+    from module_loader import stage_runner
+
+    # Already on a pool process: stages compute here instead of on pools of their own
+    stage_runner.inline = True
+    if warc_dir and os.path.isdir(warc_dir):
+        fetcher.enable_replay(warc_dir)
+    else:
+        fetcher.enable_offline()
+
+
+def reprocess_batch(keys, doc_name, version, source, write_tree, known_hashes):
+    """Reprocess one batch on a worker; returns (key, url, status, hash, record) per page.
+
+    In tree mode the worker compares with and rewrites the files itself. Otherwise
+    `record` carries the output back to the parent, only for pages whose hash is
+    not in known_hashes.
+    """
+    version_dir = get_version_path(doc_name, version)
+    if source == 'pages':
+        contents = load_pages(keys)
+        pages = [(key, key, contents.get(key), guess_content_type(urlparse(key).path)) for key in keys]
+    else:
+        urls = [_read_tree_url(version_dir, key) for key in keys]
+        contents = _load_raw_bodies(doc_name, version, [url for url in urls if url])
+        pages = [(key, url, contents.get(url), guess_content_type(urlparse(url).path) if url else None)
+                 for key, url in zip(keys, urls)]
+
+    results = []
+    for key, url, content, content_type in pages:
+        if content is None:
+            results.append((key, url, 'missing', None, None))
+            continue
+        try:
+            # Stored section outputs came from the old pipeline, so every section is processed again
+            soup, additional_metadata, file_dir, filename = process_page_content(content, url, doc_name, version, content_type, reuse_sections=False)
+            html = str(soup)
+            try:
+                metadata = build_metadata(soup, url, additional_metadata)
+            except Exception as e:
+                log_error(loggers, f"Error extracting metadata for {url}: {str(e)}")
+                metadata = None
+            new_hash = output_hash(html, metadata)
+            filepath = os.path.join(file_dir, filename)
+            if write_tree:
+                existing = _read_tree_output(filepath)
+                if existing is not None and output_hash(*existing) == new_hash:
+                    results.append((key, url, 'unchanged', new_hash, None))
+                    continue
+                os.makedirs(file_dir, exist_ok=True)
+                with open(filepath, 'w', encoding='utf-8') as f:
+                    f.write(html)
+                if metadata is not None:
+                    with open(os.path.splitext(filepath)[0] + METADATA_SUFFIX, 'w', encoding='utf-8') as f:
+                        json.dump(metadata, f, ensure_ascii=False, indent=2)
+                results.append((key, url, 'changed', new_hash, None))
+            elif known_hashes.get(url) == new_hash:
+                results.append((key, url, 'unchanged', new_hash, None))
+            else:
+                record = (os.path.relpath(filepath, version_dir), html, metadata, content_type)
+                results.append((key, url, 'changed', new_hash, record))
+        except Exception as e:
+            log_error(loggers, f"Error reprocessing {url}: {str(e)}")
+            results.append((key, url, 'failed', None, None))
+    return results
+
+
+class ReprocessCheckpoint:
+    """Position of a reprocess run: every page up to and including `after` is done.
+
+    Batches finish out of order; the position only moves past a batch once every
+    earlier batch has finished too, so resuming never skips a page.
+    """
+
+    def __init__(self, doc_name, version, source, output_format):
+        self.path = os.path.join(get_scrape_state_dir(), f'reprocess_{doc_name}_{version}.json')
+        self.state = {'source': source, 'output_format': output_format, 'after': None, 'counts': {}}
+
+    def load(self):
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                state = json.load(f)
+        except FileNotFoundError:
+            return False
+        except (OSError, ValueError) as e:
+            log_warning(loggers, f"Ignoring unreadable reprocess checkpoint {self.path}: {str(e)}")
+            return False
+        if (state.get('source'), state.get('output_format')) != (self.state['source'], self.state['output_format']):
+            log_warning(loggers, f"Reprocess checkpoint {self.path} is for source {state.get('source')} with "
+                                 f"{state.get('output_format')} output; starting over")
+            return False
+        self.state = state
+        return True
+
+    def advance(self, after, counts):
+        self.state['after'] = after
+        self.state['counts'] = dict(counts)
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        temp_path = self.path + '.tmp'
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump(self.state, f)
+        os.replace(temp_path, self.path)
+
+    def remove(self):
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+
+def _batches(keys, batch_size):
+    batch = []
+    for key in keys:
+        batch.append(key)
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def reprocess(doc_name, version, source='pages', max_workers=None, resume=False, warc_dir=None, batch_size=DEFAULT_BATCH_SIZE):
+    """Run stored pages of one documentation version through the processing pipeline again.
+
+    Pages are the ones in the pages table or the ones in the saved tree; either
+    way their raw bodies are read again (see _load_raw_bodies), cleaned, processed
+    and given fresh metadata on a process pool, and only outputs that differ from
+    what is already saved are rewritten. Progress is checkpointed so an
+    interrupted run continues with `resume=True`.
+    """
+    if source not in REPROCESS_SOURCES:
+        raise ConfigurationError(f"Unknown reprocess source '{source}', expected one of {', '.join(REPROCESS_SOURCES)}")
+    version_dir = get_version_path(doc_name, version)
+    output_format = 'shards' if shard_output.enabled else 'tree'
+    checkpoint = ReprocessCheckpoint(doc_name, version, source, output_format)
+    counts = {'changed': 0, 'unchanged': 0, 'missing': 0, 'failed': 0}
+    if resume and checkpoint.load():
+        counts.update(checkpoint.state['counts'])
+        log_info(loggers, f"Resuming reprocess of {doc_name} {version} after {checkpoint.state['after']}")
+    elif not resume:
+        checkpoint.remove()
+    after = checkpoint.state['after']
+
+    if source == 'pages':
+        url_prefix = get_url_prefix(doc_name)
+        total = count_pages(url_prefix, after)
+        keys = iter_page_urls(url_prefix, after)
+    else:
+        tree_pages = [path for path in list_tree_pages(version_dir) if after is None or path > after]
+        total = len(tree_pages)
+        keys = iter(tree_pages)
+    done_before = sum(counts.values())
+    log_info(loggers, f"Reprocessing {total} pages of {doc_name} {version} from the {source} with {output_format} output")
+
+    max_workers = max_workers or os.cpu_count() or 1
+    executor = concurrent.futures.ProcessPoolExecutor(
+        max_workers=max_workers, mp_context=multiprocessing.get_context('spawn'),
+        initializer=_init_worker, initargs=(warc_dir,),
+    )
+    batches = enumerate(_batches(keys, batch_size))
+    in_flight = {}
+    finished = {}
+    next_sequence = 0
+    started = last_progress = time.time()
+    processed = 0
+    try:
+        while True:
+            # Keep every worker busy with one batch queued behind it, and no more in memory
+            while len(in_flight) < max_workers * 2:
+                sequence, batch = next(batches, (None, None))
+                if batch is None:
+                    break
+                known_hashes = {} if output_format == 'tree' else load_output_hashes(version_dir, batch)
+                future = executor.submit(reprocess_batch, batch, doc_name, version, source, output_format == 'tree', known_hashes)
+                in_flight[future] = (sequence, batch)
+            if not in_flight:
+                break
+            done, _ = concurrent.futures.wait(in_flight, return_when=concurrent.futures.FIRST_COMPLETED)
+            for future in done:
+                sequence, batch = in_flight.pop(future)
+                try:
+                    results = future.result()
+                except Exception as e:
+                    log_error(loggers, f"Reprocess batch starting at {batch[0]} failed: {str(e)}")
+                    results = [(key, None, 'failed', None, None) for key in batch]
+                changed_hashes = []
+                for key, url, status, new_hash, record in results:
+                    if record is not None:
+                        relative_path, html, metadata, content_type = record
+                        shard_output.writer(os.path.join(version_dir, 'shards')).write(url, relative_path, html, metadata, content_type)
+                        changed_hashes.append((url, new_hash))
+                    counts[status] += 1
+                    metrics.inc('reprocessed_pages', result=status)
+                processed += len(batch)
+                finished[sequence] = (batch[-1], changed_hashes)
+
+            # Move the checkpoint past every batch whose predecessors have all finished
+            moved = False
+            saved_hashes = []
+            while next_sequence in finished:
+                after, changed_hashes = finished.pop(next_sequence)
+                saved_hashes.extend(changed_hashes)
+                next_sequence += 1
+                moved = True
+            if moved:
+                if output_format == 'shards':
+                    # Outputs before the checkpoint must be on disk before the checkpoint is, and
+                    # before their hashes are, or a resumed run would count lost records as unchanged
+                    shard_output.flush()
+                    try:
+                        save_output_hashes(version_dir, saved_hashes)
+                    except DatabaseError as e:
+                        log_error(loggers, f"Could not save output hashes of {len(saved_hashes)} pages, "
+                                           f"they are written again next run: {e.log_message()}")
+                checkpoint.advance(after, counts)
+
+            now = time.time()
+            if now - last_progress >= PROGRESS_INTERVAL:
+                last_progress = now
+                rate = processed / max(now - started, 1e-9)
+                eta = (total - processed) / rate if rate else 0
+                log_info(loggers, f"Reprocessed {processed}/{total} pages ({rate:.1f}/s, ETA {eta:.0f}s): "
+                                  f"{counts['changed']} changed, {counts['unchanged']} unchanged, {counts['failed']} failed")
+    finally:
+        executor.shutdown(wait=True, cancel_futures=True)
+        shard_output.close()
+
+    elapsed = time.time() - started
+    log_info(loggers, f"Reprocessed {sum(counts.values()) - done_before} pages of {doc_name} {version} in {elapsed:.1f}s: "
+                      + ', '.join(f"{count} {status}" for status, count in counts.items()))
+    checkpoint.remove()
+    return counts
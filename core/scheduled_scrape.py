@@ -1,8 +1,9 @@
 # ./00_html_content_collector/scheduled_scrape.py
 import schedule
 import time
-from scraper import scrape_pages_concurrently, prioritize_pages, get_urls_to_scrape
-from config import MANIFEST
+from scraper import prioritize_pages, get_urls_to_scrape
+from scraper_core import scrape_pages_concurrently
+from config import get_manifest
 from logger import setup_logging, log_error, log_info
 from custom_exceptions import NetworkError, ParsingError, DatabaseError
 
@@ -11,7 +12,7 @@ loggers = setup_logging(output_dir='logs', doc_name='scheduled_scrape', version=
 
 def run_scheduled_scrape():
     log_info(loggers, "Starting scheduled scrape")
-    for doc_source in MANIFEST['documentation_sources']:
+    for doc_source in get_manifest()['documentation_sources']:
         doc_name = doc_source['name']
         for version in doc_source['versions']:
             base_url = doc_source['url']
@@ -4,49 +4,47 @@ import os
 import re
 import json
 import time
-import hashlib
-import functools
 import mimetypes
-from scraper_core import (
-    normalize_url, clean_and_normalize_content, process_html_content, extract_metadata,
-    create_connection, DynamicRateLimiter, setup_webdriver, extract_links_selenium,
-    scrape_single_page, scrol_page, expand_content, get_last_scraped_url,
-    start_scraping_from, load_checksum
-)
-from functools import wraps, lru_cache
+from functools import wraps
+from collections import deque
+from datetime import datetime
+from urllib.parse import urlparse, urljoin, urlunparse, urlencode, parse_qsl
+from sqlite3 import Error
+from difflib import unified_diff
+from queue import Queue
+import difflib
+
+# Third-party imports
+# selenium and bs4 are imported inside the functions that use them; cairosvg, langdetect,
+# extruct and friends are only imported by content_processor when a page is processed
+import requests
 from requests import Session
 from requests.exceptions import RequestException
-from collections import deque
-from webdriver_manager import scroll_page
-from datetime import datetime, timedelta
-from urllib.parse import urlparse, urljoin, urlunparse, parse_qs, urlencode, parse_qsl
+
+# Local imports
 from custom_exceptions import (
     NetworkError, ParsingError, MetadataExtractionError, DatabaseError,
     ContentChangedError, CircuitBreakerError, LanguageDetectionError,
     DuplicateContentError, RateLimitError, ConfigurationError
 )
-
-# Third-party imports
-import requests
-import difflib
-import xmltodict
-import cairosvg
-import html
-from utils import get_custom_headers
-from sqlite3 import Error
-from difflib import unified_diff
-from db_manager import get_page_update_frequency
-from bs4 import BeautifulSoup, Comment
-from langdetect import detect
-from selenium.webdriver.support.ui import WebDriverWait
-from selenium.webdriver.support import expected_conditions as EC
-from selenium.webdriver.common.by import By
-from selenium.common.exceptions import TimeoutException, WebDriverException
-from queue import Queue
+from utils import get_custom_headers, calculate_checksum, retry_with_exponential_backoff, RetryExhaustedException
+from content_processor import clean_and_normalize_content, process_html_content, extract_metadata
+from section_hasher import process_sections
+from link_extractor import extract_links, extract_links_selenium, is_valid_link
+from db_manager import create_connection, load_checksum, get_page_update_frequency, get_last_updated_map
+from rate_limiter import DynamicRateLimiter
+from webdriver_manager import setup_webdriver, scroll_page, expand_content, PageSettler, get_network_tracker, capture_response_bodies, quit_webdriver, get_document_headers, CDPPage
+from download_manager import stream_download, response_store
+from fetcher import fetcher
+from sitemap_parser import iter_sitemap_entries, filter_changed_entries
+from crawl_journal import CrawlJournal
+from shard_writer import shard_output
+from version_store import VersionStore
 from proxy_manager import ProxyManager
-
-# Local imports
-from config import MANIFEST, OUTPUT_DIR
+from metrics import metrics
+from cache import caches, cached
+from state_index import page_states
+from config import get_manifest, get_output_dir
 from logger import setup_logging, log_error, log_info, log_warning, log_debug
 
 # Initialize loggers
@@ -66,6 +64,8 @@ class VersionedContentHashManager:
         self.hash_dir = os.path.join(dataset_root, 'metadata', 'content_hashes')
         os.makedirs(self.hash_dir, exist_ok=True)
         self.hashes = self._load_hashes()
+        # Hashes only say that a page changed; the previous bodies for diffs are kept on disk
+        self.versions = VersionStore(os.path.join(dataset_root, 'metadata', 'previous_versions'))
 
     def _get_hash_file(self, doc_name):
         return os.path.join(self.hash_dir, f"{doc_name}_hashes.json")
@@ -86,28 +86,26 @@ class VersionedContentHashManager:
     def get_hash_info(self, doc_name, version, url):
         return self.hashes.get(doc_name, {}).get(version, {}).get(url)
 
-    def update_hash_info(self, doc_name, version, url, content):
+    def update_hash_info(self, doc_name, version, url, content, fingerprint=None):
         if doc_name not in self.hashes:
             self.hashes[doc_name] = {}
         if version not in self.hashes[doc_name]:
             self.hashes[doc_name][version] = {}
 
         hash_info = {
-            'hash': compute_hash(content),
+            'hash': fingerprint or compute_hash(content, doc_name),
             'last_modified': datetime.now().isoformat(),
             'size': len(content)
         }
         self.hashes[doc_name][version][url] = hash_info
         self._save_hashes(doc_name)
 
-    def content_changed(self, doc_name, version, url, content):
-        new_hash_info = {
-            'hash': compute_hash(content),
-            'size': len(content)
-        }
+    def content_changed(self, doc_name, version, url, content, fingerprint=None):
+        # Only the fingerprint decides; the raw size changes with every nonce and build stamp
+        fingerprint = fingerprint or compute_hash(content, doc_name)
         old_hash_info = self.get_hash_info(doc_name, version, url)
-        if old_hash_info is None or old_hash_info['hash'] != new_hash_info['hash'] or old_hash_info['size'] != new_hash_info['size']:
-            self.update_hash_info(doc_name, version, url, content)
+        if old_hash_info is None or old_hash_info['hash'] != fingerprint:
+            self.update_hash_info(doc_name, version, url, content, fingerprint)
             return True
         return False
 
@@ -184,96 +182,11 @@ def get_proxied_session():
     session.request = proxied_request
     return session
 
-def normalize_html_structure(soup):
-    # Ensure proper nesting and close unclosed tags
-    # BeautifulSoup does this automatically when parsing
-
-    # Remove empty tags
-    for tag in soup.find_all():
-        if len(tag.get_text(strip=True)) == 0 and len(tag.find_all()) == 0:
-            tag.extract()
-
-    return soup
-
-def normalize_whitespace(text):
-    # Remove excessive whitespace and normalize line breaks
-    return re.sub(r'\s+', ' ', text).strip()
-
-def normalize_character_encoding(soup):
-    # Replace HTML entities with Unicode equivalents
-    for text in soup.find_all(text=True):
-        text.replace_with(html.unescape(str(text)))
-
-    return soup
-
-def normalize_urls(soup, base_url):
-    for a in soup.find_all('a', href=True):
-        a['href'] = urljoin(base_url, a['href'])
-
-        # Remove tracking parameters
-        parsed = urlparse(a['href'])
-        qd = parse_qs(parsed.query, keep_blank_values=True)
-        filtered = {k: v for k, v in qd.items() if not k.startswith('utm_')}
-        parsed = parsed._replace(query=urlencode(filtered, doseq=True))
-        a['href'] = urlunparse(parsed)
-
-    return soup
-
-def basic_content_cleaning(soup):
-    # Remove HTML comments
-    for comment in soup.find_all(text=lambda text: isinstance(text, Comment)):
-        comment.extract()
-
-    # Strip out invisible text
-    for hidden in soup.find_all(style=re.compile(r'display:\s*none')):
-        hidden.extract()
-
-    return soup
-
-class RetryExhaustedException(Exception):
-    pass
-
 def get_content_filepath(doc_name, version, url):
     parsed_url = urlparse(url)
     local_file_path = parsed_url.path.lstrip('/')
     return os.path.join(get_version_path(doc_name, version), local_file_path)
 
-def retry_with_exponential_backoff(func, max_retries=5, initial_delay=1, max_delay=60):
-    def wrapper(*args, **kwargs):
-        retries = 0
-        delay = initial_delay
-        while retries < max_retries:
-            try:
-                return func(*args, **kwargs)
-            except RequestException as e:
-                log_warning(loggers, f"Network error occurred: {str(e)}")
-                delay_factor = 2
-            except TimeoutException as e:
-                log_warning(loggers, f"Timeout error occurred: {str(e)}")
-                delay_factor = 1.5
-            except WebDriverException as e:
-                log_warning(loggers, f"WebDriver error occurred: {str(e)}")
-                delay_factor = 3
-            except Exception as e:
-                log_error(loggers, f"Unexpected error occurred: {str(e)}")
-                raise
-
-            retries += 1
-            if retries == max_retries:
-                raise RetryExhaustedException(f"Max retries reached for {func.__name__}")
-
-            wait_time = min(delay * (delay_factor ** retries), max_delay)
-            log_warning(loggers, f"Retrying in {wait_time:.2f} seconds...")
-            time.sleep(wait_time)
-    return wrapper
-
-def detect_language(text):
-    try:
-        return detect(text)
-    except Exception:
-        log_warning(loggers, "Failed to detect language", exc_info=True)
-        return None
-
 def is_acceptable_mime_type(mime_type):
     acceptable_types = [
         'text/html',
@@ -285,25 +198,10 @@ def is_acceptable_mime_type(mime_type):
     return any(mime_type.startswith(t) for t in acceptable_types)
 
 def get_doc_name_from_url(url):
-    return next((source['name'] for source in MANIFEST['documentation_sources'] if source['url'] in url), urlparse(url).netloc)
-
-def compute_hash(content):
-    return hashlib.sha256(content.encode('utf-8')).hexdigest()
-
-def handle_metadata_errors(func):
-    @functools.wraps(func)
-    def wrapper(*args, **kwargs):
-        try:
-            return func(*args, **kwargs)
-        except AttributeError as e:
-            log_warning(loggers, f"Metadata extraction error: {str(e)}")
-            return None
-    return wrapper
-
-@handle_metadata_errors
-def extract_title(soup):
-    return soup.title.string
+    return next((source['name'] for source in get_manifest()['documentation_sources'] if source['url'] in url), urlparse(url).netloc)
 
+def compute_hash(content, doc_name=None):
+    return calculate_checksum(content, doc_name)
 
 class PriorityURL:
     def __init__(self, url, priority):
@@ -313,11 +211,17 @@ class PriorityURL:
     def __lt__(self, other):
         return self.priority < other.priority
 
+# The same navigation links are prioritized on every page; save_page invalidates the entry of every page it writes
+@cached('update_frequency', max_entries=10000, ttl=600)
+def cached_update_frequency(url):
+    return get_page_update_frequency(url)
+
 def calculate_priority(url, hash_manager, doc_name, version, is_pagination=False):
     base_priority = 1.0
 
     # Factor 1: Update frequency
-    update_frequency = get_page_update_frequency(url)
+    state = page_states.get(url)
+    update_frequency = state.update_frequency if state is not None else cached_update_frequency(url)
     frequency_score = min(update_frequency / 10, 1)  # Normalize to 0-1 range
 
     # Factor 2: Content freshness
@@ -357,56 +261,6 @@ def calculate_keyword_relevance(url):
     relevance = sum(keyword in url.lower() for keyword in keywords)
     return min(relevance / len(keywords), 1)  # Normalize to 0-1 range
 
-def preserve_mathjax(content):
-    # Preserve inline math
-    content = re.sub(r'\$(.+?)\$', r'<span class="math-inline">\1</span>', content)
-    # Preserve block math
-    content = re.sub(r'\$\$(.+?)\$\$', r'<div class="math-block">\1</div>', content, flags=re.DOTALL)
-    return content
-
-def preserve_katex(content):
-    # Preserve inline KaTeX
-    content = re.sub(r'\\(.+?)\\', r'<span class="katex-inline">\1</span>', content)
-    # Preserve block KaTeX
-    content = re.sub(r'\\\[(.+?)\\\]', r'<div class="katex-block">\1</div>', content, flags=re.DOTALL)
-    return content
-
-def preserve_latex(soup):
-    for latex_element in soup.find_all('script', type='math/tex'):
-        latex_element['class'] = latex_element.get('class', []) + ['preserved-latex']
-        latex_element.string = f'$${latex_element.string}$$'
-
-def is_valid_link(url, base_domain, start_path):
-    normalized_url = normalize_url(url)
-    parsed_url = urlparse(normalized_url)
-    if parsed_url.scheme in ["http", "https"] and \
-       parsed_url.netloc == base_domain and \
-       parsed_url.path.startswith(start_path):
-        canonical_url = get_canonical_url_from_head(normalized_url)
-        if canonical_url != normalized_url:
-            log_debug(loggers, f"Using canonical URL: {canonical_url} instead of {normalized_url}")
-            return is_valid_link(canonical_url, base_domain, start_path)
-        log_debug(loggers, f"Valid link found: {normalized_url}")
-        return True
-    log_debug(loggers, f"Invalid link skipped: {normalized_url}")
-    return False
-
-def extract_and_convert_svgs(soup, base_dir):
-    """Extract SVG elements and convert them to PNG."""
-    svgs = soup.find_all('svg')
-    for i, svg in enumerate(svgs):
-        svg_content = str(svg)
-        svg_file = os.path.join(base_dir, f'diagram_{i}.svg')
-        png_file = os.path.join(base_dir, f'diagram_{i}.png')
-        with open(svg_file, 'w') as file:
-            file.write(svg_content)
-        cairosvg.svg2png(url=svg_file, write_to=png_file)
-        img_tag = soup.new_tag('img', src=f'diagram_{i}.png')
-        svg.replace_with(img_tag)
-        os.remove(svg_file)  # Clean up SVG file after conversion
-        log_debug(loggers, f"Converted SVG to PNG: {svg_file} to {png_file}")
-
-
 def compute_content_diff(old_content, new_content):
     differ = difflib.Differ()
     diff = list(differ.compare(old_content.splitlines(), new_content.splitlines()))
@@ -445,79 +299,60 @@ def apply_diff(old_content, diff):
             lines.append(line[2:])
     return '\n'.join(lines)
 
-@retry_with_exponential_backoff
-def fetch_svg_from_iframe(url, base_dir, index):
-    response = requests.get(url)
-    response.raise_for_status()
-    svg_content = response.text
-
-    # Save the SVG content to a temporary file
-    svg_file = os.path.join(base_dir, f'temp_{index}.svg')
-    with open(svg_file, 'w') as file:
-        file.write(svg_content)
-
-    # Convert the SVG to PNG
-    png_file = os.path.join(base_dir, f'diagram_{index}.png')
-    cairosvg.svg2png(url=svg_file, write_to=png_file)
-    os.remove(svg_file)  # Clean up SVG file after conversion
-    log_debug(loggers, f"Converted iframe SVG to PNG: {svg_file} to {png_file}")
-
-    return png_file
-
-def extract_and_convert_iframe_svgs(soup, base_dir, base_url):
-    """Extract SVG elements from iframes and convert them to PNG."""
-    iframes = soup.find_all('iframe', src=True)
-    for index, iframe in enumerate(iframes):
-        src = iframe['src']
-        full_svg_url = urljoin(base_url, src)
-        try:
-            png_file = fetch_svg_from_iframe(full_svg_url, base_dir, index)
-            img_tag = soup.new_tag('img', src=os.path.basename(png_file))
-            iframe.replace_with(img_tag)
-            log_debug(loggers, f"Replaced iframe with img tag: {img_tag}")
-        except Exception as e:
-            log_error(loggers, f"Error processing iframe {src}: {e}")
-
 def get_version_path(doc_name, version):
-    return os.path.join(OUTPUT_DIR, 'docs', doc_name, version)
-
-def save_content(content, url, doc_name, version, content_type):
-    parsed_url = urlparse(url)
-    local_file_path = parsed_url.path.lstrip('/')
+    return os.path.join(get_output_dir(), 'docs', doc_name, version)
 
-    version_dir = get_version_path(doc_name, version)
+def get_page_location(url, version_dir, content_type):
+    """(directory, filename) of a page in the directory-tree layout."""
+    local_file_path = urlparse(url).path.lstrip('/')
     file_dir = os.path.join(version_dir, os.path.dirname(local_file_path))
-    os.makedirs(file_dir, exist_ok=True)
-
     filename = os.path.basename(local_file_path) or 'index.html'
     if not filename.endswith(('.html', '.xml', '.txt')):
         extension = '.html' if content_type.startswith('text/html') else '.txt'
         filename += extension
+    return file_dir, filename
 
-    filepath = os.path.join(file_dir, filename)
+def process_page_content(content, url, doc_name, version, content_type, reuse_sections=True):
+    """Clean, parse and run the processing stages; returns (soup, additional_metadata, file_dir, filename).
 
-    # Process content based on MIME type
-    if content_type.startswith('text/html') or content_type.startswith('application/xhtml+xml'):
-        cleaned_content, additional_metadata = clean_and_normalize_content(content, url)
-        soup = BeautifulSoup(cleaned_content, 'html.parser')
+    Only the sections that changed since the last run of this URL go through
+    the stages; reuse_sections=False processes the whole page.
+    """
+    from bs4 import BeautifulSoup
 
-        # Extract and download assets
-        assets = extract_asset_links(soup, url)
-        download_assets(assets, doc_name, version)
+    file_dir, filename = get_page_location(url, get_version_path(doc_name, version), content_type)
 
-        # Update asset references in the HTML
-        soup = update_asset_references(soup, assets, doc_name, version)
-
-        process_html_content(soup, url, file_dir)
+    # Process content based on MIME type
+    if content_type.startswith('text/html') or content_type.startswith('application/xhtml+xml'):
+        with metrics.timed('parse'):
+            cleaned_content, additional_metadata = clean_and_normalize_content(content, url)
+            soup = BeautifulSoup(cleaned_content, 'html.parser')
+
+        # Asset download, math and code preservation, SVG conversion, ... run as processing stages
+        html, additional_metadata['sections'] = process_sections(
+            soup, url, doc_name, version, lambda work: process_html_content(work, url, file_dir, doc_name, version), reuse=reuse_sections,
+        )
+        with metrics.timed('parse'):
+            soup = BeautifulSoup(html, 'html.parser')
     elif content_type.startswith(('application/xml', 'text/xml')):
         soup = BeautifulSoup(content, 'xml')
         additional_metadata = {'content_type': 'xml'}
     else:  # Plain text
         soup = content
         additional_metadata = {'content_type': 'text'}
+    return soup, additional_metadata, file_dir, filename
+
+def save_content(content, url, doc_name, version, content_type):
+    soup, additional_metadata, file_dir, filename = process_page_content(content, url, doc_name, version, content_type)
+    filepath = os.path.join(file_dir, filename)
 
-    save_file_content(soup, filepath)
-    save_metadata(soup, url, filename, file_dir, additional_metadata)
+    if shard_output.enabled:
+        version_dir = get_version_path(doc_name, version)
+        save_to_shard(soup, url, os.path.relpath(filepath, version_dir), version_dir, additional_metadata, content_type)
+    else:
+        os.makedirs(file_dir, exist_ok=True)
+        save_file_content(soup, filepath)
+        save_metadata(soup, url, filename, file_dir, additional_metadata)
 
 def normalize_query_params(url):
     parsed = urlparse(url)
@@ -539,10 +374,37 @@ def save_file_content(soup, filepath):
     except Exception as e:
         log_error(loggers, f"Error saving content to {filepath}: {str(e)}")
 
+def build_metadata(soup, url, additional_metadata):
+    metadata = extract_metadata(soup, url, str(soup))
+    metadata.update(additional_metadata)
+    return metadata
+
+def save_to_shard(soup, url, relative_path, version_dir, additional_metadata, content_type):
+    try:
+        metadata = build_metadata(soup, url, additional_metadata)
+    except Exception as e:
+        log_error(loggers, f"Error extracting metadata for {url}: {str(e)}")
+        metadata = None
+    try:
+        shard_output.writer(os.path.join(version_dir, 'shards')).write(url, relative_path, str(soup), metadata, content_type)
+        log_debug(loggers, f'Queued {url} for shard output')
+    except Exception as e:
+        log_error(loggers, f"Error saving {url} to shard: {str(e)}")
+
+def save_page_diff(doc_name, version, url, diff):
+    """Latest section diff of a page, under <version>/diffs/ in both output formats."""
+    version_dir = get_version_path(doc_name, version)
+    file_dir, filename = get_page_location(url, os.path.join(version_dir, 'diffs'), 'text/html')
+    try:
+        os.makedirs(file_dir, exist_ok=True)
+        with open(os.path.join(file_dir, os.path.splitext(filename)[0] + '.json'), 'w', encoding='utf-8') as f:
+            json.dump(diff, f, ensure_ascii=False)
+    except Exception as e:
+        log_error(loggers, f"Error saving diff for {url}: {str(e)}")
+
 def save_metadata(soup, url, filename, directory, additional_metadata):
     try:
-        metadata = extract_metadata(soup, url, str(soup))
-        metadata.update(additional_metadata)
+        metadata = build_metadata(soup, url, additional_metadata)
 
         metadata_filename = os.path.splitext(filename)[0] + '_metadata.json'
         metadata_filepath = os.path.join(directory, metadata_filename)
@@ -554,20 +416,48 @@ def save_metadata(soup, url, filename, directory, additional_metadata):
 @circuit_breaker
 @retry_with_exponential_backoff
 def fetch_page(driver, url):
+    if isinstance(driver, CDPPage):
+        # Rendering, scrolling and expansion all happen on the shared CDP renderer
+        driver.get(url, get_custom_headers())
+        if fetcher.recording:
+            info = driver.document_info
+            fetcher.record_rendered(url, driver.page_source, info.get('url'), info.get('lastModified'), info.get('etag'))
+        return driver.page_source
+
+    from selenium.webdriver.support.ui import WebDriverWait
+    from selenium.webdriver.support import expected_conditions as EC
+    from selenium.webdriver.common.by import By
+    from selenium.common.exceptions import TimeoutException, WebDriverException
+
     try:
         for key, value in get_custom_headers().items():
             driver.execute_cdp_cmd('Network.setExtraHTTPHeaders', {'headers': {key: value}})
 
+        get_network_tracker(driver).reset()
         driver.get(url)
         WebDriverWait(driver, 10).until(EC.presence_of_element_located((By.TAG_NAME, "body")))
 
+        # Scrolling and expansion share one settle budget for the page
+        settler = PageSettler(driver)
+
         # Handle infinite scrolling
-        scroll_page(driver)
+        with metrics.timed('scroll'):
+            scroll_page(driver, settler)
 
         # Handle click-to-expand content
-        expand_content(driver)
-
-        return driver.page_source
+        with metrics.timed('expand'):
+            expand_content(driver, settler)
+
+        # Keep the subresources Chrome just loaded so save_content does not fetch them again
+        if response_store.enabled:
+            with metrics.timed('capture'):
+                capture_response_bodies(driver)
+
+        page_source = driver.page_source
+        if fetcher.recording:
+            headers = get_document_headers(driver)
+            fetcher.record_rendered(url, page_source, driver.current_url, headers.get('Last-Modified'), headers.get('ETag'))
+        return page_source
     except TimeoutException:
         log_warning(loggers, f"Timeout while loading {url}")
         raise
@@ -577,9 +467,15 @@ def fetch_page(driver, url):
 
 
 
+def extract_page_links(driver, url, base_domain, start_path):
+    # CDP pages have no element API; parse the rendered source instead
+    if isinstance(driver, CDPPage):
+        return extract_links(url, driver.page_source, base_domain, start_path)
+    return extract_links_selenium(driver, base_domain, start_path)
+
 def has_headers_changed(url, existing_headers):
     try:
-        response = requests.head(url)
+        response = fetcher.head(url)
         new_headers = {
             'Last-Modified': response.headers.get('Last-Modified'),
             'ETag': response.headers.get('ETag'),
@@ -591,20 +487,30 @@ def has_headers_changed(url, existing_headers):
     except requests.RequestException:
         return True  # If we can't check, assume it has changed
 
-def get_stored_headers(url):
+stored_headers_cache = caches.create('stored_headers', max_entries=10000, ttl=3600)
+
+def _load_stored_headers(url):
     conn = create_connection()
-    if conn is not None:
-        try:
-            c = conn.cursor()
-            c.execute("SELECT headers FROM page_headers WHERE url = ?", (url,))
-            result = c.fetchone()
-            if result:
-                return json.loads(result[0])
-            return None
-        except Error as e:
-            log_error(loggers, f"Error retrieving stored headers: {e}")
-        finally:
-            conn.close()
+    if conn is None:
+        raise DatabaseError("Failed to create database connection")
+    try:
+        c = conn.cursor()
+        c.execute("SELECT headers FROM page_headers WHERE url = ?", (url,))
+        result = c.fetchone()
+        if result:
+            return json.loads(result[0])
+        return None
+    except Error as e:
+        raise DatabaseError(f"Failed to retrieve stored headers: {str(e)}")
+    finally:
+        conn.close()
+
+def get_stored_headers(url):
+    # Failed lookups are not cached
+    try:
+        return stored_headers_cache.get_or_load(url, lambda: _load_stored_headers(url))
+    except DatabaseError as e:
+        log_error(loggers, f"Error retrieving stored headers: {e.log_message()}")
     return None
 
 def update_stored_headers(url, headers):
@@ -615,6 +521,8 @@ def update_stored_headers(url, headers):
             headers_json = json.dumps(headers)
             c.execute("INSERT OR REPLACE INTO page_headers (url, headers) VALUES (?, ?)", (url, headers_json))
             conn.commit()
+            stored_headers_cache.invalidate(url)
+            page_states.invalidate(url)
         except Error as e:
             log_error(loggers, f"Error updating stored headers: {e}")
         finally:
@@ -629,9 +537,9 @@ def scrape_page(base_url, doc_name, version, initial_delay=1):
     sitemap_urls = parse_sitemap(base_url)
     queue = deque(sitemap_urls + [base_url])
     rate_limiter = DynamicRateLimiter(initial_delay=initial_delay)
-    hash_manager = VersionedContentHashManager(OUTPUT_DIR)
+    hash_manager = VersionedContentHashManager(get_output_dir())
 
-    driver = setup_webdriver()
+    driver = setup_webdriver(doc_name)
     circuit_breaker = CircuitBreaker()
 
     try:
@@ -683,99 +591,62 @@ def scrape_page(base_url, doc_name, version, initial_delay=1):
                     rate_limiter.backoff()
 
     finally:
-        driver.quit()
+        quit_webdriver(driver)
 
 
-@retry_with_exponential_backoff
-def parse_sitemap(base_url):
-    sitemap_url = urljoin(base_url, 'sitemap.xml')
-    try:
-        response = requests.get(sitemap_url)
-        response.raise_for_status()  # Raise an exception for bad status codes
-
-        sitemap_dict = xmltodict.parse(response.content)
-
-        urls = []
-        if 'urlset' in sitemap_dict:
-            # Standard sitemap
-            for url in sitemap_dict['urlset']['url']:
-                urls.append(url['loc'])
-        elif 'sitemapindex' in sitemap_dict:
-            # Sitemap index file
-            for sitemap in sitemap_dict['sitemapindex']['sitemap']:
-                urls.extend(parse_sitemap(sitemap['loc']))
-
-        return urls
-    except requests.RequestException as e:
-        log_error(loggers, f"Error fetching sitemap from {sitemap_url}: {e}")
-        return []
-    except xmltodict.expat.ExpatError as e:
-        log_error(loggers, f"Error parsing sitemap XML from {sitemap_url}: {e}")
-        return []
+def get_sitemap_url(base_url):
+    if base_url.endswith(('.xml', '.xml.gz')):
+        return base_url
+    return urljoin(base_url, 'sitemap.xml')
 
+# One full scan of the pages table per start URL; save_page clears it
+last_updated_cache = caches.create('last_updated', max_entries=16, ttl=300)
 
-def worker(queue, doc_name, version, rate_limiter, hash_manager, visited, driver, base_domain, start_path, link_integrity_results):
-    while True:
-        try:
-            priority, url = queue.get(timeout=1)  # Unpack both priority and URL
-            normalized_url = normalize_url(url)
-            soup = BeautifulSoup(requests.get(normalized_url).content, 'html.parser')
-            canonical_url = get_canonical_url(soup, normalized_url)
-            if canonical_url != normalized_url:
-                log_info(loggers, f"Canonical URL found: {canonical_url} for {normalized_url}")
-                normalized_url = canonical_url
-            scrape_single_page(normalized_url, doc_name, version, rate_limiter, hash_manager, visited, queue, driver, base_domain, start_path, link_integrity_results)
-        except queue.Empty:
-            break  # Exit if the queue is empty
-        finally:
-            queue.task_done()
-
-def get_canonical_url_from_head(url):
+def iter_changed_sitemap_entries(base_url, max_workers=4, skipped=None):
+    """Stream sitemap entries, dropping those whose lastmod is not newer than our stored copy (collected in `skipped`)."""
     try:
-        response = requests.head(url, allow_redirects=True)
-        if 'Link' in response.headers:
-            links = requests.utils.parse_header_links(response.headers['Link'])
-            for link in links:
-                if link.get('rel') == 'canonical':
-                    return link.get('url')
-    except requests.RequestException:
-        log_warning(loggers, f"Error checking canonical URL for {url}")
-    return url
+        if page_states.covers(base_url):
+            last_updated = page_states.last_updated_view()
+        else:
+            last_updated = last_updated_cache.get_or_load(base_url, lambda: get_last_updated_map(base_url))
+    except DatabaseError as e:
+        log_warning(loggers, f"Cannot load stored timestamps, not filtering sitemap by lastmod: {e.log_message()}")
+        last_updated = {}
+    entries = iter_sitemap_entries(get_sitemap_url(base_url), max_workers=max_workers)
+    return filter_changed_entries(entries, last_updated, skipped)
 
-def save_scrape_state(doc_name, version, queue, visited):
-    state = {
-        'queue': list(queue.queue),
-        'visited': list(visited)
-    }
-    state_file = os.path.join(OUTPUT_DIR, 'scrape_states', f'{doc_name}_{version}_state.json')
-    with open(state_file, 'w') as f:
-        json.dump(state, f)
+def parse_sitemap(base_url):
+    return [entry.loc for entry in iter_sitemap_entries(get_sitemap_url(base_url))]
+
+def get_urls_to_scrape(base_url):
+    return [entry.loc for entry in iter_changed_sitemap_entries(base_url)]
 
 
-last_save_time = time.time()
+def get_scrape_state_dir():
+    return os.path.join(get_output_dir(), 'scrape_states')
 
-def time_to_save_state():
-    global last_save_time
-    current_time = time.time()
-    if current_time - last_save_time > 300:  # Save every 5 minutes
-        last_save_time = current_time
-        return True
-    return False
+def open_crawl_journal(doc_name, version):
+    return CrawlJournal(get_scrape_state_dir(), doc_name, version)
+
+def save_scrape_state(journal):
+    # Events are already on disk; this only folds the journal into a snapshot when it has grown enough
+    journal.maybe_compact()
 
 def load_scrape_state(doc_name, version):
-    state_file = os.path.join(OUTPUT_DIR, 'scrape_states', f'{doc_name}_{version}_state.json')
-    if os.path.exists(state_file):
-        with open(state_file, 'r') as f:
-            state = json.load(f)
-        return state
-    return None
+    journal = open_crawl_journal(doc_name, version)
+    if not journal.has_state():
+        return None
+    frontier, visited = journal.load()
+    return {'queue': frontier, 'visited': visited}
 
 
 def check_link_integrity(url, base_url):
+    from bs4 import BeautifulSoup
+
     try:
         proxy = ProxyManager().get_proxy()
         headers = get_custom_headers()
-        response = requests.head(url, allow_redirects=True, timeout=10, proxies=proxy, headers=headers)
+        response = fetcher.head(url, allow_redirects=True, timeout=10, proxies=proxy, headers=headers)
         result = {
             'url': url,
             'status_code': response.status_code,
@@ -791,7 +662,7 @@ def check_link_integrity(url, base_url):
         if result['is_internal'] and '#' in url:
             # Check if anchor exists for internal links
             anchor = url.split('#')[-1]
-            page_content = requests.get(url, proxies=proxy, headers=headers).text
+            page_content = fetcher.get(url, proxies=proxy, headers=headers).text
             soup = BeautifulSoup(page_content, 'html.parser')
             result['anchor_exists'] = bool(soup.find(id=anchor) or soup.find('a', {'name': anchor}))
 
@@ -813,7 +684,7 @@ def process_link_integrity_results(link_integrity_results, doc_name, version):
     missing_anchors = [r for r in results if r.get('is_internal', False) and not r.get('anchor_exists', True)]
 
     # Save the results
-    output_dir = os.path.join(OUTPUT_DIR, 'link_integrity', doc_name, version)
+    output_dir = os.path.join(get_output_dir(), 'link_integrity', doc_name, version)
     os.makedirs(output_dir, exist_ok=True)
 
     with open(os.path.join(output_dir, 'link_integrity_report.json'), 'w') as f:
@@ -827,20 +698,11 @@ def process_link_integrity_results(link_integrity_results, doc_name, version):
     log_info(loggers, f"Link integrity report saved for {doc_name} version {version}")
     log_info(loggers, f"Total links: {len(results)}, Broken: {len(broken_links)}, Redirects: {len(redirects)}, Missing anchors: {len(missing_anchors)}")
 
-def get_canonical_url(soup, url):
-    canonical_tag = soup.find('link', rel='canonical')
-    if canonical_tag and canonical_tag.get('href'):
-        canonical_url = canonical_tag['href']
-        # Ensure the canonical URL is absolute
-        return urljoin(url, canonical_url)
-    return url  # If no canonical URL is specified, return the original URLs
-
-def download_media_file(url, doc_name, version):
+def download_media_file(url, doc_name, version, content_type=None):
     try:
-        response = requests.get(url, stream=True)
-        response.raise_for_status()
-
-        content_type = response.headers.get('Content-Type', '').split(';')[0]
+        captured = response_store.get(url) if response_store.enabled else None
+        if content_type is None:
+            content_type = captured[1] if captured else fetcher.head(url, allow_redirects=True, timeout=10).headers.get('Content-Type', '').split(';')[0]
         file_extension = mimetypes.guess_extension(content_type) or ''
 
         parsed_url = urlparse(url)
@@ -849,13 +711,13 @@ def download_media_file(url, doc_name, version):
             local_file_path += file_extension
 
         file_path = os.path.join(get_version_path(doc_name, version), local_file_path)
-        os.makedirs(os.path.dirname(file_path), exist_ok=True)
 
-        with open(file_path, 'wb') as f:
-            for chunk in response.iter_content(chunk_size=8192):
-                f.write(chunk)
+        # Streams to a temp file and resumes from it if a previous attempt was interrupted
+        result = response_store.save(url, file_path, captured) if captured else None
+        result = result or stream_download(url, file_path)
 
         log_info(loggers, f"Downloaded media file: {url} to {file_path}")
+        return result
     except Exception as e:
         log_error(loggers, f"Error downloading media file {url}: {str(e)}")
 
@@ -896,37 +758,38 @@ def extract_asset_links(soup, base_url):
 
 def download_asset(url, save_path):
     try:
-        response = requests.get(url)
-        response.raise_for_status()
-        os.makedirs(os.path.dirname(save_path), exist_ok=True)
-        with open(save_path, 'wb') as f:
-            f.write(response.content)
+        result = response_store.save(url, save_path)
+        if result is None:
+            result = stream_download(url, save_path)
         log_info(loggers, f"Downloaded asset: {url} to {save_path}")
+        return result
     except Exception as e:
         log_error(loggers, f"Error downloading asset {url}: {str(e)}")
 
+def get_asset_path(base_path, asset_type, url):
+    """Where download_assets stores an asset under a version directory."""
+    return os.path.join(base_path, 'assets', asset_type, urlparse(url).path.lstrip('/'))
+
 def download_assets(assets, doc_name, version):
     base_path = get_version_path(doc_name, version)
     for asset_type, urls in assets.items():
         for url in urls:
-            parsed_url = urlparse(url)
-            local_path = os.path.join(base_path, 'assets', asset_type, parsed_url.path.lstrip('/'))
-            download_asset(url, local_path)
+            download_asset(url, get_asset_path(base_path, asset_type, url))
 
 def update_asset_references(soup, assets, doc_name, version):
     base_path = get_version_path(doc_name, version)
 
     for link in soup.find_all('link', rel='stylesheet'):
         if link.get('href') in assets['css']:
-            link['href'] = os.path.relpath(os.path.join(base_path, 'assets', 'css', urlparse(link['href']).path.lstrip('/')), base_path)
+            link['href'] = os.path.relpath(get_asset_path(base_path, 'css', link['href']), base_path)
 
     for script in soup.find_all('script', src=True):
         if script.get('src') in assets['js']:
-            script['src'] = os.path.relpath(os.path.join(base_path, 'assets', 'js', urlparse(script['src']).path.lstrip('/')), base_path)
+            script['src'] = os.path.relpath(get_asset_path(base_path, 'js', script['src']), base_path)
 
     for img in soup.find_all('img', src=True):
         if img.get('src') in assets['images']:
-            img['src'] = os.path.relpath(os.path.join(base_path, 'assets', 'images', urlparse(img['src']).path.lstrip('/')), base_path)
+            img['src'] = os.path.relpath(get_asset_path(base_path, 'images', img['src']), base_path)
 
     return soup
 
@@ -954,15 +817,6 @@ def prioritize_pages(urls, hash_manager, doc_name, version):
 
 
 
-def resume_scrape(start_url):
-    last_url = get_last_scraped_url()
-    if last_url:
-        # Start scraping from the last successfully scraped URL
-        start_scraping_from(last_url)
-    else:
-        # Start from the beginning
-        start_scraping_from(start_url)
-
 def save_link_integrity(result):
     conn = create_connection()
     if conn is not None:
@@ -983,17 +837,10 @@ def save_link_integrity(result):
         print("Error! Cannot create the database connection.")
 
 
-checksum_cache = {}
-
-@lru_cache(maxsize=1000)
+# save_page invalidates the entry of every page it writes
+@cached('checksums', max_entries=10000, ttl=3600)
 def cached_load_checksum(url):
-    if url in checksum_cache:
-        checksum, timestamp = checksum_cache[url]
-        if datetime.now() - timestamp < timedelta(hours=1):  # Cache for 1 hour
-            return checksum
-    checksum = load_checksum(url)
-    checksum_cache[url] = (checksum, datetime.now())
-    return checksum
+    return load_checksum(url)
 
 
 def chunk_content(content, chunk_size=1000):
@@ -1,54 +1,136 @@
 # ./00_html_content_collector/scraper_core.py
-from scraper import normalize_url, is_valid_link, cached_load_checksum, get_stored_headers, has_headers_changed, download_media_file, calculate_checksum, get_canonical_url, save_content, prioritize_pages, check_link_integrity, extract_links_selenium, save_page, update_partial_content, circuit_breaker, fetch_page, generate_optimized_diff, save_scrape_progress, setup_webdriver, save_link_integrity, time_to_save_state, process_link_integrity_results, worker, save_scrape_state, update_stored_headers, urlparse, VersionedContentHashManager, RetryExhaustedException
 import os
 import time
-import requests
 import concurrent.futures
+from queue import Empty
+from urllib.parse import urlparse
 from requests.exceptions import RequestException
 from multiprocessing import Manager
 from threading import Lock
-from bs4 import BeautifulSoup
-from config import OUTPUT_DIR
-import PriorityQueue
+from scraper import (
+    PriorityQueue, VersionedContentHashManager, cached_load_checksum, get_stored_headers, has_headers_changed,
+    update_stored_headers, download_media_file, save_content, prioritize_pages, check_link_integrity,
+    save_page_diff, circuit_breaker, fetch_page, extract_page_links, save_link_integrity,
+    process_link_integrity_results, save_scrape_state, open_crawl_journal, iter_changed_sitemap_entries
+)
+from utils import normalize_url, calculate_checksum, RetryExhaustedException
+from link_extractor import is_valid_link, get_canonical_url, extract_links_selenium
+from diff_generator import generate_section_diff
+from near_duplicate import near_duplicates
+from db_manager import save_page, save_scrape_progress, get_last_scraped_url
+from config import get_output_dir
 from rate_limiter import DynamicRateLimiter
-from logger import setup_logging, log_error, log_info, log_warning, log_debug
-from custom_exceptions import NetworkError, ParsingError, DatabaseError, ContentChangedError, CircuitBreakerError
+from webdriver_manager import setup_webdriver, create_page_driver, close_renderers, get_document_headers, quit_webdriver
+from module_loader import shutdown_stage_executors
+from shard_writer import shard_output
+from fetcher import fetcher
+from metrics import metrics
+from cache import caches
+from state_index import page_states
+from profiler import profiler
+from logger import setup_logging, log_error, log_info, log_warning, log_context
+from custom_exceptions import NetworkError, ParsingError, DatabaseError, ContentChangedError, CircuitBreakerError, DuplicateContentError
 
 # Initialize loggers
 loggers = setup_logging(output_dir='logs', doc_name='scraper_core', version='v1')
 
-def scrape_single_page(url, doc_name, version, rate_limiter, hash_manager, visited, queue, driver, base_domain, start_path, link_integrity_results):
+def mark_visited(url, visited, journal=None):
+    visited.add(url)
+    if journal is not None:
+        journal.record_visit(url)
+
+def enqueue_link(queue, priority, link, journal=None):
+    queue.put((priority, link))
+    if journal is not None:
+        journal.record_push(link, priority)
+
+def enqueue_page_links(driver, url, base_domain, start_path, hash_manager, doc_name, version, visited, queue, journal=None):
+    with metrics.timed('link_extraction'):
+        links, pagination_links = extract_page_links(driver, url, base_domain, start_path)
+
+    # Recalculate priorities for all links
+    all_links = links.union(pagination_links)
+    with metrics.timed('prioritize'):
+        prioritized_links = prioritize_pages(all_links, hash_manager, doc_name, version)
+
+    for priority, link in prioritized_links:
+        if link not in visited:
+            if link in pagination_links:
+                priority *= 1.5  # Increase priority for pagination links
+            enqueue_link(queue, priority, link, journal)
+    return all_links
+
+def _in_scope(link, base_domain, start_path):
+    # Cheap scope check; is_valid_link would issue a HEAD request for every sitemap URL
+    parsed_link = urlparse(link)
+    return parsed_link.netloc == base_domain and parsed_link.path.startswith(start_path)
+
+def seed_queue_from_sitemap(url, queue, base_domain, start_path, visited, journal=None):
+    seeded = 0
+    skipped = set()
+    for entry in iter_changed_sitemap_entries(url, skipped=skipped):
+        link = normalize_url(entry.loc)
+        if not _in_scope(link, base_domain, start_path):
+            continue
+        priority = 1.0 + (entry.priority if entry.priority is not None else 0.5)
+        enqueue_link(queue, priority, link, journal)
+        seeded += 1
+    # Unchanged according to their lastmod: marked visited, so links from other pages do not fetch them either
+    for link in skipped:
+        if _in_scope(link, base_domain, start_path):
+            mark_visited(link, visited, journal)
+    log_info(loggers, f"Seeded {seeded} URLs from sitemap for {url}")
+    return seeded
+
+def scrape_single_page(url, doc_name, version, rate_limiter, hash_manager, visited, queue, driver, base_domain, start_path, link_integrity_results, journal=None):
+    from bs4 import BeautifulSoup
+
     normalized_url = normalize_url(url)
     if normalized_url not in visited and is_valid_link(normalized_url, base_domain, start_path):
+        page_start = time.perf_counter()
         try:
-            with rate_limiter.lock:
-                rate_limiter.wait()
+            with metrics.timed('rate_limit_wait'):
+                with rate_limiter.lock:
+                    rate_limiter.wait()
 
             start_time = time.time()
 
-            # Load the existing checksum and headers
-            existing_checksum = cached_load_checksum(normalized_url)
-            existing_headers = get_stored_headers(normalized_url)
+            # Load the existing checksum and headers, from the state preloaded at crawl start where possible
+            with metrics.timed('db_read'):
+                state = page_states.get(normalized_url)
+                if state is not None:
+                    existing_checksum, existing_headers = state.checksum, state.validators
+                else:
+                    existing_checksum = cached_load_checksum(normalized_url)
+                    existing_headers = get_stored_headers(normalized_url)
 
-            if not has_headers_changed(url, existing_headers):
+            with metrics.timed('head_check'):
+                headers_changed = has_headers_changed(url, existing_headers)
+            if not headers_changed:
                 log_info(loggers, f'Headers unchanged, skipping: {url}')
+                mark_visited(url, visited, journal)
+                metrics.page_done('headers_unchanged')
                 return
 
             try:
-                content_type = requests.head(url).headers.get('Content-Type', '').split(';')[0]
+                with metrics.timed('head_check'):
+                    content_type = fetcher.head(url).headers.get('Content-Type', '').split(';')[0]
             except RequestException as e:
                 raise NetworkError(f"Failed to fetch headers for {url}: {str(e)}", url=url)
 
             if content_type.startswith(('image/', 'audio/', 'video/', 'application/pdf')):
-                download_media_file(url, doc_name, version)
-                visited.add(url)
+                with metrics.timed('asset_download'):
+                    download_media_file(url, doc_name, version, content_type)
+                mark_visited(url, visited, journal)
+                metrics.page_done('media')
             else:
                 @circuit_breaker
                 def fetch_with_circuit_breaker():
                     return fetch_page(driver, url)
 
                 try:
-                    content = fetch_with_circuit_breaker()
+                    with metrics.timed('render'):
+                        content = fetch_with_circuit_breaker()
                 except RetryExhaustedException as e:
                     raise NetworkError(f"Max retries reached for {url}: {str(e)}", url=url)
                 except CircuitBreakerError as e:
@@ -56,119 +138,170 @@ def scrape_single_page(url, doc_name, version, rate_limiter, hash_manager, visit
                 except Exception as e:
                     raise NetworkError(f"Unexpected error while fetching {url}: {str(e)}", url=url)
 
-                new_checksum = calculate_checksum(content)
+                with metrics.timed('parse'):
+                    soup = BeautifulSoup(content, 'html.parser')
+                with metrics.timed('fingerprint'):
+                    new_checksum = calculate_checksum(content, doc_name, soup)
 
                 if existing_checksum != new_checksum:
-                    soup = BeautifulSoup(content, 'html.parser')
-                    canonical_url = get_canonical_url(soup, url)
+                    with metrics.timed('parse'):
+                        canonical_url = get_canonical_url(soup, url)
 
                     if canonical_url != url:
                         log_info(loggers, f"Canonical URL found for {url}: {canonical_url}")
                         if canonical_url in visited:
                             log_info(loggers, f"Canonical URL {canonical_url} already visited, skipping.")
+                            metrics.page_done('canonical_duplicate')
                             return
                         url = canonical_url  # Use the canonical URL from this point on
 
+                    duplicate_of = near_duplicates.check(soup, url, doc_name, version)
+                    if duplicate_of is not None:
+                        mark_visited(url, visited, journal)
+                        # Paginated variants can still link to pages not seen yet
+                        enqueue_page_links(driver, url, base_domain, start_path, hash_manager, doc_name, version, visited, queue, journal)
+                        raise DuplicateContentError("Near duplicate, not processed or stored again", url=url, duplicate_url=duplicate_of)
+
                     with hash_manager.lock:
-                        old_hash_info = hash_manager.get_hash_info(doc_name, version, url)
-                        if hash_manager.content_changed(doc_name, version, url, content):
-                            visited.add(url)
+                        if hash_manager.content_changed(doc_name, version, url, content, new_checksum):
+                            mark_visited(url, visited, journal)
                             log_info(loggers, f'Content changed, updating: {url}')
 
-                            if old_hash_info:
-                                # Generate diff using the new function
-                                diff = generate_optimized_diff(old_hash_info['content'], content, doc_name, version)
+                            try:
+                                old_content = hash_manager.versions.replace(doc_name, version, url, content)
+                            except DatabaseError as e:
+                                log_error(loggers, f"No previous version for {url}, skipping the diff: {e.log_message()}")
+                                old_content = None
+
+                            # Only the sections that changed since the last crawl go through the processing stages
+                            with metrics.timed('save_content'):
+                                save_content(content, url, doc_name, version, content_type)
+
+                            if old_content is not None:
                                 try:
-                                    update_partial_content(doc_name, version, url, diff)
+                                    with metrics.timed('diff'):
+                                        diff = generate_section_diff(old_content, content, doc_name, version)
+                                    save_page_diff(doc_name, version, url, diff)
                                 except Exception as e:
-                                    log_error(loggers, f"Partial update failed for {url}: {str(e)}")
-                                    # Fallback to full content update
-                                    save_content(content, url, doc_name, version, content_type)
-                            else:
-                                # Full save for new content
-                                save_content(content, url, doc_name, version, content_type)
+                                    log_error(loggers, f"Diff failed for {url}: {str(e)}")
 
                             # Save to database
-                            new_headers = {
-                                'Last-Modified': driver.execute_script("return document.lastModified;"),
-                                'ETag': driver.execute_script("return document.querySelector('meta[name=\"etag\"]')?.content;"),
-                                'Content-Length': len(content)
-                            }
+                            new_headers = dict(get_document_headers(driver), **{'Content-Length': len(content)})
                             try:
-                                save_page(url, content, new_checksum, new_headers)
+                                with metrics.timed('db_write'):
+                                    save_page(url, content, new_checksum, new_headers)
                             except Exception as e:
                                 raise DatabaseError(f"Failed to save page {url}: {str(e)}", url=url)
 
                             # Extract links from rendered page
-                            links, pagination_links = extract_links_selenium(driver, base_domain, start_path)
-
-                            # Recalculate priorities for all links
-                            all_links = links.union(pagination_links)
-                            prioritized_links = prioritize_pages(all_links, hash_manager, doc_name, version)
-
-                            for priority, link in prioritized_links:
-                                if link not in visited:
-                                    if link in pagination_links:
-                                        priority *= 1.5  # Increase priority for pagination links
-                                    queue.put((priority, link))
+                            all_links = enqueue_page_links(driver, url, base_domain, start_path, hash_manager, doc_name, version, visited, queue, journal)
 
                             # Perform link integrity check for all links
                             for link in all_links:
-                                integrity_result = check_link_integrity(link, url)
+                                with metrics.timed('link_integrity'):
+                                    integrity_result = check_link_integrity(link, url)
                                 link_integrity_results.append(integrity_result)
-                                save_link_integrity(integrity_result)
+                                with metrics.timed('db_write'):
+                                    save_link_integrity(integrity_result)
+                            metrics.page_done('changed')
                         else:
                             log_info(loggers, f'Content unchanged, skipping: {url}')
+                            mark_visited(url, visited, journal)
+                            metrics.page_done('unchanged')
 
                     # Update stored headers
-                    update_stored_headers(url, new_headers)
+                    with metrics.timed('db_write'):
+                        update_stored_headers(url, new_headers)
                 else:
                     log_info(loggers, f'Content unchanged, skipping: {url}')
+                    mark_visited(url, visited, journal)
+                    metrics.page_done('unchanged')
 
                 # Save scrape progress
-                save_scrape_progress(url)
+                with metrics.timed('db_write'):
+                    save_scrape_progress(url)
 
             with rate_limiter.lock:
                 rate_limiter.update(time.time() - start_time)
 
         except NetworkError as e:
             log_error(loggers, f"Network error while scraping {url}: {e.log_message()}")
+            metrics.inc('errors', kind='network')
             with rate_limiter.lock:
                 rate_limiter.backoff()
         except ParsingError as e:
             log_error(loggers, f"Parsing error while scraping {url}: {e.log_message()}")
+            metrics.inc('errors', kind='parsing')
         except DatabaseError as e:
             log_error(loggers, f"Database error while scraping {url}: {e.log_message()}")
+            metrics.inc('errors', kind='database')
+        except DuplicateContentError as e:
+            log_info(loggers, f"Skipping near-duplicate page: {e.log_message()}")
+            metrics.page_done('near_duplicate')
         except ContentChangedError as e:
             log_warning(loggers, f"Content changed unexpectedly for {url}: {e.log_message()}")
+            metrics.inc('errors', kind='content_changed')
         except Exception as e:
             log_error(loggers, f"Unexpected error while scraping {url}: {str(e)}")
+            metrics.inc('errors', kind='unexpected')
             with rate_limiter.lock:
                 rate_limiter.backoff()
+        finally:
+            metrics.observe('page', time.perf_counter() - page_start)
+
+def worker(queue, doc_name, version, rate_limiter, hash_manager, visited, driver, base_domain, start_path, link_integrity_results, journal=None):
+    from bs4 import BeautifulSoup
 
-def scrape_pages_concurrently(queue, doc_name, version, rate_limiter, hash_manager, visited, base_domain, start_path, link_integrity_results, max_workers=5):
+    while True:
+        try:
+            with metrics.timed('queue_wait'):
+                priority, url = queue.get(timeout=1)  # Unpack both priority and URL
+            normalized_url = normalize_url(url)
+            if normalized_url in visited:
+                continue
+            soup = BeautifulSoup(fetcher.get(normalized_url).content, 'html.parser')
+            canonical_url = get_canonical_url(soup, normalized_url)
+            if canonical_url != normalized_url:
+                log_info(loggers, f"Canonical URL found: {canonical_url} for {normalized_url}")
+                normalized_url = canonical_url
+            with metrics.in_flight(), profiler.profile(normalized_url), log_context(url=normalized_url, doc_name=doc_name, version=version):
+                scrape_single_page(normalized_url, doc_name, version, rate_limiter, hash_manager, visited, queue, driver, base_domain, start_path, link_integrity_results, journal)
+        except Empty:
+            break  # Exit if the queue is empty
+        finally:
+            queue.task_done()
+
+def scrape_pages_concurrently(queue, doc_name, version, rate_limiter, hash_manager, visited, base_domain, start_path, link_integrity_results, max_workers=5, journal=None, renderer='selenium', renderer_options=None):
     def worker_wrapper():
-        driver = setup_webdriver()
-        worker(queue, doc_name, version, rate_limiter, hash_manager, visited, driver, base_domain, start_path, link_integrity_results, loggers)
+        driver = create_page_driver(doc_name, renderer, renderer_options)
+        try:
+            worker(queue, doc_name, version, rate_limiter, hash_manager, visited, driver, base_domain, start_path, link_integrity_results, journal)
+        finally:
+            quit_webdriver(driver)
 
+    metrics.register_gauge('queue_depth', queue.qsize)
     with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
         futures = [executor.submit(worker_wrapper) for _ in range(max_workers)]
 
         while not queue.empty():
-            if time_to_save_state():
-                save_scrape_state(doc_name, version, queue, visited)
+            if journal is not None:
+                save_scrape_state(journal)
 
-            done, not_done = concurrent.futures.wait(futures, timeout=0, return_when=concurrent.futures.FIRST_COMPLETED)
+            # Blocks until a worker finishes, or for a second so the journal still gets checked
+            done, not_done = concurrent.futures.wait(futures, timeout=1, return_when=concurrent.futures.FIRST_COMPLETED)
 
             for future in done:
                 futures.remove(future)
                 futures.append(executor.submit(worker_wrapper))
 
         concurrent.futures.wait(futures)
+    metrics.unregister_gauge('queue_depth')
 
     process_link_integrity_results(link_integrity_results, doc_name, version)
 
-def start_scraping_from(url, doc_name, version, initial_delay=1, max_workers=5):
+def start_scraping_from(url, doc_name, version, initial_delay=1, max_workers=5, resume=False, use_sitemap=True, renderer='selenium', renderer_options=None):
+    from bs4 import BeautifulSoup
+
     log_info(loggers, f"Starting scrape from URL: {url}")
     try:
         parsed_url = urlparse(url)
@@ -176,38 +309,98 @@ def start_scraping_from(url, doc_name, version, initial_delay=1, max_workers=5):
         start_path = os.path.dirname(parsed_url.path)
 
         manager = Manager()
-        visited = manager.Set()
+        # Workers are threads; SyncManager has no Set proxy, and a set shared between threads is enough
+        visited = set()
         queue = PriorityQueue()
         link_integrity_results = manager.list()
 
         rate_limiter = DynamicRateLimiter(initial_delay=initial_delay)
         rate_limiter.lock = Lock()
-        hash_manager = VersionedContentHashManager(OUTPUT_DIR)
+        hash_manager = VersionedContentHashManager(get_output_dir())
         hash_manager.lock = Lock()
 
-        normalized_url = normalize_url(url)
+        # One scan of the stored state instead of several point queries per URL
         try:
-            response = requests.get(normalized_url)
-            response.raise_for_status()
-            soup = BeautifulSoup(response.content, 'html.parser')
-            canonical_url = get_canonical_url(soup, normalized_url)
+            page_states.load(f"{parsed_url.scheme}://{base_domain}{start_path}")
+        except DatabaseError as e:
+            log_warning(loggers, f"Cannot preload stored page state, querying per URL: {e.log_message()}")
+
+        journal = open_crawl_journal(doc_name, version)
+        frontier = None
+        if resume and journal.has_state():
+            frontier, visited_urls = journal.load()
+            if not frontier:
+                # Left by a crawl that ran to the end (or by one that never queued anything)
+                log_info(loggers, f"Crawl journal for {doc_name} {version} has nothing queued, starting a fresh scrape")
+                frontier = None
+        if frontier is not None:
+            for visited_url in visited_urls:
+                visited.add(visited_url)
+            # Re-queue without journaling; these entries are already in the journal
+            for priority, link in frontier:
+                queue.put((priority, link))
+            log_info(loggers, f"Resuming scrape with {len(frontier)} queued and {len(visited_urls)} visited URLs")
+        else:
+            journal.reset()
+            normalized_url = normalize_url(url)
+            try:
+                response = fetcher.get(normalized_url)
+                response.raise_for_status()
+                soup = BeautifulSoup(response.content, 'html.parser')
+                canonical_url = get_canonical_url(soup, normalized_url)
+
+                # Extract initial links
+                if renderer in ('cdp', 'replay'):
+                    start_page = create_page_driver(doc_name, renderer, renderer_options)
+                    fetch_page(start_page, normalized_url)
+                    initial_links, _ = extract_page_links(start_page, normalized_url, base_domain, start_path)
+                else:
+                    start_driver = setup_webdriver(doc_name)
+                    try:
+                        initial_links, _ = extract_links_selenium(start_driver, base_domain, start_path)
+                    finally:
+                        quit_webdriver(start_driver)
 
-            # Extract initial links
-            initial_links, _ = extract_links_selenium(setup_webdriver(), base_domain, start_path)
+                # Prioritize initial links
+                prioritized_links = prioritize_pages(initial_links, hash_manager, doc_name, version)
 
-            # Prioritize initial links
-            prioritized_links = prioritize_pages(initial_links, hash_manager, doc_name, version)
+                # Add prioritized links to the queue
+                for priority, link in prioritized_links:
+                    enqueue_link(queue, priority, link, journal)
 
-            # Add prioritized links to the queue
-            for priority, link in prioritized_links:
-                queue.put((priority, link))
+                if use_sitemap:
+                    seed_queue_from_sitemap(url, queue, base_domain, start_path, visited, journal)
 
-        except RequestException as e:
-            raise NetworkError(f"Error fetching start URL: {str(e)}", url=url)
+            except RequestException as e:
+                raise NetworkError(f"Error fetching start URL: {str(e)}", url=url)
 
-        scrape_pages_concurrently(queue, doc_name, version, rate_limiter, hash_manager, visited, base_domain, start_path, link_integrity_results, max_workers)
+        try:
+            scrape_pages_concurrently(queue, doc_name, version, rate_limiter, hash_manager, visited, base_domain, start_path, link_integrity_results, max_workers, journal, renderer, renderer_options)
+            # The queue ran dry: nothing is left to resume, so the next --resume starts a fresh crawl
+            journal.finish()
+        finally:
+            journal.close()
+            close_renderers()
+            shutdown_stage_executors()
+            shard_output.close()
+            fetcher.close()
+            caches.log_stats()
+            page_states.invalidate()
     except NetworkError as e:
         log_error(loggers, f"Network error in start_scraping_from: {e.log_message()}")
     except Exception as e:
         log_error(loggers, f"Unexpected error in start_scraping_from: {str(e)}")
         raise
+
+def resume_scrape(start_url, doc_name, version, **kwargs):
+    if open_crawl_journal(doc_name, version).has_state():
+        # Restore the frontier and visited set from the crawl journal
+        start_scraping_from(start_url, doc_name, version, resume=True, **kwargs)
+        return
+    last_url = get_last_scraped_url()
+    if last_url:
+        # No journal to resume from; start from the last successfully scraped URL
+        start_scraping_from(last_url, doc_name, version, **kwargs)
+    else:
+        # Start from the beginning
+        start_scraping_from(start_url, doc_name, version, **kwargs)
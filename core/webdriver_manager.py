@@ -1,49 +1,380 @@
 # ./00_html_content_collector/webdriver_manager.py
-from selenium import webdriver
-from webdriver_manager.chrome import ChromeDriverManager
-from selenium.webdriver.chrome.service import Service
-from selenium.webdriver.chrome.options import Options
+import os
+import json
+import base64
 import time
-from selenium.common.exceptions import ElementClickInterceptedException, TimeoutException
-from selenium.webdriver.support.ui import WebDriverWait
-from selenium.webdriver.common.by import By
-from selenium.webdriver.support import expected_conditions as EC
-from custom_exceptions import NetworkError, ParsingError
-from logger import setup_logging, log_error, log_info
+import shutil
+import asyncio
+import fnmatch
+import itertools
+import tempfile
+import threading
+import subprocess
+from custom_exceptions import NetworkError, ParsingError, ConfigurationError
+from logger import setup_logging, log_error, log_info, log_warning, log_debug
+from config import get_manifest
+from metrics import metrics
+from download_manager import response_store
+from fetcher import fetcher
+from browser_profiles import browser_profiles
 from proxy_manager import ProxyManager
 
 # Initialize loggers
 loggers = setup_logging(output_dir='logs', doc_name='webdriver_manager', version='v1')
 
-def setup_webdriver():
+# Installed before any page script runs; records the time of the last DOM mutation
+SETTLE_TRACKER_JS = """
+(function () {
+    if (window.__scraperSettle) { return; }
+    var state = window.__scraperSettle = {lastMutation: performance.now()};
+    var start = function () {
+        new MutationObserver(function () { state.lastMutation = performance.now(); })
+            .observe(document.documentElement, {childList: true, subtree: true, attributes: true, characterData: true});
+    };
+    if (document.documentElement) { start(); } else { document.addEventListener('DOMContentLoaded', start); }
+})();
+"""
+
+# Returns milliseconds since the last DOM mutation, installing the tracker if it is missing
+QUIET_TIME_JS = """
+if (!window.__scraperSettle) {
+""" + SETTLE_TRACKER_JS + """
+}
+return performance.now() - window.__scraperSettle.lastMutation;
+"""
+
+# Clicks every visible, enabled element matching any of the selectors in one round trip
+CLICK_ALL_JS = """
+var selectors = arguments[0], clicked = 0;
+var elements = document.querySelectorAll(selectors.join(','));
+for (var i = 0; i < elements.length; i++) {
+    var el = elements[i];
+    if (el.dataset.scraperClicked || el.disabled || el.getClientRects().length === 0) { continue; }
+    if (arguments[1]) { el.dataset.scraperClicked = '1'; }
+    try { el.click(); clicked++; } catch (e) {}
+}
+return clicked;
+"""
+
+EXPANDABLE_SELECTORS = [
+    ".show-more", ".read-more", ".expand", "[id*='expand']", "[class*='expand']",
+    "[aria-expanded='false']", ".collapsed", ".toggle", ".accordion-header"
+]
+
+# Disjoint from EXPANDABLE_SELECTORS: load-more buttons are clicked unmarked every round until none is left,
+# which would keep flipping a show-more toggle open and closed
+LOAD_MORE_SELECTORS = [
+    ".load-more", "#loadMoreButton",
+    "[data-action='load-more']", "[aria-label='Load more']"
+]
+
+# Responses worth keeping for the asset store when response capture is enabled
+CAPTURED_RESOURCE_TYPES = ('Stylesheet', 'Script', 'Image', 'Media', 'Font')
+
+class NetworkIdleTracker:
+    """Tracks in-flight requests from Chrome's CDP Network events.
+
+    Reads the `performance` log that setup_webdriver enables, matching
+    Network.requestWillBeSent against loadingFinished/loadingFailed. Requests
+    open for longer than stale_after (long polling, streaming) are ignored.
+    """
+
+    def __init__(self, driver=None, stale_after=10.0):
+        # driver is None when events are pushed through handle_event, as CDPTab does
+        self.driver = driver
+        self.stale_after = stale_after
+        self.in_flight = {}
+        self.last_activity = time.monotonic()
+        self.available = True
+        # requestId -> response info, and requestId -> encoded size once the body is complete
+        self.responses = {}
+        self.finished = {}
+
+    def reset(self):
+        self.poll()
+        self.in_flight.clear()
+        self.responses.clear()
+        self.finished.clear()
+        self.last_activity = time.monotonic()
+
+    def poll(self):
+        if not self.available or self.driver is None:
+            return
+        try:
+            entries = self.driver.get_log('performance')
+        except Exception:
+            # Performance logging is not enabled for this driver; rely on DOM quiescence only
+            self.available = False
+            return
+        for entry in entries:
+            try:
+                message = json.loads(entry['message'])['message']
+            except (KeyError, ValueError):
+                continue
+            self.handle_event(message.get('method', ''), message.get('params', {}))
+
+    def handle_event(self, method, params):
+        if method == 'Network.requestWillBeSent':
+            now = time.monotonic()
+            self.in_flight[params.get('requestId')] = now
+            self.last_activity = now
+        elif method in ('Network.loadingFinished', 'Network.loadingFailed'):
+            self.in_flight.pop(params.get('requestId'), None)
+            self.last_activity = time.monotonic()
+            if method == 'Network.loadingFinished':
+                self.finished[params.get('requestId')] = params.get('encodedDataLength', 0)
+        elif method == 'Network.responseReceived':
+            response = params.get('response', {})
+            if response.get('status') == 200 and params.get('type') in CAPTURED_RESOURCE_TYPES:
+                self.responses[params.get('requestId')] = {'url': response.get('url', ''), 'mime_type': response.get('mimeType', '')}
+
+    def capturable_responses(self, max_body_bytes):
+        """(requestId, response) pairs whose bodies finished loading and are small enough to keep."""
+        for request_id, response in list(self.responses.items()):
+            size = self.finished.get(request_id)
+            if size is None or size > max_body_bytes or not response['url'].startswith(('http://', 'https://')):
+                continue
+            yield request_id, response
+
+    def idle_for(self):
+        """Seconds since the network last had activity, or 0 while requests are pending."""
+        now = time.monotonic()
+        for request_id, started in list(self.in_flight.items()):
+            if now - started > self.stale_after:
+                del self.in_flight[request_id]
+        if self.in_flight:
+            return 0.0
+        return now - self.last_activity
+
+
+def decode_response_body(result):
+    if result.get('base64Encoded'):
+        return base64.b64decode(result.get('body', ''))
+    return result.get('body', '').encode('utf-8')
+
+
+def capture_response_bodies(driver):
+    """Copy the bodies of the current page's subresources from Chrome into response_store."""
+    tracker = get_network_tracker(driver)
+    tracker.poll()
+    captured = 0
+    for request_id, response in tracker.capturable_responses(response_store.max_body_bytes):
+        try:
+            result = driver.execute_cdp_cmd('Network.getResponseBody', {'requestId': request_id})
+        except Exception as e:
+            # Evicted from Chrome's buffer or never had a body (e.g. served from a redirect)
+            log_debug(loggers, f"No captured body for {response['url']}: {str(e)}")
+            continue
+        response_store.put(response['url'], decode_response_body(result), response['mime_type'])
+        captured += 1
+    return captured
+
+
+def enable_response_capture(send):
+    """Enable the Network domain with buffers large enough to keep page subresources until captured."""
+    return send('Network.enable', {
+        'maxTotalBufferSize': response_store.max_bytes,
+        'maxResourceBufferSize': response_store.max_body_bytes,
+    })
+
+
+def get_network_tracker(driver):
+    tracker = getattr(driver, 'network_tracker', None)
+    if tracker is None:
+        tracker = driver.network_tracker = NetworkIdleTracker(driver)
+    return tracker
+
+
+class PageSettler:
+    """Waits for a page to settle within an overall per-page time budget.
+
+    A page is settled once the DOM has not mutated and the network has been idle
+    for quiet_period seconds. All waits on one page draw from the same budget.
+    """
+
+    def __init__(self, driver, budget=20.0, quiet_period=0.5, poll_interval=0.1):
+        self.driver = driver
+        self.deadline = time.monotonic() + budget
+        self.quiet_period = quiet_period
+        self.poll_interval = poll_interval
+        self.network = get_network_tracker(driver)
+
+    def remaining(self):
+        return max(self.deadline - time.monotonic(), 0.0)
+
+    def wait(self, max_wait=None):
+        """Block until the page is quiet; returns False if the budget ran out first."""
+        limit = time.monotonic() + min(self.remaining(), max_wait if max_wait is not None else float('inf'))
+        while True:
+            self.network.poll()
+            dom_quiet = self.driver.execute_script(QUIET_TIME_JS) / 1000.0
+            network_quiet = self.network.idle_for() if self.network.available else dom_quiet
+            if min(dom_quiet, network_quiet) >= self.quiet_period:
+                return True
+            if time.monotonic() >= limit:
+                return False
+            time.sleep(self.poll_interval)
+
+    def click_all(self, selectors, mark=True):
+        return self.driver.execute_script(CLICK_ALL_JS, selectors, mark)
+
+
+# URL patterns for resource types that never affect the saved page_source
+RESOURCE_TYPE_PATTERNS = {
+    'image': ['*.png', '*.jpg', '*.jpeg', '*.gif', '*.webp', '*.avif', '*.ico', '*.bmp'],
+    'font': ['*.woff', '*.woff2', '*.ttf', '*.otf', '*.eot'],
+    'media': ['*.mp4', '*.webm', '*.ogg', '*.ogv', '*.mp3', '*.wav', '*.m4a', '*.mov'],
+    'stylesheet': ['*.css'],
+    'script': ['*.js'],
+}
+
+# Analytics, tag managers and ad networks seen on documentation sites
+DEFAULT_BLOCKED_URL_PATTERNS = [
+    '*google-analytics.com*', '*googletagmanager.com*', '*doubleclick.net*',
+    '*googlesyndication.com*', '*googleadservices.com*', '*connect.facebook.net*',
+    '*hotjar.com*', '*segment.com*', '*segment.io*', '*mixpanel.com*', '*clarity.ms*',
+    '*plausible.io*', '*nr-data.net*', '*js-agent.newrelic.com*', '*carbonads.net*',
+    '*buysellads.com*', '*ethicalads.io*', '*heapanalytics.com*', '*fullstory.com*',
+]
+
+DEFAULT_REQUEST_BLOCKING = {
+    'enabled': True,
+    'block_types': ['image', 'font', 'media'],
+    'block_patterns': DEFAULT_BLOCKED_URL_PATTERNS,
+    'allow_patterns': [],
+}
+
+
+def get_request_blocking_config(doc_name=None):
+    """Merge the `request_blocking` section of a documentation source over the defaults.
+
+    Example core_manifest.yaml entry:
+
+        documentation_sources:
+          - name: numpy
+            url: https://numpy.org/doc/stable/
+            request_blocking:
+              block_types: [image, font, media, script]
+              block_patterns: ['*/_static/analytics.js']
+              allow_patterns: ['*mathjax*', '*require.min.js']
+    """
+    config = dict(DEFAULT_REQUEST_BLOCKING)
+    source = next((source for source in get_manifest().get('documentation_sources', []) if source.get('name') == doc_name), None)
+    if source and isinstance(source.get('request_blocking'), dict):
+        config.update(source['request_blocking'])
+    return config
+
+
+def should_block_request(url, resource_type, config):
+    """Decide whether a single request should be blocked; used where requests can be intercepted one by one."""
+    if not config.get('enabled', True):
+        return False
+    if any(fnmatch.fnmatch(url, pattern) for pattern in config.get('allow_patterns', [])):
+        return False
+    if resource_type and resource_type.lower() in config.get('block_types', []):
+        return True
+    return any(fnmatch.fnmatch(url, pattern) for pattern in config.get('block_patterns', []))
+
+
+def build_blocked_url_patterns(config):
+    """Translate a blocking config into patterns for Network.setBlockedURLs.
+
+    setBlockedURLs only understands block patterns, so resource types are mapped
+    to file extensions. Extension blocking for a type is skipped when an allow
+    pattern would fall under it (e.g. 'script' with '*mathjax*' allowed), since
+    the allowlist cannot be honored there.
+    """
+    if not config.get('enabled', True):
+        return []
+    allow_patterns = config.get('allow_patterns', [])
+    patterns = []
+    for resource_type in config.get('block_types', []):
+        type_patterns = RESOURCE_TYPE_PATTERNS.get(resource_type, [])
+        if allow_patterns and resource_type in ('script', 'stylesheet'):
+            log_warning(loggers, f"Not blocking all '{resource_type}' resources because allow_patterns are set")
+            continue
+        patterns.extend(type_patterns)
+    for pattern in config.get('block_patterns', []):
+        if any(fnmatch.fnmatch(allowed, pattern) for allowed in allow_patterns):
+            continue
+        patterns.append(pattern)
+    return patterns
+
+
+def configure_request_blocking(driver, doc_name=None):
+    patterns = build_blocked_url_patterns(get_request_blocking_config(doc_name))
+    if not patterns:
+        return
+    try:
+        driver.execute_cdp_cmd('Network.enable', {})
+        driver.execute_cdp_cmd('Network.setBlockedURLs', {'urls': patterns})
+        log_info(loggers, f"Blocking {len(patterns)} URL patterns while rendering {doc_name or 'pages'}")
+    except Exception as e:
+        log_warning(loggers, f"Could not enable request blocking: {str(e)}")
+
+
+def setup_webdriver(doc_name=None):
+    # Selenium is only needed by the selenium renderer, so it is imported here rather than at module load
+    from selenium import webdriver
+    from selenium.webdriver.chrome.service import Service
+    from selenium.webdriver.chrome.options import Options
+    from webdriver_manager.chrome import ChromeDriverManager
+
+    lease = None
     try:
         chrome_options = Options()
         chrome_options.add_argument("--headless")  # Run in headless mode (no GUI)
         chrome_options.add_argument("--no-sandbox")
         chrome_options.add_argument("--disable-dev-shm-usage")
+        # Exposes CDP Network events through driver.get_log('performance') for idle detection
+        chrome_options.set_capability('goog:loggingPrefs', {'performance': 'ALL'})
 
         proxy = ProxyManager().get_proxy()
         chrome_options.add_argument(f'--proxy-server={proxy["https"]}')
 
+        # A persistent per-source profile lets repeat renders hit Chrome's disk cache
+        if browser_profiles.enabled:
+            lease = browser_profiles.acquire(doc_name)
+            for argument in browser_profiles.chrome_arguments(lease):
+                chrome_options.add_argument(argument)
+
         service = Service(ChromeDriverManager().install())
         driver = webdriver.Chrome(service=service, options=chrome_options)
+        driver.profile_lease = lease
+        driver.execute_cdp_cmd('Page.addScriptToEvaluateOnNewDocument', {'source': SETTLE_TRACKER_JS})
+        configure_request_blocking(driver, doc_name)
+        if response_store.enabled:
+            enable_response_capture(driver.execute_cdp_cmd)
         log_info(loggers, "WebDriver setup successful")
         return driver
     except Exception as e:
+        if lease is not None:
+            lease.release()
         log_error(loggers, NetworkError(f"Failed to setup WebDriver: {str(e)}"))
         raise
 
-def scroll_page(driver):
+def quit_webdriver(driver):
+    """Quit a driver from setup_webdriver or create_page_driver and give back its browser profile."""
+    try:
+        driver.quit()
+    finally:
+        lease = getattr(driver, 'profile_lease', None)
+        if lease is not None:
+            lease.release()
+
+def scroll_page(driver, settler=None, max_height=50000):
+    settler = settler or PageSettler(driver)
     try:
         last_height = driver.execute_script("return document.body.scrollHeight")
-        while True:
+        while settler.remaining() > 0:
             driver.execute_script("window.scrollTo(0, document.body.scrollHeight);")
-            time.sleep(2)
+            # Wait for lazy-loaded content instead of sleeping a fixed interval
+            settler.wait()
             new_height = driver.execute_script("return document.body.scrollHeight")
             if new_height == last_height:
                 break
             last_height = new_height
-            if last_height > 50000:  # Example: stop after 50000 pixels
+            if last_height > max_height:
                 log_info(loggers, "Reached maximum scroll limit")
                 break
         log_info(loggers, "Page scrolling completed")
@@ -51,48 +382,531 @@ def scroll_page(driver):
         log_error(loggers, ParsingError(f"Error while scrolling page: {str(e)}"))
         raise
 
-def expand_content(driver):
-    expandable_selectors = [
-        ".show-more", ".read-more", ".expand", "[id*='expand']", "[class*='expand']",
-        "[aria-expanded='false']", ".collapsed", ".toggle", ".accordion-header"
-    ]
-    load_more_selectors = [
-        ".load-more", ".show-more", "#loadMoreButton",
-        "[data-action='load-more']", "[aria-label='Load more']"
-    ]
+def expand_content(driver, settler=None, max_load_more_rounds=20):
+    settler = settler or PageSettler(driver)
 
     try:
-        for selector in load_more_selectors:
-            while True:
-                try:
-                    load_more_button = WebDriverWait(driver, 10).until(
-                        EC.element_to_be_clickable((By.CSS_SELECTOR, selector))
-                    )
-                    driver.execute_script("arguments[0].click();", load_more_button)
-                    time.sleep(2)
-                except TimeoutException:
-                    break
-                except ElementClickInterceptedException:
-                    driver.execute_script("arguments[0].scrollIntoView();", load_more_button)
-                    time.sleep(1)
-                    continue
-                except Exception as e:
-                    log_error(loggers, ParsingError(f"Error expanding 'Load More' content: {str(e)}"))
-                    break
+        # Load-more buttons may reappear after each batch of content, so click until none are left
+        for _ in range(max_load_more_rounds):
+            if settler.remaining() <= 0:
+                log_info(loggers, "Settle budget exhausted while loading more content")
+                break
+            if not settler.click_all(LOAD_MORE_SELECTORS, mark=False):
+                break
+            settler.wait()
+
+        # Expanders toggle, so each one is clicked once, all in a single batch
+        clicked = settler.click_all(EXPANDABLE_SELECTORS)
+        if clicked:
+            settler.wait()
 
-        for selector in expandable_selectors:
-            elements = driver.find_elements(By.CSS_SELECTOR, selector)
-            for element in elements:
-                try:
-                    if element.is_displayed() and element.is_enabled():
-                        driver.execute_script("arguments[0].click();", element)
-                        time.sleep(1)
-                except ElementClickInterceptedException:
-                    log_error(loggers, ParsingError(f"Could not click element: {selector}"))
-                except Exception as e:
-                    log_error(loggers, ParsingError(f"Error expanding content: {str(e)}"))
-
-        log_info(loggers, "Content expansion completed")
+        log_info(loggers, f"Content expansion completed ({clicked} expanders)")
     except Exception as e:
         log_error(loggers, ParsingError(f"Error in expand_content: {str(e)}"))
         raise
+
+
+# Block types in manifests use the lowercase names; the Fetch domain expects CDP ResourceType values
+CDP_RESOURCE_TYPES = {
+    'document': 'Document', 'stylesheet': 'Stylesheet', 'image': 'Image', 'media': 'Media',
+    'font': 'Font', 'script': 'Script', 'xhr': 'XHR', 'fetch': 'Fetch', 'websocket': 'WebSocket',
+    'manifest': 'Manifest', 'ping': 'Ping', 'other': 'Other',
+}
+
+# Everything scrape_single_page reads back from a rendered page, in one round trip
+PAGE_SNAPSHOT_JS = """
+(function () {
+    var etag = document.querySelector('meta[name="etag"]');
+    return {
+        html: document.documentElement ? document.documentElement.outerHTML : '',
+        url: location.href,
+        lastModified: document.lastModified,
+        etag: etag ? etag.content : null
+    };
+})()
+"""
+
+CHROME_BINARIES = ('google-chrome', 'google-chrome-stable', 'chromium', 'chromium-browser', 'chrome')
+
+
+def build_fetch_patterns(config):
+    """Fetch.enable patterns that pause only requests which might be blocked."""
+    if not config.get('enabled', True):
+        return []
+    patterns = [
+        {'urlPattern': '*', 'resourceType': CDP_RESOURCE_TYPES[resource_type], 'requestStage': 'Request'}
+        for resource_type in config.get('block_types', []) if resource_type in CDP_RESOURCE_TYPES
+    ]
+    patterns.extend({'urlPattern': pattern, 'requestStage': 'Request'} for pattern in config.get('block_patterns', []))
+    return patterns
+
+
+def find_chrome_binary():
+    configured = os.environ.get('CHROME_BINARY')
+    if configured:
+        return configured
+    for name in CHROME_BINARIES:
+        path = shutil.which(name)
+        if path:
+            return path
+    raise ConfigurationError("No Chrome or Chromium binary found; set CHROME_BINARY")
+
+
+def _import_websockets():
+    try:
+        import websockets
+    except ImportError as e:
+        raise ConfigurationError("The cdp renderer requires the 'websockets' package (pip install websockets)") from e
+    return websockets
+
+
+class CDPConnection:
+    """A DevTools websocket to one browser, multiplexing flattened target sessions."""
+
+    def __init__(self, websocket):
+        self.websocket = websocket
+        self.ids = itertools.count(1)
+        self.pending = {}
+        self.listeners = {}
+        self.closed = False
+        self.reader = asyncio.ensure_future(self._read_loop())
+
+    @classmethod
+    async def connect(cls, ws_url):
+        websockets = _import_websockets()
+        websocket = await websockets.connect(ws_url, max_size=None, ping_interval=None)
+        return cls(websocket)
+
+    async def send(self, method, params=None, session_id=None, timeout=30.0):
+        if self.closed:
+            raise NetworkError(f"DevTools connection closed before {method}")
+        message_id = next(self.ids)
+        message = {'id': message_id, 'method': method, 'params': params or {}}
+        if session_id:
+            message['sessionId'] = session_id
+        future = asyncio.get_running_loop().create_future()
+        self.pending[message_id] = future
+        try:
+            await self.websocket.send(json.dumps(message))
+            return await asyncio.wait_for(future, timeout)
+        except asyncio.TimeoutError:
+            raise NetworkError(f"DevTools command {method} timed out after {timeout}s")
+        finally:
+            self.pending.pop(message_id, None)
+
+    def subscribe(self, session_id, callback):
+        self.listeners[session_id] = callback
+
+    def unsubscribe(self, session_id):
+        self.listeners.pop(session_id, None)
+
+    async def _read_loop(self):
+        try:
+            async for raw in self.websocket:
+                message = json.loads(raw)
+                if 'id' in message:
+                    future = self.pending.get(message['id'])
+                    if future is None or future.done():
+                        continue
+                    if 'error' in message:
+                        future.set_exception(NetworkError(f"DevTools error: {message['error'].get('message')}"))
+                    else:
+                        future.set_result(message.get('result', {}))
+                    continue
+                callback = self.listeners.get(message.get('sessionId'))
+                if callback is not None:
+                    try:
+                        callback(message.get('method', ''), message.get('params', {}))
+                    except Exception as e:
+                        log_error(loggers, f"Error handling DevTools event {message.get('method')}: {str(e)}")
+        except Exception as e:
+            if not self.closed:
+                log_warning(loggers, f"DevTools connection lost: {str(e)}")
+        finally:
+            self.closed = True
+            for future in self.pending.values():
+                if not future.done():
+                    future.set_exception(NetworkError("DevTools connection closed"))
+
+    async def close(self):
+        self.closed = True
+        await self.websocket.close()
+        await asyncio.gather(self.reader, return_exceptions=True)
+
+
+class CDPBrowser:
+    """A headless Chrome process driven over its browser-level DevTools endpoint."""
+
+    def __init__(self, chrome_args=(), user_data_dir=None, startup_timeout=30.0):
+        self.chrome_args = list(chrome_args)
+        self.user_data_dir = user_data_dir
+        self.owns_user_data_dir = user_data_dir is None
+        self.startup_timeout = startup_timeout
+        self.process = None
+        self.connection = None
+        self.open_tabs = 0
+        self.profile_lease = None
+
+    @property
+    def alive(self):
+        return self.process is not None and self.process.poll() is None and self.connection is not None and not self.connection.closed
+
+    async def start(self):
+        if self.owns_user_data_dir:
+            self.user_data_dir = tempfile.mkdtemp(prefix='cdp-chrome-')
+        args = [
+            find_chrome_binary(), '--headless=new', '--remote-debugging-port=0',
+            f'--user-data-dir={self.user_data_dir}', '--no-sandbox', '--disable-dev-shm-usage',
+            '--no-first-run', '--no-default-browser-check', '--disable-extensions',
+            '--disable-background-networking', '--mute-audio', *self.chrome_args, 'about:blank',
+        ]
+        self.process = subprocess.Popen(args, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        try:
+            self.connection = await CDPConnection.connect(await self._wait_for_endpoint())
+        except Exception:
+            await self.close()
+            raise
+        log_info(loggers, f"Started Chrome for CDP rendering (pid {self.process.pid})")
+        return self
+
+    async def _wait_for_endpoint(self):
+        # Chrome writes the chosen port and browser websocket path once DevTools is listening
+        port_file = os.path.join(self.user_data_dir, 'DevToolsActivePort')
+        deadline = time.monotonic() + self.startup_timeout
+        while time.monotonic() < deadline:
+            if self.process.poll() is not None:
+                raise NetworkError(f"Chrome exited during startup with code {self.process.returncode}")
+            try:
+                with open(port_file, 'r') as f:
+                    lines = f.read().split()
+                if len(lines) >= 2:
+                    return f'ws://127.0.0.1:{lines[0]}{lines[1]}'
+            except FileNotFoundError:
+                pass
+            await asyncio.sleep(0.05)
+        raise NetworkError(f"Chrome did not expose a DevTools endpoint within {self.startup_timeout}s")
+
+    async def close(self):
+        if self.connection is not None:
+            try:
+                await self.connection.close()
+            except Exception:
+                pass
+        if self.process is not None and self.process.poll() is None:
+            self.process.terminate()
+            try:
+                await asyncio.get_running_loop().run_in_executor(None, self.process.wait, 5)
+            except subprocess.TimeoutExpired:
+                self.process.kill()
+        if self.owns_user_data_dir and self.user_data_dir:
+            shutil.rmtree(self.user_data_dir, ignore_errors=True)
+        if self.profile_lease is not None:
+            await asyncio.get_running_loop().run_in_executor(None, self.profile_lease.release)
+
+
+class CDPTab:
+    """One page target in its own browser context, attached as a flattened session.
+
+    Browser contexts share nothing (cookies, storage, cache) with each other, so
+    tabs are as isolated as separate Selenium sessions at a fraction of the cost.
+    Such contexts never touch the disk cache, so with a persistent browser profile
+    tabs open in the default context instead (isolated=False).
+    """
+
+    def __init__(self, browser, context_id, target_id, session_id, blocking=None, quiet_period=0.5, poll_interval=0.1):
+        self.browser = browser
+        self.context_id = context_id
+        self.target_id = target_id
+        self.session_id = session_id
+        self.blocking = blocking or {}
+        self.quiet_period = quiet_period
+        self.poll_interval = poll_interval
+        self.network = NetworkIdleTracker()
+        self.loaded = asyncio.Event()
+        self.tasks = set()
+
+    @classmethod
+    async def open(cls, browser, blocking=None, isolated=True):
+        connection = browser.connection
+        target_params = {'url': 'about:blank'}
+        context_id = None
+        if isolated:
+            context_id = (await connection.send('Target.createBrowserContext', {'disposeOnDetach': True}))['browserContextId']
+            target_params['browserContextId'] = context_id
+        target_id = (await connection.send('Target.createTarget', target_params))['targetId']
+        session_id = (await connection.send('Target.attachToTarget', {'targetId': target_id, 'flatten': True}))['sessionId']
+        tab = cls(browser, context_id, target_id, session_id, blocking)
+        connection.subscribe(session_id, tab._on_event)
+        browser.open_tabs += 1
+        try:
+            await asyncio.gather(
+                tab.send('Page.enable'),
+                enable_response_capture(tab.send) if response_store.enabled else tab.send('Network.enable'),
+                tab.send('Page.addScriptToEvaluateOnNewDocument', {'source': SETTLE_TRACKER_JS}),
+            )
+            patterns = build_fetch_patterns(tab.blocking)
+            if patterns:
+                await tab.send('Fetch.enable', {'patterns': patterns})
+        except Exception:
+            await tab.close()
+            raise
+        return tab
+
+    async def send(self, method, params=None, timeout=30.0):
+        return await self.browser.connection.send(method, params, self.session_id, timeout)
+
+    def _on_event(self, method, params):
+        if method.startswith('Network.'):
+            self.network.handle_event(method, params)
+        elif method == 'Page.loadEventFired':
+            self.loaded.set()
+        elif method == 'Fetch.requestPaused':
+            task = asyncio.ensure_future(self._on_request_paused(params))
+            self.tasks.add(task)
+            task.add_done_callback(self.tasks.discard)
+
+    async def _on_request_paused(self, params):
+        request_url = params.get('request', {}).get('url', '')
+        try:
+            if should_block_request(request_url, params.get('resourceType'), self.blocking):
+                await self.send('Fetch.failRequest', {'requestId': params['requestId'], 'errorReason': 'BlockedByClient'})
+            else:
+                await self.send('Fetch.continueRequest', {'requestId': params['requestId']})
+        except NetworkError:
+            # The tab was closed while the request was paused
+            pass
+
+    async def evaluate(self, expression):
+        result = await self.send('Runtime.evaluate', {'expression': expression, 'returnByValue': True, 'awaitPromise': True})
+        if 'exceptionDetails' in result:
+            raise ParsingError(f"Script error: {result['exceptionDetails'].get('text')}")
+        return result.get('result', {}).get('value')
+
+    async def call(self, script, *args):
+        """Run a WebDriver-style script body (`return ...`, `arguments[i]`)."""
+        return await self.evaluate(f"(function () {{ {script} }}).apply(null, {json.dumps(args)})")
+
+    async def settle(self, deadline):
+        """Async counterpart of PageSettler.wait."""
+        while True:
+            dom_quiet = (await self.call(QUIET_TIME_JS) or 0) / 1000.0
+            if min(dom_quiet, self.network.idle_for()) >= self.quiet_period:
+                return True
+            if time.monotonic() >= deadline:
+                return False
+            await asyncio.sleep(self.poll_interval)
+
+    async def render(self, url, headers=None, budget=20.0, load_timeout=30.0, max_height=50000, max_load_more_rounds=20):
+        """Navigate, scroll and expand like fetch_page/scroll_page/expand_content, then snapshot the DOM."""
+        if headers:
+            await self.send('Network.setExtraHTTPHeaders', {'headers': headers})
+        self.loaded.clear()
+        self.network.reset()
+        navigation = await self.send('Page.navigate', {'url': url}, timeout=load_timeout)
+        if navigation.get('errorText'):
+            raise NetworkError(f"Navigation to {url} failed: {navigation['errorText']}", url=url)
+        try:
+            await asyncio.wait_for(self.loaded.wait(), load_timeout)
+        except asyncio.TimeoutError:
+            raise NetworkError(f"Timeout while loading {url}", url=url)
+
+        deadline = time.monotonic() + budget
+        with metrics.timed('scroll'):
+            last_height = await self.evaluate("document.body ? document.body.scrollHeight : 0")
+            while time.monotonic() < deadline:
+                await self.evaluate("window.scrollTo(0, document.body ? document.body.scrollHeight : 0)")
+                await self.settle(deadline)
+                new_height = await self.evaluate("document.body ? document.body.scrollHeight : 0")
+                if new_height == last_height or new_height > max_height:
+                    break
+                last_height = new_height
+
+        with metrics.timed('expand'):
+            for _ in range(max_load_more_rounds):
+                if time.monotonic() >= deadline or not await self.call(CLICK_ALL_JS, LOAD_MORE_SELECTORS, False):
+                    break
+                await self.settle(deadline)
+            if await self.call(CLICK_ALL_JS, EXPANDABLE_SELECTORS, True):
+                await self.settle(deadline)
+
+        if response_store.enabled:
+            with metrics.timed('capture'):
+                await self.capture_responses()
+
+        return await self.evaluate(PAGE_SNAPSHOT_JS)
+
+    async def capture_responses(self):
+        """Async counterpart of capture_response_bodies."""
+        async def capture(request_id, response):
+            try:
+                result = await self.send('Network.getResponseBody', {'requestId': request_id})
+            except NetworkError as e:
+                log_debug(loggers, f"No captured body for {response['url']}: {str(e)}")
+                return
+            response_store.put(response['url'], decode_response_body(result), response['mime_type'])
+
+        await asyncio.gather(*(capture(request_id, response) for request_id, response in self.network.capturable_responses(response_store.max_body_bytes)))
+
+    async def close(self):
+        connection = self.browser.connection
+        connection.unsubscribe(self.session_id)
+        self.browser.open_tabs -= 1
+        for task in list(self.tasks):
+            task.cancel()
+        try:
+            if self.context_id is not None:
+                # Disposing the context also closes its target
+                await connection.send('Target.disposeBrowserContext', {'browserContextId': self.context_id}, timeout=10)
+            else:
+                await connection.send('Target.closeTarget', {'targetId': self.target_id}, timeout=10)
+        except NetworkError as e:
+            log_warning(loggers, f"Failed to close tab {self.target_id}: {str(e)}")
+
+
+class CDPRenderer:
+    """Renders pages in isolated tabs spread over a few headless Chrome processes.
+
+    All DevTools traffic runs on one asyncio loop in a background thread.
+    fetch_page blocks the calling thread only, so many crawl workers can share
+    `browsers` Chrome processes with at most `tabs_per_browser` tabs each.
+    Browsers that crash are relaunched on the next render.
+    """
+
+    def __init__(self, doc_name=None, browsers=2, tabs_per_browser=16, page_budget=20.0, page_load_timeout=30.0, proxy=None, isolate_tabs=None):
+        self.doc_name = doc_name
+        self.isolate_tabs = not browser_profiles.enabled if isolate_tabs is None else isolate_tabs
+        self.browser_count = browsers
+        self.tabs_per_browser = tabs_per_browser
+        self.page_budget = page_budget
+        self.page_load_timeout = page_load_timeout
+        self.chrome_args = [f'--proxy-server={proxy}'] if proxy else []
+        self.blocking = get_request_blocking_config(doc_name)
+        self.browsers = []
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(target=self.loop.run_forever, name='cdp-renderer', daemon=True)
+        self.thread.start()
+        try:
+            self._run(self._start())
+        except Exception:
+            self.close()
+            raise
+
+    def _run(self, coroutine, timeout=None):
+        return asyncio.run_coroutine_threadsafe(coroutine, self.loop).result(timeout)
+
+    async def _start(self):
+        self.slots = asyncio.Semaphore(self.browser_count * self.tabs_per_browser)
+        self.launch_lock = asyncio.Lock()
+        results = await asyncio.gather(*(self._launch() for _ in range(self.browser_count)), return_exceptions=True)
+        self.browsers = [result for result in results if isinstance(result, CDPBrowser)]
+        failures = [result for result in results if isinstance(result, BaseException)]
+        if failures:
+            raise failures[0]
+        log_info(loggers, f"CDP renderer ready: {self.browser_count} browsers x {self.tabs_per_browser} tabs")
+
+    async def _launch(self):
+        if not browser_profiles.enabled:
+            return await CDPBrowser(self.chrome_args).start()
+        lease = await asyncio.get_running_loop().run_in_executor(None, browser_profiles.acquire, self.doc_name)
+        browser = CDPBrowser(self.chrome_args + [f'--disk-cache-size={browser_profiles.slot_cache_bytes}'], user_data_dir=lease.path)
+        browser.profile_lease = lease
+        return await browser.start()
+
+    async def _acquire_browser(self):
+        async with self.launch_lock:
+            for index, browser in enumerate(self.browsers):
+                if not browser.alive:
+                    log_warning(loggers, "Chrome process for CDP rendering died; relaunching")
+                    await browser.close()
+                    self.browsers[index] = await self._launch()
+        return min(self.browsers, key=lambda browser: browser.open_tabs)
+
+    async def render(self, url, headers=None):
+        async with self.slots:
+            browser = await self._acquire_browser()
+            tab = await CDPTab.open(browser, self.blocking, self.isolate_tabs)
+            try:
+                return await tab.render(url, headers, budget=self.page_budget, load_timeout=self.page_load_timeout)
+            finally:
+                await tab.close()
+
+    async def _close_browsers(self):
+        await asyncio.gather(*(browser.close() for browser in self.browsers), return_exceptions=True)
+
+    def fetch_page(self, url, headers=None):
+        """Blocking render; returns {'html', 'url', 'lastModified', 'etag'}."""
+        return self._run(self.render(url, headers))
+
+    def new_page(self):
+        return CDPPage(self)
+
+    def close(self):
+        if self.loop.is_running():
+            try:
+                self._run(self._close_browsers(), timeout=30)
+            finally:
+                self.loop.call_soon_threadsafe(self.loop.stop)
+                self.thread.join(timeout=5)
+        log_info(loggers, "CDP renderer closed")
+
+
+class CDPPage:
+    """Per-worker stand-in for a WebDriver, backed by a shared CDPRenderer.
+
+    Holds the last rendered page so callers can read page_source and the
+    document headers after fetch_page, as they do with Selenium.
+    """
+
+    def __init__(self, renderer):
+        self.renderer = renderer
+        self.page_source = ''
+        self.current_url = None
+        self.document_info = {}
+
+    def get(self, url, headers=None):
+        self.document_info = self.renderer.fetch_page(url, headers) or {}
+        self.page_source = self.document_info.get('html', '')
+        self.current_url = self.document_info.get('url', url)
+
+    def quit(self):
+        # The renderer is shared between workers and closed by close_renderers
+        pass
+
+
+_renderers = {}
+_renderers_lock = threading.Lock()
+
+
+def get_cdp_renderer(doc_name=None, **options):
+    with _renderers_lock:
+        renderer = _renderers.get(doc_name)
+        if renderer is None:
+            options.setdefault('proxy', ProxyManager().get_proxy()['https'])
+            renderer = _renderers[doc_name] = CDPRenderer(doc_name, **options)
+        return renderer
+
+
+def close_renderers():
+    with _renderers_lock:
+        renderers = list(_renderers.values())
+        _renderers.clear()
+    for renderer in renderers:
+        renderer.close()
+
+
+def create_page_driver(doc_name=None, renderer='selenium', renderer_options=None):
+    """A Selenium WebDriver, or a CDPPage on the shared per-source CDP renderer or on the replayed WARC archive."""
+    if renderer == 'replay':
+        return CDPPage(fetcher.archive)
+    if renderer == 'cdp':
+        return get_cdp_renderer(doc_name, **(renderer_options or {})).new_page()
+    return setup_webdriver(doc_name)
+
+
+def get_document_headers(driver):
+    if isinstance(driver, CDPPage):
+        return {'Last-Modified': driver.document_info.get('lastModified'), 'ETag': driver.document_info.get('etag')}
+    return {
+        'Last-Modified': driver.execute_script("return document.lastModified;"),
+        'ETag': driver.execute_script("return document.querySelector('meta[name=\"etag\"]')?.content;"),
+    }
@@ -0,0 +1,192 @@
+# ./00_html_content_collector/crawl_journal.py
+import os
+import json
+import glob
+import time
+import threading
+from custom_exceptions import DatabaseError
+from logger import setup_logging, log_error, log_info, log_warning, log_debug
+
+# Initialize loggers
+loggers = setup_logging(output_dir='logs', doc_name='crawl_journal', version='v1')
+
+
+class CrawlJournal:
+    """Append-only log of frontier and visited events with periodic compacted snapshots.
+
+    Every enqueue and every visit is appended to `<doc>_<version>_journal.jsonl` as one
+    short line, so a checkpoint costs as much as the work done since the last one.
+    When the live journal outgrows the last snapshot it is rotated and folded into a
+    new snapshot on a background thread. Replay is idempotent: a crash at any point
+    leaves a snapshot plus zero or more journals that together describe the crawl.
+    """
+
+    def __init__(self, state_dir, doc_name, version, fsync_interval=5, min_compact_bytes=1024 * 1024, compact_check_interval=10):
+        self.state_dir = state_dir
+        self.prefix = f'{doc_name}_{version}'
+        self.fsync_interval = fsync_interval
+        self.min_compact_bytes = min_compact_bytes
+        self.compact_check_interval = compact_check_interval
+        self._last_compact_check = 0
+        self.lock = threading.Lock()
+        self._compact_lock = threading.Lock()
+        self._compact_thread = None
+        self._last_fsync = time.time()
+        self.finished = False
+        os.makedirs(self.state_dir, exist_ok=True)
+        self._journal = open(self.journal_path, 'a', encoding='utf-8')
+
+    @property
+    def journal_path(self):
+        return os.path.join(self.state_dir, f'{self.prefix}_journal.jsonl')
+
+    @property
+    def snapshot_path(self):
+        return os.path.join(self.state_dir, f'{self.prefix}_snapshot.json')
+
+    def _rotated_journals(self):
+        return sorted(glob.glob(os.path.join(self.state_dir, f'{self.prefix}_journal.*.jsonl')))
+
+    def _append(self, event):
+        line = json.dumps(event, separators=(',', ':')) + '\n'
+        with self.lock:
+            self._journal.write(line)
+            self._journal.flush()
+            now = time.time()
+            if now - self._last_fsync > self.fsync_interval:
+                os.fsync(self._journal.fileno())
+                self._last_fsync = now
+
+    def record_push(self, url, priority):
+        self._append({'e': 'p', 'u': url, 'p': priority})
+
+    def record_visit(self, url):
+        self._append({'e': 'v', 'u': url})
+
+    def has_state(self):
+        return os.path.exists(self.snapshot_path) or any(
+            os.path.getsize(path) > 0 for path in self._rotated_journals() + [self.journal_path] if os.path.exists(path)
+        )
+
+    def reset(self):
+        """Discard all saved state, e.g. when a fresh (non-resumed) crawl starts."""
+        self.wait_for_compaction()
+        with self.lock:
+            self._journal.close()
+            for path in self._rotated_journals() + [self.journal_path, self.snapshot_path]:
+                if os.path.exists(path):
+                    os.remove(path)
+            self._journal = open(self.journal_path, 'a', encoding='utf-8')
+        log_info(loggers, f"Reset crawl journal for {self.prefix}")
+
+    def finish(self):
+        """Discard the state of a crawl that completed; close() then leaves no snapshot behind."""
+        self.reset()
+        self.finished = True
+
+    @staticmethod
+    def _replay(journal_path, frontier, visited):
+        with open(journal_path, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    event = json.loads(line)
+                except ValueError:
+                    # A torn final line from a crash; everything before it is valid
+                    log_warning(loggers, f"Skipping truncated journal entry in {journal_path}")
+                    continue
+                url = event['u']
+                if event['e'] == 'v':
+                    visited.add(url)
+                    frontier.pop(url, None)
+                elif url not in visited:
+                    frontier[url] = max(event['p'], frontier.get(url, event['p']))
+
+    def _read_state(self, journal_paths):
+        frontier = {}
+        visited = set()
+        if os.path.exists(self.snapshot_path):
+            with open(self.snapshot_path, 'r', encoding='utf-8') as f:
+                snapshot = json.load(f)
+            visited.update(snapshot['visited'])
+            frontier.update((url, priority) for priority, url in snapshot['frontier'])
+        for path in journal_paths:
+            if os.path.exists(path):
+                self._replay(path, frontier, visited)
+        return frontier, visited
+
+    def load(self):
+        """Return (frontier, visited) where frontier is a list of (priority, url), highest first."""
+        self.wait_for_compaction()
+        try:
+            with self.lock:
+                self._journal.flush()
+                frontier, visited = self._read_state(self._rotated_journals() + [self.journal_path])
+        except (OSError, ValueError, KeyError) as e:
+            log_error(loggers, f"Failed to load crawl journal for {self.prefix}: {str(e)}")
+            raise DatabaseError(f"Failed to load crawl journal: {str(e)}", operation='load', original_error=e)
+        log_info(loggers, f"Restored {len(frontier)} queued and {len(visited)} visited URLs for {self.prefix}")
+        return sorted(((priority, url) for url, priority in frontier.items()), reverse=True), visited
+
+    def maybe_compact(self):
+        """Start a background compaction if the live journal has outgrown the snapshot."""
+        if self._compact_thread is not None and self._compact_thread.is_alive():
+            return False
+        # Called from the crawl's coordinator loop; the size check is a few syscalls, so not on every pass
+        now = time.monotonic()
+        if now - self._last_compact_check < self.compact_check_interval:
+            return False
+        self._last_compact_check = now
+        try:
+            journal_size = os.path.getsize(self.journal_path)
+            snapshot_size = os.path.getsize(self.snapshot_path) if os.path.exists(self.snapshot_path) else 0
+        except OSError:
+            return False
+        if journal_size < max(self.min_compact_bytes, snapshot_size):
+            return False
+        self._compact_thread = threading.Thread(target=self.compact, name=f'compact-{self.prefix}', daemon=True)
+        self._compact_thread.start()
+        return True
+
+    def wait_for_compaction(self):
+        if self._compact_thread is not None:
+            self._compact_thread.join()
+            self._compact_thread = None
+
+    def compact(self):
+        """Fold the snapshot and all journals into a new snapshot."""
+        with self._compact_lock:
+            # Rotate the live journal so writers are never blocked by the compaction itself
+            with self.lock:
+                self._journal.flush()
+                os.fsync(self._journal.fileno())
+                self._journal.close()
+                if os.path.getsize(self.journal_path) > 0:
+                    os.replace(self.journal_path, os.path.join(self.state_dir, f'{self.prefix}_journal.{time.time_ns()}.jsonl'))
+                self._journal = open(self.journal_path, 'a', encoding='utf-8')
+
+            rotated = self._rotated_journals()
+            try:
+                frontier, visited = self._read_state(rotated)
+                tmp_path = self.snapshot_path + '.tmp'
+                with open(tmp_path, 'w', encoding='utf-8') as f:
+                    json.dump({
+                        'frontier': [[priority, url] for url, priority in frontier.items()],
+                        'visited': list(visited),
+                        'saved_at': time.time(),
+                    }, f, separators=(',', ':'))
+                    f.flush()
+                    os.fsync(f.fileno())
+                os.replace(tmp_path, self.snapshot_path)
+                for path in rotated:
+                    os.remove(path)
+                log_debug(loggers, f"Compacted crawl journal for {self.prefix}: {len(frontier)} queued, {len(visited)} visited")
+            except (OSError, ValueError, KeyError) as e:
+                # The rotated journals are left in place and will be replayed on the next load
+                log_error(loggers, f"Crawl journal compaction failed for {self.prefix}: {str(e)}")
+
+    def close(self):
+        self.wait_for_compaction()
+        if not self.finished:
+            self.compact()
+        with self.lock:
+            self._journal.close()
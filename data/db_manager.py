@@ -2,7 +2,9 @@
 import sqlite3
 import json
 from sqlite3 import Error
-from typing import Optional, Tuple
+from typing import Dict, Iterator, List, Optional, Tuple
+from datetime import datetime
+from cache import caches
 from custom_exceptions import DatabaseError
 from logger import setup_logging, log_error, log_info
 
@@ -31,6 +33,10 @@ def init_db() -> None:
                           content_type TEXT, is_internal BOOLEAN, anchor_exists BOOLEAN)''')
             c.execute('''CREATE TABLE IF NOT EXISTS page_headers
                          (url TEXT PRIMARY KEY, headers TEXT, last_updated TIMESTAMP)''')
+            create_ocr_cache_table(c)
+            create_reprocess_outputs_table(c)
+            create_simhash_table(c)
+            create_page_sections_table(c)
             conn.commit()
             log_info(loggers, "Database initialized successfully")
         except Error as e:
@@ -51,6 +57,9 @@ def save_page(url: str, content: str, checksum: str, headers: dict) -> None:
             headers_json = json.dumps(headers)
             c.execute("INSERT OR REPLACE INTO page_headers VALUES (?, ?, datetime('now'))", (url, headers_json))
             conn.commit()
+            for name in ('checksums', 'stored_headers', 'update_frequency', 'page_state'):
+                caches.invalidate(name, url)
+            caches.invalidate('last_updated')
             log_info(loggers, f"Page saved successfully: {url}")
         except Error as e:
             log_error(loggers, f"Error saving page and headers: {e}")
@@ -137,3 +146,339 @@ def load_checksum(url: str) -> Optional[str]:
     else:
         log_error(loggers, "Error! Cannot create the database connection.")
         raise DatabaseError("Failed to create database connection")
+
+def _like_prefix(url_prefix: str) -> str:
+    return url_prefix.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_') + '%'
+
+def get_last_updated_map(url_prefix: str) -> Dict[str, datetime]:
+    """Return {url: last_updated} for every stored page under url_prefix in a single query."""
+    conn = create_connection()
+    if conn is not None:
+        try:
+            c = conn.cursor()
+            c.execute("SELECT url, last_updated FROM pages WHERE url LIKE ? ESCAPE '\\' AND last_updated IS NOT NULL",
+                      (_like_prefix(url_prefix),))
+            last_updated = {}
+            for url, timestamp in c:
+                try:
+                    last_updated[url] = datetime.fromisoformat(timestamp)
+                except (TypeError, ValueError):
+                    continue
+            return last_updated
+        except Error as e:
+            log_error(loggers, f"Error loading last updated timestamps: {e}")
+            raise DatabaseError(f"Failed to load last updated timestamps: {str(e)}")
+        finally:
+            conn.close()
+    else:
+        log_error(loggers, "Error! Cannot create the database connection.")
+        raise DatabaseError("Failed to create database connection")
+
+def create_ocr_cache_table(cursor) -> None:
+    cursor.execute('''CREATE TABLE IF NOT EXISTS ocr_cache
+                      (content_hash TEXT PRIMARY KEY, perceptual_hash TEXT, text TEXT,
+                       width INTEGER, height INTEGER, created TIMESTAMP)''')
+
+def load_ocr_results(content_hashes) -> Dict[str, str]:
+    """Cached OCR text for a page's images in one query: {content_hash: text}."""
+    content_hashes = list(content_hashes)
+    if not content_hashes:
+        return {}
+    conn = create_connection()
+    if conn is not None:
+        try:
+            c = conn.cursor()
+            # Table is created on demand so the cache also works in pool processes before init_db has run
+            create_ocr_cache_table(c)
+            # Rows with a perceptual hash were written when a hash match copied text between images, so
+            # they may hold another image's text; they are ignored and replaced once the image is recognized
+            c.execute(f"""SELECT content_hash, text FROM ocr_cache
+                          WHERE content_hash IN ({','.join('?' * len(content_hashes))}) AND perceptual_hash IS NULL""",
+                      content_hashes)
+            return dict(c.fetchall())
+        except Error as e:
+            log_error(loggers, f"Error loading OCR results: {e}")
+            raise DatabaseError(f"Failed to load OCR results: {str(e)}")
+        finally:
+            conn.close()
+    else:
+        log_error(loggers, "Error! Cannot create the database connection.")
+        raise DatabaseError("Failed to create database connection")
+
+def save_ocr_results(results) -> None:
+    """Store (content_hash, text, width, height) rows in one transaction."""
+    results = list(results)
+    if not results:
+        return
+    conn = create_connection()
+    if conn is not None:
+        try:
+            c = conn.cursor()
+            create_ocr_cache_table(c)
+            c.executemany("""INSERT OR REPLACE INTO ocr_cache (content_hash, perceptual_hash, text, width, height, created)
+                             VALUES (?, NULL, ?, ?, ?, datetime('now'))""", results)
+            conn.commit()
+        except Error as e:
+            log_error(loggers, f"Error saving OCR results: {e}")
+            raise DatabaseError(f"Failed to save OCR results: {str(e)}")
+        finally:
+            conn.close()
+    else:
+        log_error(loggers, "Error! Cannot create the database connection.")
+        raise DatabaseError("Failed to create database connection")
+
+def count_pages(url_prefix: str, after_url: Optional[str] = None) -> int:
+    conn = create_connection()
+    if conn is not None:
+        try:
+            c = conn.cursor()
+            c.execute("SELECT COUNT(*) FROM pages WHERE url LIKE ? ESCAPE '\\' AND url > ?", (_like_prefix(url_prefix), after_url or ''))
+            return c.fetchone()[0]
+        except Error as e:
+            log_error(loggers, f"Error counting pages: {e}")
+            raise DatabaseError(f"Failed to count pages: {str(e)}")
+        finally:
+            conn.close()
+    else:
+        log_error(loggers, "Error! Cannot create the database connection.")
+        raise DatabaseError("Failed to create database connection")
+
+def iter_page_urls(url_prefix: str, after_url: Optional[str] = None, batch_size: int = 1000) -> Iterator[str]:
+    """Stored page URLs under url_prefix in URL order, starting after after_url.
+
+    Reads one keyset page per connection, so no connection or lock is held
+    while the caller works through the URLs.
+    """
+    last_url = after_url or ''
+    while True:
+        conn = create_connection()
+        if conn is None:
+            log_error(loggers, "Error! Cannot create the database connection.")
+            raise DatabaseError("Failed to create database connection")
+        try:
+            c = conn.cursor()
+            c.execute("SELECT url FROM pages WHERE url LIKE ? ESCAPE '\\' AND url > ? ORDER BY url LIMIT ?",
+                      (_like_prefix(url_prefix), last_url, batch_size))
+            urls = [row[0] for row in c]
+        except Error as e:
+            log_error(loggers, f"Error listing pages: {e}")
+            raise DatabaseError(f"Failed to list pages: {str(e)}")
+        finally:
+            conn.close()
+        yield from urls
+        if len(urls) < batch_size:
+            return
+        last_url = urls[-1]
+
+def iter_page_states(url_prefix: str) -> Iterator[Tuple[str, Optional[str], Optional[int], float, Optional[str]]]:
+    """(url, checksum, last_updated epoch, update frequency, headers JSON) for every page under url_prefix, in one query.
+
+    The update frequency is what get_page_update_frequency returns for the URL.
+    Pages with stored headers only are included with no checksum.
+    """
+    conn = create_connection()
+    if conn is None:
+        log_error(loggers, "Error! Cannot create the database connection.")
+        raise DatabaseError("Failed to create database connection")
+    try:
+        c = conn.cursor()
+        pattern = _like_prefix(url_prefix)
+        c.execute("""
+            SELECT p.url, p.checksum, CAST(strftime('%s', p.last_updated) AS INTEGER),
+                   CASE WHEN p.last_updated > datetime('now', '-30 days')
+                        THEN 1.0 / (julianday('now') - julianday(p.last_updated) + 1) ELSE 0 END,
+                   h.headers
+            FROM pages p LEFT JOIN page_headers h ON h.url = p.url
+            WHERE p.url LIKE ? ESCAPE '\\'
+            UNION ALL
+            SELECT h.url, NULL, NULL, 0, h.headers FROM page_headers h
+            WHERE h.url LIKE ? ESCAPE '\\' AND NOT EXISTS (SELECT 1 FROM pages p WHERE p.url = h.url)
+        """, (pattern, pattern))
+        yield from c
+    except Error as e:
+        log_error(loggers, f"Error loading page states: {e}")
+        raise DatabaseError(f"Failed to load page states: {str(e)}")
+    finally:
+        conn.close()
+
+def load_pages(urls) -> Dict[str, str]:
+    """{url: stored content} for a batch of URLs in one query."""
+    urls = list(urls)
+    if not urls:
+        return {}
+    conn = create_connection()
+    if conn is not None:
+        try:
+            c = conn.cursor()
+            c.execute(f"SELECT url, content FROM pages WHERE url IN ({','.join('?' * len(urls))})", urls)
+            return dict(c.fetchall())
+        except Error as e:
+            log_error(loggers, f"Error loading pages: {e}")
+            raise DatabaseError(f"Failed to load pages: {str(e)}")
+        finally:
+            conn.close()
+    else:
+        log_error(loggers, "Error! Cannot create the database connection.")
+        raise DatabaseError("Failed to create database connection")
+
+def create_reprocess_outputs_table(cursor) -> None:
+    cursor.execute('''CREATE TABLE IF NOT EXISTS reprocess_outputs
+                      (output_dir TEXT, url TEXT, output_hash TEXT, updated TIMESTAMP,
+                       PRIMARY KEY (output_dir, url))''')
+
+def load_output_hashes(output_dir: str, urls) -> Dict[str, str]:
+    """{url: hash of the last output written for it under output_dir} for a batch of URLs."""
+    urls = list(urls)
+    if not urls:
+        return {}
+    conn = create_connection()
+    if conn is not None:
+        try:
+            c = conn.cursor()
+            create_reprocess_outputs_table(c)
+            c.execute(f"SELECT url, output_hash FROM reprocess_outputs WHERE output_dir = ? AND url IN ({','.join('?' * len(urls))})",
+                      [output_dir] + urls)
+            return dict(c.fetchall())
+        except Error as e:
+            log_error(loggers, f"Error loading output hashes: {e}")
+            raise DatabaseError(f"Failed to load output hashes: {str(e)}")
+        finally:
+            conn.close()
+    else:
+        log_error(loggers, "Error! Cannot create the database connection.")
+        raise DatabaseError("Failed to create database connection")
+
+def save_output_hashes(output_dir: str, hashes: List[Tuple[str, str]]) -> None:
+    """Store (url, output_hash) rows for output_dir in one transaction."""
+    if not hashes:
+        return
+    conn = create_connection()
+    if conn is not None:
+        try:
+            c = conn.cursor()
+            create_reprocess_outputs_table(c)
+            c.executemany("INSERT OR REPLACE INTO reprocess_outputs VALUES (?, ?, ?, datetime('now'))",
+                          [(output_dir, url, output_hash) for url, output_hash in hashes])
+            conn.commit()
+        except Error as e:
+            log_error(loggers, f"Error saving output hashes: {e}")
+            raise DatabaseError(f"Failed to save output hashes: {str(e)}")
+        finally:
+            conn.close()
+    else:
+        log_error(loggers, "Error! Cannot create the database connection.")
+        raise DatabaseError("Failed to create database connection")
+
+def create_simhash_table(cursor) -> None:
+    # One indexed column per band: a lookup only touches pages sharing a band with the query
+    cursor.execute('''CREATE TABLE IF NOT EXISTS page_simhashes
+                      (scope TEXT, url TEXT, simhash INTEGER, band0 INTEGER, band1 INTEGER, band2 INTEGER, band3 INTEGER,
+                       duplicate_of TEXT, distance INTEGER, updated TIMESTAMP, PRIMARY KEY (scope, url))''')
+    for band in range(4):
+        cursor.execute(f"CREATE INDEX IF NOT EXISTS idx_page_simhashes_band{band} ON page_simhashes (scope, band{band})")
+
+def find_simhash_candidates(scope: str, bands, exclude_url: str) -> List[Tuple[str, int]]:
+    """(url, signed simhash) of the original pages in scope that share at least one band value."""
+    conn = create_connection()
+    if conn is not None:
+        try:
+            c = conn.cursor()
+            create_simhash_table(c)
+            # A UNION of per-band lookups; with OR, SQLite would use one band's index and scan the rest of the scope
+            c.execute(" UNION ".join(
+                f"SELECT url, simhash FROM page_simhashes WHERE scope = ? AND band{band} = ? AND duplicate_of IS NULL AND url != ?"
+                for band in range(len(bands))
+            ), [value for band_value in bands for value in (scope, band_value, exclude_url)])
+            return c.fetchall()
+        except Error as e:
+            log_error(loggers, f"Error looking up similar pages: {e}")
+            raise DatabaseError(f"Failed to look up similar pages: {str(e)}")
+        finally:
+            conn.close()
+    else:
+        log_error(loggers, "Error! Cannot create the database connection.")
+        raise DatabaseError("Failed to create database connection")
+
+def save_simhash(scope: str, url: str, simhash: int, bands, duplicate_of: Optional[str] = None, distance: Optional[int] = None) -> None:
+    conn = create_connection()
+    if conn is not None:
+        try:
+            c = conn.cursor()
+            create_simhash_table(c)
+            c.execute("INSERT OR REPLACE INTO page_simhashes VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, datetime('now'))",
+                      [scope, url, simhash] + list(bands) + [duplicate_of, distance])
+            conn.commit()
+        except Error as e:
+            log_error(loggers, f"Error saving page simhash: {e}")
+            raise DatabaseError(f"Failed to save page simhash: {str(e)}")
+        finally:
+            conn.close()
+    else:
+        log_error(loggers, "Error! Cannot create the database connection.")
+        raise DatabaseError("Failed to create database connection")
+
+def get_near_duplicates(scope: str) -> Dict[str, str]:
+    """{url: url of the page it duplicates} for every page skipped as a near duplicate in scope."""
+    conn = create_connection()
+    if conn is not None:
+        try:
+            c = conn.cursor()
+            create_simhash_table(c)
+            c.execute("SELECT url, duplicate_of FROM page_simhashes WHERE scope = ? AND duplicate_of IS NOT NULL", (scope,))
+            return dict(c.fetchall())
+        except Error as e:
+            log_error(loggers, f"Error loading near duplicates: {e}")
+            raise DatabaseError(f"Failed to load near duplicates: {str(e)}")
+        finally:
+            conn.close()
+    else:
+        log_error(loggers, "Error! Cannot create the database connection.")
+        raise DatabaseError("Failed to create database connection")
+
+def create_page_sections_table(cursor) -> None:
+    cursor.execute('''CREATE TABLE IF NOT EXISTS page_sections
+                      (scope TEXT, url TEXT, block_hash TEXT, section_hash TEXT, output TEXT,
+                       PRIMARY KEY (scope, url, block_hash))''')
+
+def load_page_sections(scope: str, url: str) -> Dict[str, Tuple[Optional[str], str]]:
+    """{block_hash: (section_hash, processed output)} stored for a page."""
+    conn = create_connection()
+    if conn is not None:
+        try:
+            c = conn.cursor()
+            create_page_sections_table(c)
+            c.execute("SELECT block_hash, section_hash, output FROM page_sections WHERE scope = ? AND url = ?", (scope, url))
+            return {block_hash: (section_hash, output) for block_hash, section_hash, output in c}
+        except Error as e:
+            log_error(loggers, f"Error loading page sections: {e}")
+            raise DatabaseError(f"Failed to load page sections: {str(e)}")
+        finally:
+            conn.close()
+    else:
+        log_error(loggers, "Error! Cannot create the database connection.")
+        raise DatabaseError("Failed to create database connection")
+
+def save_page_sections(scope: str, url: str, new_rows, keep_hashes) -> None:
+    """Add (block_hash, section_hash, output) rows and drop the page's blocks not in keep_hashes, in one transaction."""
+    keep_hashes = list(keep_hashes)
+    conn = create_connection()
+    if conn is not None:
+        try:
+            c = conn.cursor()
+            create_page_sections_table(c)
+            c.execute("CREATE TEMP TABLE IF NOT EXISTS kept_blocks (block_hash TEXT PRIMARY KEY)")
+            c.execute("DELETE FROM kept_blocks")
+            c.executemany("INSERT OR IGNORE INTO kept_blocks VALUES (?)", [(block_hash,) for block_hash in keep_hashes])
+            c.execute("""DELETE FROM page_sections WHERE scope = ? AND url = ?
+                         AND block_hash NOT IN (SELECT block_hash FROM kept_blocks)""", (scope, url))
+            c.executemany("INSERT OR REPLACE INTO page_sections VALUES (?, ?, ?, ?, ?)",
+                          [(scope, url, block_hash, section_hash, output) for block_hash, section_hash, output in new_rows])
+            conn.commit()
+        except Error as e:
+            log_error(loggers, f"Error saving page sections: {e}")
+            raise DatabaseError(f"Failed to save page sections: {str(e)}")
+        finally:
+            conn.close()
+    else:
+        log_error(loggers, "Error! Cannot create the database connection.")
+        raise DatabaseError("Failed to create database connection")
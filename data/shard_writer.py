@@ -0,0 +1,288 @@
+# ./00_html_content_collector/shard_writer.py
+import os
+import glob
+import gzip
+import json
+import threading
+from custom_exceptions import DatabaseError
+from logger import setup_logging, log_error, log_info, log_warning
+
+# Initialize loggers
+loggers = setup_logging(output_dir='logs', doc_name='shard_writer', version='v1')
+
+SHARD_SUFFIX = '.jsonl.gz'
+INDEX_SUFFIX = '.idx.jsonl'
+PARTIAL_SUFFIX = '.part'
+DEFAULT_SHARD_BYTES = 256 * 1024 * 1024
+DEFAULT_FLUSH_BYTES = 1024 * 1024
+GZIP_MAGIC = b'\x1f\x8b'
+
+
+def index_path_for(path, suffix=SHARD_SUFFIX):
+    return path[:-len(suffix)] + INDEX_SUFFIX
+
+
+def _member_present(f, size, entry):
+    """Whether the gzip member an index entry points at lies within the file and starts like one."""
+    if entry['member_offset'] + entry['member_length'] > size:
+        return False
+    f.seek(entry['member_offset'])
+    return f.read(2) == GZIP_MAGIC
+
+
+class RollingGzipWriter:
+    """Numbered gzip files of concatenated members, each with a sidecar JSONL index.
+
+    `<prefix>-00001<suffix>` and its index are written as .part files and renamed
+    into place once the file reaches max_file_bytes or the writer is closed, so a
+    file without the suffix is always complete. Index lines are written after the
+    member they describe, which is what recover() relies on.
+    """
+
+    suffix = None
+
+    def __init__(self, directory, prefix, max_file_bytes, compresslevel=6):
+        self.directory = directory
+        self.prefix = prefix
+        self.max_file_bytes = max_file_bytes
+        self.compresslevel = compresslevel
+        self.lock = threading.Lock()
+        self._file = None
+        self._index = None
+        self.file_bytes = 0
+        self.records = 0
+        os.makedirs(directory, exist_ok=True)
+        self.recover()
+        self.sequence = self._next_sequence()
+
+    def _path(self, sequence):
+        return os.path.join(self.directory, f'{self.prefix}-{sequence:05d}{self.suffix}')
+
+    def _next_sequence(self):
+        sequences = [
+            int(os.path.basename(path)[len(self.prefix) + 1:].split('.', 1)[0])
+            for path in glob.glob(os.path.join(self.directory, f'{self.prefix}-*{self.suffix}'))
+        ]
+        return max(sequences, default=0) + 1
+
+    def _file_header(self):
+        """Uncompressed bytes written as the first member of every new file, if any."""
+        return None
+
+    def _append(self, members):
+        """Write (data, index entries) pairs, one gzip member each; caller holds the lock.
+
+        Entries get the member's offset and length added; a member with no entries
+        is only reachable by reading the file sequentially.
+        """
+        try:
+            if self._file is None:
+                path = self._path(self.sequence)
+                self._file = open(path + PARTIAL_SUFFIX, 'wb')
+                self._index = open(index_path_for(path, self.suffix) + PARTIAL_SUFFIX, 'w', encoding='utf-8')
+                header = self._file_header()
+                if header is not None:
+                    members = [(header, [])] + list(members)
+            lines = []
+            for data, entries in members:
+                # mtime=0 keeps files byte-identical for identical input
+                member = gzip.compress(data, compresslevel=self.compresslevel, mtime=0)
+                self._file.write(member)
+                for entry in entries:
+                    entry.update(member_offset=self.file_bytes, member_length=len(member))
+                    lines.append(json.dumps(entry, ensure_ascii=False, separators=(',', ':')) + '\n')
+                self.file_bytes += len(member)
+            self._file.flush()
+            self._index.write(''.join(lines))
+            self._index.flush()
+        except OSError as e:
+            log_error(loggers, f"Error writing {self._path(self.sequence)}: {str(e)}")
+            raise DatabaseError(f"Failed to write {self.prefix} file: {str(e)}", operation='write', original_error=e)
+        self.records += len(lines)
+        if self.file_bytes >= self.max_file_bytes:
+            self._finalize()
+
+    def _finalize(self):
+        if self._file is None:
+            return
+        path = self._path(self.sequence)
+        index_path = index_path_for(path, self.suffix)
+        for handle in (self._file, self._index):
+            os.fsync(handle.fileno())
+            handle.close()
+        # Index first: a finished file always has its index next to it
+        os.replace(index_path + PARTIAL_SUFFIX, index_path)
+        os.replace(path + PARTIAL_SUFFIX, path)
+        log_info(loggers, f"Finalized {path} ({self.records} records, {self.file_bytes} bytes)")
+        self._file = self._index = None
+        self.file_bytes = self.records = 0
+        self.sequence += 1
+
+    def close(self):
+        with self.lock:
+            self._finalize()
+
+    def recover(self):
+        """Finalize files a crashed run left as .part, keeping every indexed record."""
+        for partial in sorted(glob.glob(os.path.join(self.directory, f'{self.prefix}-*{self.suffix}{PARTIAL_SUFFIX}'))):
+            path = partial[:-len(PARTIAL_SUFFIX)]
+            index_partial = index_path_for(path, self.suffix) + PARTIAL_SUFFIX
+            entries = []
+            if os.path.exists(index_partial):
+                with open(index_partial, 'r', encoding='utf-8') as f:
+                    for line in f:
+                        try:
+                            entries.append(json.loads(line))
+                        except ValueError:
+                            # A torn final line; the member it described is dropped with it
+                            break
+            # The index is flushed after its members but neither is fsynced until the file is finalized, so after
+            # an OS crash it can describe members that never reached the disk; keep only members fully present
+            size = os.path.getsize(partial)
+            with open(partial, 'rb') as f:
+                entries = [entry for entry in entries if _member_present(f, size, entry)]
+            end = max((entry['member_offset'] + entry['member_length'] for entry in entries), default=0)
+            if end == 0:
+                for leftover in (partial, index_partial):
+                    if os.path.exists(leftover):
+                        os.remove(leftover)
+                continue
+            with open(partial, 'r+b') as f:
+                f.truncate(end)
+            with open(index_partial, 'w', encoding='utf-8') as f:
+                f.writelines(json.dumps(entry, ensure_ascii=False, separators=(',', ':')) + '\n' for entry in entries)
+            os.replace(index_partial, index_path_for(path, self.suffix))
+            os.replace(partial, path)
+            log_warning(loggers, f"Recovered {len(entries)} records from unfinished {path}")
+
+
+class ShardWriter(RollingGzipWriter):
+    """Appends pages and their metadata to rolling gzip-compressed JSONL shards.
+
+    Records are buffered and written as one gzip member per flush, so a shard is
+    an ordinary .jsonl.gz file to any reader. The sidecar index (one JSON line per
+    record) holds each record's member offset and length and its position inside
+    the decompressed member, for random access.
+    """
+
+    suffix = SHARD_SUFFIX
+
+    def __init__(self, directory, prefix='pages', max_shard_bytes=DEFAULT_SHARD_BYTES,
+                 flush_bytes=DEFAULT_FLUSH_BYTES, compresslevel=6):
+        self.flush_bytes = flush_bytes
+        self.buffer = []
+        self.buffer_bytes = 0
+        self.pending = []
+        super().__init__(directory, prefix, max_shard_bytes, compresslevel)
+
+    def write(self, url, path, content, metadata=None, content_type=None):
+        """Queue one page; `path` is where the directory-tree layout would put it."""
+        record = json.dumps(
+            {'url': url, 'path': path, 'content_type': content_type, 'metadata': metadata, 'content': content},
+            ensure_ascii=False, separators=(',', ':'),
+        ).encode('utf-8') + b'\n'
+        with self.lock:
+            self.pending.append({'url': url, 'path': path, 'offset': self.buffer_bytes, 'length': len(record)})
+            self.buffer.append(record)
+            self.buffer_bytes += len(record)
+            if self.buffer_bytes >= self.flush_bytes:
+                self._flush()
+
+    def _flush(self):
+        if self.buffer:
+            self._append([(b''.join(self.buffer), self.pending)])
+            self.buffer, self.pending, self.buffer_bytes = [], [], 0
+
+    def flush(self):
+        with self.lock:
+            self._flush()
+
+    def close(self):
+        with self.lock:
+            self._flush()
+            self._finalize()
+
+
+class ShardOutput:
+    """Output mode switch plus one ShardWriter per shard directory, shared by the worker threads."""
+
+    def __init__(self):
+        self.enabled = False
+        self.max_shard_bytes = DEFAULT_SHARD_BYTES
+        self.writers = {}
+        self.lock = threading.Lock()
+
+    def enable(self, max_shard_bytes=DEFAULT_SHARD_BYTES):
+        self.enabled = True
+        self.max_shard_bytes = max_shard_bytes
+        log_info(loggers, f"Writing pages to shards of up to {max_shard_bytes // (1024 * 1024)} MiB")
+
+    def writer(self, directory):
+        with self.lock:
+            writer = self.writers.get(directory)
+            if writer is None:
+                writer = self.writers[directory] = ShardWriter(directory, max_shard_bytes=self.max_shard_bytes)
+            return writer
+
+    def flush(self):
+        with self.lock:
+            writers = list(self.writers.values())
+        for writer in writers:
+            writer.flush()
+
+    def close(self):
+        with self.lock:
+            writers, self.writers = list(self.writers.values()), {}
+        for writer in writers:
+            writer.close()
+
+
+shard_output = ShardOutput()
+
+
+def list_shards(directory, prefix='pages'):
+    """Finished shards in write order; .part files are ignored."""
+    return sorted(glob.glob(os.path.join(directory, f'{prefix}-*{SHARD_SUFFIX}')))
+
+
+def iter_records(directory, prefix='pages'):
+    """Every record of every finished shard, read sequentially."""
+    for shard_path in list_shards(directory, prefix):
+        with gzip.open(shard_path, 'rb') as f:
+            for line in f:
+                yield json.loads(line)
+
+
+def load_index(directory, prefix='pages'):
+    """{url: (shard_path, index entry)}; later shards win for URLs written more than once."""
+    index = {}
+    for shard_path in list_shards(directory, prefix):
+        with open(index_path_for(shard_path), 'r', encoding='utf-8') as f:
+            for line in f:
+                entry = json.loads(line)
+                index[entry['url']] = (shard_path, entry)
+    return index
+
+
+def read_record(shard_path, entry):
+    """One record by its index entry, decompressing only the member that holds it."""
+    with open(shard_path, 'rb') as f:
+        f.seek(entry['member_offset'])
+        member = gzip.decompress(f.read(entry['member_length']))
+    return json.loads(member[entry['offset']:entry['offset'] + entry['length']])
+
+
+def export_tree(directory, output_dir, prefix='pages'):
+    """Write shards back out as the directory-tree layout: one file plus one _metadata.json per page."""
+    count = 0
+    for record in iter_records(directory, prefix):
+        filepath = os.path.join(output_dir, record['path'])
+        os.makedirs(os.path.dirname(filepath), exist_ok=True)
+        with open(filepath, 'w', encoding='utf-8') as f:
+            f.write(record['content'])
+        if record.get('metadata') is not None:
+            with open(os.path.splitext(filepath)[0] + '_metadata.json', 'w', encoding='utf-8') as f:
+                json.dump(record['metadata'], f, ensure_ascii=False, indent=2)
+        count += 1
+    log_info(loggers, f"Exported {count} pages from {directory} to {output_dir}")
+    return count
@@ -0,0 +1,147 @@
+# ./00_html_content_collector/state_index.py
+import json
+import math
+import time
+import threading
+from array import array
+from collections import namedtuple
+from datetime import datetime, timezone
+from db_manager import iter_page_states
+from cache import caches
+from logger import setup_logging, log_info
+
+# Initialize loggers
+loggers = setup_logging(output_dir='logs', doc_name='state_index', version='v1')
+
+# The stored headers has_headers_changed compares
+VALIDATOR_KEYS = ('Last-Modified', 'ETag', 'Content-Length')
+CHECKSUM_BYTES = 16
+
+PageState = namedtuple('PageState', ['checksum', 'validators', 'last_updated', 'update_frequency'])
+# A URL under the loaded prefix that has never been stored
+NEW_PAGE_STATE = PageState(None, None, None, 0)
+
+
+class LastUpdatedView:
+    """The {url: last_updated} mapping filter_changed_entries expects, read from the index."""
+
+    def __init__(self, index):
+        self.index = index
+
+    def get(self, url, default=None):
+        state = self.index.get(url)
+        return default if state is None or state.last_updated is None else state.last_updated
+
+
+class StateIndex:
+    """Stored state of every page under a URL prefix, loaded with one query when a crawl starts.
+
+    Rows are kept in flat arrays: checksums packed to 16 bytes, timestamps and
+    update frequencies as doubles, validators as JSON in one byte buffer. get()
+    returns None for URLs the index cannot answer (outside the prefix, or written
+    since the load), and NEW_PAGE_STATE for URLs under the prefix that were never
+    stored, so those cost no query at all.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.url_prefix = None
+        self._reset()
+        self.hits = 0
+        self.misses = 0
+
+    def _reset(self):
+        self.positions = {}
+        self.checksums = bytearray()
+        self.other_checksums = {}   # row -> checksum that is not 32 hex digits (None, older hash formats)
+        self.last_updated = array('d')
+        self.update_frequencies = array('d')
+        self.validators = bytearray()
+        self.validator_offsets = array('Q', [0])
+        self.discarded = set()
+
+    def load(self, url_prefix):
+        start = time.perf_counter()
+        with self.lock:
+            self.url_prefix = None
+            self._reset()
+            for url, checksum, last_updated, update_frequency, headers in iter_page_states(url_prefix):
+                row = len(self.positions)
+                self.positions[url] = row
+                try:
+                    packed = bytes.fromhex(checksum) if checksum is not None and len(checksum) == CHECKSUM_BYTES * 2 else None
+                except ValueError:
+                    packed = None
+                if packed is None or packed.hex() != checksum:
+                    self.other_checksums[row] = checksum
+                    packed = bytes(CHECKSUM_BYTES)
+                self.checksums += packed
+                self.last_updated.append(math.nan if last_updated is None else float(last_updated))
+                self.update_frequencies.append(update_frequency or 0)
+                if headers is not None:
+                    stored = json.loads(headers)
+                    self.validators += json.dumps([stored.get(key) for key in VALIDATOR_KEYS]).encode('utf-8')
+                self.validator_offsets.append(len(self.validators))
+            self.url_prefix = url_prefix
+        log_info(loggers, f"Loaded the stored state of {len(self.positions)} pages under {url_prefix} "
+                          f"in {time.perf_counter() - start:.2f}s ({self._size() // 1024} KiB)")
+
+    def _size(self):
+        return (len(self.checksums) + len(self.validators) + self.last_updated.itemsize * len(self.last_updated)
+                + self.update_frequencies.itemsize * len(self.update_frequencies)
+                + self.validator_offsets.itemsize * len(self.validator_offsets))
+
+    def covers(self, url):
+        return self.url_prefix is not None and url.startswith(self.url_prefix)
+
+    def get(self, url):
+        """PageState of a URL, NEW_PAGE_STATE if it was never stored, or None if the index cannot tell."""
+        with self.lock:
+            if not self.covers(url) or url in self.discarded:
+                self.misses += 1
+                return None
+            self.hits += 1
+            row = self.positions.get(url)
+            if row is None:
+                return NEW_PAGE_STATE
+            if row in self.other_checksums:
+                checksum = self.other_checksums[row]
+            else:
+                checksum = self.checksums[row * CHECKSUM_BYTES:(row + 1) * CHECKSUM_BYTES].hex()
+            start, end = self.validator_offsets[row], self.validator_offsets[row + 1]
+            validators = dict(zip(VALIDATOR_KEYS, json.loads(self.validators[start:end]))) if end > start else None
+            last_updated = self.last_updated[row]
+            if math.isnan(last_updated):
+                last_updated = None
+            else:
+                # Naive UTC, like the timestamps get_last_updated_map returns
+                last_updated = datetime.fromtimestamp(last_updated, timezone.utc).replace(tzinfo=None)
+            return PageState(checksum, validators, last_updated, self.update_frequencies[row])
+
+    def last_updated_view(self):
+        return LastUpdatedView(self)
+
+    def invalidate(self, url=None):
+        """Stop answering for a URL that was just written, or for everything."""
+        with self.lock:
+            if url is None:
+                self.url_prefix = None
+                self._reset()
+            else:
+                self.discarded.add(url)
+
+    def stats(self):
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self.positions),
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': len(self.discarded),
+                'expirations': 0,
+                'hit_rate': self.hits / lookups if lookups else None,
+                'bytes': self._size(),
+            }
+
+
+page_states = caches.register('page_state', StateIndex())
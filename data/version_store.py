@@ -0,0 +1,114 @@
+# ./00_html_content_collector/version_store.py
+import os
+import mmap
+import hashlib
+import threading
+from collections import OrderedDict
+from custom_exceptions import DatabaseError
+from logger import setup_logging, log_error
+
+# Initialize loggers
+loggers = setup_logging(output_dir='logs', doc_name='version_store', version='v1')
+
+DEFAULT_CACHE_BYTES = 64 * 1024 * 1024
+# Bodies at least this large are read through mmap and never cached
+DEFAULT_MMAP_BYTES = 1024 * 1024
+
+
+class VersionStore:
+    """The last stored body of every URL, as one file per URL under `directory/<doc>/<version>/`.
+
+    Bodies read with get() are kept in an LRU bounded by their encoded size, so
+    repeated reads rarely touch the disk; everything else stays on disk, not in
+    memory. A crawl reads each body once, just before replacing it, so writes
+    and replace() never fill the cache. Writes are atomic, so a crash leaves the
+    old body.
+    """
+
+    def __init__(self, directory, max_cache_bytes=DEFAULT_CACHE_BYTES, mmap_threshold=DEFAULT_MMAP_BYTES):
+        self.directory = directory
+        self.max_cache_bytes = max_cache_bytes
+        self.mmap_threshold = mmap_threshold
+        self.lock = threading.Lock()
+        self.cache = OrderedDict()
+        self.cache_bytes = 0
+        self.hits = 0
+        self.misses = 0
+
+    def _path(self, doc_name, version, url):
+        name = hashlib.blake2b(url.encode('utf-8'), digest_size=16).hexdigest()
+        return os.path.join(self.directory, doc_name, version, name[:2], f'{name}.html')
+
+    def _forget(self, key):
+        old = self.cache.pop(key, None)
+        if old is not None:
+            self.cache_bytes -= old[1]
+
+    def _remember(self, key, content, size):
+        with self.lock:
+            self._forget(key)
+            if size >= self.mmap_threshold or size > self.max_cache_bytes:
+                return
+            self.cache[key] = (content, size)
+            self.cache_bytes += size
+            while self.cache_bytes > self.max_cache_bytes:
+                _, (_, evicted) = self.cache.popitem(last=False)
+                self.cache_bytes -= evicted
+
+    def _read(self, path):
+        try:
+            with open(path, 'rb') as f:
+                size = os.fstat(f.fileno()).st_size
+                if size < self.mmap_threshold:
+                    return f.read().decode('utf-8'), size
+                # Decode straight from the page cache instead of copying the file into a bytes object first
+                with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                    return str(mapped, 'utf-8'), size
+        except FileNotFoundError:
+            return None, 0
+        except (OSError, UnicodeDecodeError) as e:
+            log_error(loggers, f"Error reading stored version {path}: {str(e)}")
+            raise DatabaseError(f"Failed to read stored version {path}: {str(e)}", operation='read_version', original_error=e)
+
+    def _load(self, doc_name, version, url, remember):
+        key = (doc_name, version, url)
+        with self.lock:
+            cached = self.cache.get(key)
+            if cached is not None:
+                self.cache.move_to_end(key)
+                self.hits += 1
+                return cached[0]
+            self.misses += 1
+        content, size = self._read(self._path(doc_name, version, url))
+        if content is not None and remember:
+            self._remember(key, content, size)
+        return content
+
+    def get(self, doc_name, version, url):
+        """The last body stored for the URL, or None."""
+        return self._load(doc_name, version, url, remember=True)
+
+    def put(self, doc_name, version, url, content):
+        path = self._path(doc_name, version, url)
+        data = content.encode('utf-8')
+        temp_path = f'{path}.{threading.get_ident()}.tmp'
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(temp_path, 'wb') as f:
+                f.write(data)
+            os.replace(temp_path, path)
+        except OSError as e:
+            log_error(loggers, f"Error storing version of {url}: {str(e)}")
+            raise DatabaseError(f"Failed to store version of {url}: {str(e)}", operation='store_version', original_error=e)
+        with self.lock:
+            self._forget((doc_name, version, url))
+
+    def replace(self, doc_name, version, url, content):
+        """Store a new body for the URL and return the one it replaces (None the first time)."""
+        previous = self._load(doc_name, version, url, remember=False)
+        self.put(doc_name, version, url, content)
+        return previous
+
+    def stats(self):
+        with self.lock:
+            return {'entries': len(self.cache), 'bytes': self.cache_bytes, 'hits': self.hits, 'misses': self.misses}
@@ -0,0 +1,231 @@
+# ./00_html_content_collector/warc_store.py
+import os
+import glob
+import json
+import uuid
+import zlib
+from datetime import datetime, timezone
+from urllib.parse import urlsplit
+from shard_writer import RollingGzipWriter, index_path_for, PARTIAL_SUFFIX
+from custom_exceptions import DatabaseError, NetworkError
+from logger import setup_logging, log_error, log_info, log_warning
+
+# Initialize loggers
+loggers = setup_logging(output_dir='logs', doc_name='warc_store', version='v1')
+
+WARC_SUFFIX = '.warc.gz'
+DEFAULT_WARC_BYTES = 1024 * 1024 * 1024
+READ_CHUNK_SIZE = 1024 * 1024
+
+# Extension fields of the 'conversion' records that hold rendered DOM snapshots
+RENDERED_URL = 'X-Rendered-URL'
+RENDERED_LAST_MODIFIED = 'X-Rendered-Last-Modified'
+RENDERED_ETAG = 'X-Rendered-ETag'
+
+
+def _warc_date():
+    return datetime.now(timezone.utc).strftime('%Y-%m-%dT%H:%M:%SZ')
+
+
+def build_warc_record(warc_type, block, content_type, target_uri=None, record_id=None, extra_headers=()):
+    headers = [
+        ('WARC-Type', warc_type),
+        ('WARC-Record-ID', record_id or f'<urn:uuid:{uuid.uuid4()}>'),
+        ('WARC-Date', _warc_date()),
+    ]
+    if target_uri:
+        headers.append(('WARC-Target-URI', target_uri))
+    headers.extend((name, value) for name, value in extra_headers if value is not None)
+    headers += [('Content-Type', content_type), ('Content-Length', str(len(block)))]
+    head = 'WARC/1.1\r\n' + ''.join(f'{name}: {value}\r\n' for name, value in headers) + '\r\n'
+    return head.encode('utf-8') + block + b'\r\n\r\n'
+
+
+def parse_warc_record(data):
+    """(WARC headers, content block) of one uncompressed record."""
+    head, _, rest = data.partition(b'\r\n\r\n')
+    headers = {}
+    for line in head.decode('utf-8', errors='replace').split('\r\n')[1:]:
+        name, _, value = line.partition(':')
+        headers[name.strip()] = value.strip()
+    return headers, rest[:int(headers.get('Content-Length', len(rest)))]
+
+
+def parse_http_response(block):
+    """(status, reason, [(name, value)], body) of an application/http response block."""
+    head, _, body = block.partition(b'\r\n\r\n')
+    lines = head.decode('iso-8859-1').split('\r\n')
+    parts = lines[0].split(' ', 2)
+    headers = []
+    for line in lines[1:]:
+        name, _, value = line.partition(':')
+        headers.append((name.strip(), value.strip()))
+    return int(parts[1]), parts[2] if len(parts) > 2 else '', headers, body
+
+
+def _http_head(first_line, headers):
+    return (first_line + '\r\n' + ''.join(f'{name}: {value}\r\n' for name, value in headers) + '\r\n').encode('iso-8859-1', errors='replace')
+
+
+class WarcWriter(RollingGzipWriter):
+    """Records HTTP exchanges and rendered DOM snapshots to rolling .warc.gz files.
+
+    Every record is its own gzip member, as WARC readers expect. Responses and
+    DOM snapshots get a line in the sidecar index so replay can seek straight to
+    them; the matching request records are only there for other WARC tools.
+    """
+
+    suffix = WARC_SUFFIX
+
+    def __init__(self, directory, prefix='crawl', max_file_bytes=DEFAULT_WARC_BYTES, compresslevel=6):
+        super().__init__(directory, prefix, max_file_bytes, compresslevel)
+
+    def _file_header(self):
+        info = 'software: 00_html_content_collector\r\nformat: WARC File Format 1.1\r\n'
+        return build_warc_record('warcinfo', info.encode('utf-8'), 'application/warc-fields')
+
+    def write_response(self, method, url, status, reason, headers, body, request_headers=()):
+        """One request/response pair; `body` is the decoded payload, `headers` already match it."""
+        response_id = f'<urn:uuid:{uuid.uuid4()}>'
+        target = urlsplit(url)
+        request_line = f"{method} {target.path or '/'}{'?' + target.query if target.query else ''} HTTP/1.1"
+        request = build_warc_record(
+            'request', _http_head(request_line, list(request_headers)), 'application/http; msgtype=request',
+            target_uri=url, extra_headers=[('WARC-Concurrent-To', response_id)],
+        )
+        response = build_warc_record(
+            'response', _http_head(f'HTTP/1.1 {status} {reason}', headers) + body, 'application/http; msgtype=response',
+            target_uri=url, record_id=response_id,
+        )
+        with self.lock:
+            self._append([(request, []), (response, [{'uri': url, 'type': 'response', 'method': method, 'status': status}])])
+
+    def write_rendered(self, url, html, final_url=None, last_modified=None, etag=None):
+        record = build_warc_record(
+            'conversion', html.encode('utf-8'), 'text/html; charset=utf-8', target_uri=url,
+            extra_headers=[(RENDERED_URL, final_url), (RENDERED_LAST_MODIFIED, last_modified), (RENDERED_ETAG, etag)],
+        )
+        with self.lock:
+            self._append([(record, [{'uri': url, 'type': 'rendered'}])])
+
+
+def scan_warc(path):
+    """Index entries for a .warc.gz without a sidecar index, found by decompressing it member by member."""
+    entries = []
+    # Request records name their response in WARC-Concurrent-To; the method is only in the request
+    methods = {}
+    with open(path, 'rb') as f:
+        offset = 0
+        pending = b''
+        while True:
+            decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+            chunks = []
+            consumed = 0
+            while not decompressor.eof:
+                data = pending or f.read(READ_CHUNK_SIZE)
+                pending = b''
+                if not data:
+                    return entries
+                chunks.append(decompressor.decompress(data))
+                consumed += len(data) - len(decompressor.unused_data)
+            pending = decompressor.unused_data
+            headers, block = parse_warc_record(b''.join(chunks))
+            uri = headers.get('WARC-Target-URI')
+            if headers.get('WARC-Type') == 'request':
+                methods[headers.get('WARC-Concurrent-To')] = block.split(b' ', 1)[0].decode('ascii', errors='replace')
+            elif headers.get('WARC-Type') == 'response' and uri:
+                method = methods.pop(headers.get('WARC-Record-ID'), 'GET')
+                entries.append({'uri': uri, 'type': 'response', 'method': method, 'member_offset': offset, 'member_length': consumed})
+            elif headers.get('WARC-Type') == 'conversion' and uri:
+                entries.append({'uri': uri, 'type': 'rendered', 'member_offset': offset, 'member_length': consumed})
+            offset += consumed
+
+
+class WarcArchive:
+    """Read side of a WARC directory: responses by (method, URL) and DOM snapshots by URL.
+
+    Later captures of the same URL win. Also serves as the renderer behind a
+    CDPPage in replay mode, through fetch_page().
+    """
+
+    def __init__(self, directory, prefix='crawl'):
+        self.directory = directory
+        self.responses = {}
+        self.rendered = {}
+        paths = sorted(glob.glob(os.path.join(directory, f'{prefix}-*{WARC_SUFFIX}')))
+        if glob.glob(os.path.join(directory, f'*{WARC_SUFFIX}{PARTIAL_SUFFIX}')):
+            log_warning(loggers, f"Ignoring unfinished WARC files in {directory}")
+        for path in paths:
+            self._load_index(path)
+        if not paths:
+            raise DatabaseError(f"No WARC files found in {directory}", operation='replay')
+        log_info(loggers, f"Replaying {len(self.responses)} responses and {len(self.rendered)} rendered pages from {len(paths)} WARC files")
+
+    def _load_index(self, path):
+        index_path = index_path_for(path, WARC_SUFFIX)
+        if os.path.exists(index_path):
+            with open(index_path, 'r', encoding='utf-8') as f:
+                entries = [json.loads(line) for line in f]
+        else:
+            entries = scan_warc(path)
+            with open(index_path, 'w', encoding='utf-8') as f:
+                f.writelines(json.dumps(entry, separators=(',', ':')) + '\n' for entry in entries)
+        for entry in entries:
+            location = (path, entry['member_offset'], entry['member_length'])
+            if entry['type'] == 'rendered':
+                self.rendered[entry['uri']] = location
+            else:
+                self.responses[(entry['method'], entry['uri'])] = location
+
+    @staticmethod
+    def _read(location):
+        path, offset, length = location
+        try:
+            with open(path, 'rb') as f:
+                f.seek(offset)
+                return parse_warc_record(zlib.decompress(f.read(length), 16 + zlib.MAX_WBITS))
+        except (OSError, zlib.error) as e:
+            log_error(loggers, f"Error reading WARC record at {path}:{offset}: {str(e)}")
+            raise DatabaseError(f"Failed to read WARC record: {str(e)}", operation='replay', original_error=e)
+
+    def get_response(self, method, url):
+        """(status, reason, headers, body) or None; a HEAD falls back to the recorded GET without its body."""
+        location = self.responses.get((method, url))
+        if location is None and method == 'HEAD':
+            location = self.responses.get(('GET', url))
+        if location is None:
+            return None
+        status, reason, headers, body = parse_http_response(self._read(location)[1])
+        return status, reason, headers, b'' if method == 'HEAD' else body
+
+    def fetch_page(self, url, headers=None):
+        """Same contract as CDPRenderer.fetch_page; falls back to the raw GET body when no snapshot was taken."""
+        location = self.rendered.get(url)
+        if location is not None:
+            warc_headers, block = self._read(location)
+            return {
+                'html': block.decode('utf-8', errors='replace'),
+                'url': warc_headers.get(RENDERED_URL, url),
+                'lastModified': warc_headers.get(RENDERED_LAST_MODIFIED),
+                'etag': warc_headers.get(RENDERED_ETAG),
+            }
+        response = self.get_response('GET', url)
+        if response is None or response[0] >= 400:
+            raise NetworkError(f"{url} is not in the WARC archive", url=url)
+        header_map = {name.lower(): value for name, value in response[2]}
+        return {
+            'html': response[3].decode('utf-8', errors='replace'),
+            'url': url,
+            'lastModified': header_map.get('last-modified'),
+            'etag': header_map.get('etag'),
+        }
+
+
+class EmptyArchive:
+    """Stands in for a WarcArchive when there is nothing to replay: every fetch is a miss."""
+
+    def get_response(self, method, url):
+        return None
+
+    def fetch_page(self, url, headers=None):
+        raise NetworkError(f"{url} is not available offline", url=url)
@@ -151,3 +151,6 @@ class RateLimitError(NetworkError):
 
     def log_message(self):
         return super().log_message() + (f" (Retry After: {self.retry_after} seconds)" if self.retry_after else "")
+
+class ConfigurationError(ScraperError):
+    """Raised when the manifest or runtime environment is misconfigured."""
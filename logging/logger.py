@@ -1,184 +1,371 @@
-# ./00_html_content_collector/diff_generator.py
-import hashlib
-from datetime import datetime
+# ./00_html_content_collector/logger.py
+import os
+import sys
+import copy
+import json
+import time
+import queue
+import atexit
+import random
 import logging
-from custom_exceptions import ParsingError, ScraperError
-from logger import log_error, log_info
+import threading
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
 
-# Initialize logger
-logger = logging.getLogger('scraper.diff_generator')
+# Every logger from setup_logging lives under this one, which owns the queue handler
+ROOT_LOGGER_NAME = 'scraper'
+# Fields the log_* helpers and log_context accept and JSON records carry
+CONTEXT_FIELDS = ('url', 'doc_name', 'version', 'stage')
 
-def chunk_content(content, chunk_size=1000):
-    """Split content into chunks of specified size."""
-    return [content[i:i+chunk_size] for i in range(0, len(content), chunk_size)]
+DEFAULT_SETTINGS = {
+    'level': os.environ.get('SCRAPER_LOG_LEVEL', 'INFO'),
+    # e.g. "scraper_core=DEBUG,metrics=WARNING"
+    'levels': os.environ.get('SCRAPER_LOG_LEVELS', ''),
+    'console_level': os.environ.get('SCRAPER_CONSOLE_LOG_LEVEL', 'INFO'),
+    'max_bytes': 20 * 1024 * 1024,
+    'backup_count': 5,
+    'queue_size': 100000,
+    # Debug records that pass sampling are further limited per call site
+    'debug_sample_rate': 1.0,
+    'debug_rate_limit': 50.0,
+    'debug_burst': 100,
+}
 
-def myers_diff(old_content, new_content):
-    try:
-        def shortest_edit_sequence(a, b):
-            n, m = len(a), len(b)
-            max_d = n + m
-            v = {1: 0}
-            trace = []
-
-            for d in range(max_d + 1):
-                for k in range(-d, d + 1, 2):
-                    if k == -d or (k != d and v.get(k - 1, float('-inf')) < v.get(k + 1, float('-inf'))):
-                        x = v[k + 1]
-                    else:
-                        x = v[k - 1] + 1
-                    y = x - k
-                    while x < n and y < m and a[x] == b[y]:
-                        x, y = x + 1, y + 1
-                    v[k] = x
-                    if x >= n and y >= m:
-                        return trace
-                trace.append(v.copy())
-            return trace
-
-        def backtrack(trace, a, b):
-            x, y = len(a), len(b)
-            path = []
-            for d, v in reversed(list(enumerate(trace))):
-                k = x - y
-                if k == -d or (k != d and v.get(k - 1, float('-inf')) < v.get(k + 1, float('-inf'))):
-                    k = k + 1
-                prev_x, prev_y = v[k], v[k] - k
-                while x > prev_x and y > prev_y:
-                    path.append(('equal', x - 1, y - 1))
-                    x, y = x - 1, y - 1
-                if d > 0:
-                    path.append(('replace' if x > prev_x else 'insert', prev_x, prev_y))
-                x, y = prev_x, prev_y
-            return list(reversed(path))
-
-        a, b = old_content.splitlines(), new_content.splitlines()
-        trace = shortest_edit_sequence(a, b)
-        return backtrack(trace, a, b)
-    except Exception as e:
-        raise ParsingError(f"Error in myers_diff: {str(e)}")
-
-def generate_diff(old_content, new_content, doc_name, version):
-    try:
-        diff = myers_diff(old_content, new_content)
-
-        formatted_diff = {
-            'metadata': {
-                'doc_name': doc_name,
-                'version': version,
-                'timestamp': datetime.now().isoformat(),
-                'old_content_hash': hashlib.md5(old_content.encode()).hexdigest(),
-                'new_content_hash': hashlib.md5(new_content.encode()).hexdigest(),
-            },
-            'operations': []
-        }
 
-        for op, old_pos, new_pos in diff:
-            if op == 'equal':
-                formatted_diff['operations'].append({
-                    'operation': 'equal',
-                    'content': old_content.splitlines()[old_pos]
-                })
-            elif op == 'replace':
-                formatted_diff['operations'].append({
-                    'operation': 'replace',
-                    'old_content': old_content.splitlines()[old_pos],
-                    'new_content': new_content.splitlines()[new_pos]
-                })
-            elif op == 'insert':
-                formatted_diff['operations'].append({
-                    'operation': 'insert',
-                    'content': new_content.splitlines()[new_pos]
-                })
-            elif op == 'delete':
-                formatted_diff['operations'].append({
-                    'operation': 'delete',
-                    'content': old_content.splitlines()[old_pos]
-                })
-
-        log_info(logger, f"Generated diff for {doc_name} version {version}")
-        return formatted_diff
-    except Exception as e:
-        log_error(logger, ParsingError(f"Error generating diff: {str(e)}", doc_name=doc_name, version=version))
-        raise
-
-def generate_optimized_diff(old_content, new_content, doc_name, version, chunk_size=1000):
-    try:
-        old_chunks = chunk_content(old_content, chunk_size)
-        new_chunks = chunk_content(new_content, chunk_size)
-
-        formatted_diff = {
-            'metadata': {
-                'doc_name': doc_name,
-                'version': version,
-                'timestamp': datetime.now().isoformat(),
-                'old_content_hash': hashlib.md5(old_content.encode()).hexdigest(),
-                'new_content_hash': hashlib.md5(new_content.encode()).hexdigest(),
-            },
-            'chunks': []
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line with the context fields at the top level."""
+
+    def format(self, record):
+        entry = {
+            'ts': datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'msg': record.getMessage(),
+            'thread': record.threadName,
         }
+        for field in CONTEXT_FIELDS:
+            value = getattr(record, field, None)
+            if value is not None:
+                entry[field] = value
+        fields = getattr(record, 'fields', None)
+        if fields:
+            entry.update(fields)
+        if record.exc_info:
+            entry['exc'] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            entry['exc'] = record.exc_text
+        return json.dumps(entry, default=str, ensure_ascii=False)
 
-        for i, (old_chunk, new_chunk) in enumerate(zip(old_chunks, new_chunks)):
-            if old_chunk != new_chunk:
-                chunk_diff = myers_diff(old_chunk, new_chunk)
-                formatted_diff['chunks'].append({
-                    'chunk_index': i,
-                    'operations': format_chunk_diff(chunk_diff, old_chunk, new_chunk)
-                })
-
-        # Handle case where new content has more chunks
-        for i, new_chunk in enumerate(new_chunks[len(old_chunks):], start=len(old_chunks)):
-            formatted_diff['chunks'].append({
-                'chunk_index': i,
-                'operations': [{'operation': 'insert', 'content': new_chunk}]
-            })
-
-        log_info(logger, f"Generated optimized diff for {doc_name} version {version}")
-        return formatted_diff
-    except Exception as e:
-        log_error(logger, ParsingError(f"Error generating optimized diff: {str(e)}", doc_name=doc_name, version=version))
-        raise
-
-def format_chunk_diff(diff, old_chunk, new_chunk):
-    try:
-        formatted_ops = []
-        for op, old_pos, new_pos in diff:
-            if op == 'equal':
-                formatted_ops.append({
-                    'operation': 'equal',
-                    'content': old_chunk[old_pos]
-                })
-            elif op == 'replace':
-                formatted_ops.append({
-                    'operation': 'replace',
-                    'old_content': old_chunk[old_pos],
-                    'new_content': new_chunk[new_pos]
-                })
-            elif op == 'insert':
-                formatted_ops.append({
-                    'operation': 'insert',
-                    'content': new_chunk[new_pos]
-                })
-            elif op == 'delete':
-                formatted_ops.append({
-                    'operation': 'delete',
-                    'content': old_chunk[old_pos]
-                })
-        return formatted_ops
-    except Exception as e:
-        raise ParsingError(f"Error in format_chunk_diff: {str(e)}")
-
-# Example usage
-if __name__ == "__main__":
+
+class ConsoleFormatter(logging.Formatter):
+    def __init__(self):
+        super().__init__('%(asctime)s %(levelname)-7s %(name)s: %(message)s')
+
+    def format(self, record):
+        line = super().format(record)
+        context = ' '.join(f'{field}={getattr(record, field)}' for field in CONTEXT_FIELDS if getattr(record, field, None) is not None)
+        return f'{line} [{context}]' if context else line
+
+
+class _ContextFilter(logging.Filter):
+    """Stamps thread-local log_context fields onto records on the emitting thread."""
+
+    def filter(self, record):
+        for field, value in _context_fields().items():
+            if getattr(record, field, None) is None:
+                setattr(record, field, value)
+        return True
+
+
+class _DroppingQueueHandler(QueueHandler):
+    """Never blocks a worker: if the listener falls behind and the queue is full, the record is dropped."""
+
+    def __init__(self, log_queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record):
+        # Resolve the message and traceback now, on the emitting thread, but keep them
+        # separate so the JSON formatter can still put the traceback in its own field
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record):
+        if _listener is None:
+            _start_listener()
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+class _Dispatcher(logging.Handler):
+    """Runs on the listener thread and fans records out to the console and the log files.
+
+    Routes map logger names to file paths; the file handler for a path (and its
+    directory) is only created when the first record for it arrives.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.console = None
+        self.capture_all = []
+        self.routes = {}
+        self.files = {}
+        self.routes_lock = threading.Lock()
+
+    def _file(self, path):
+        handler = self.files.get(path)
+        if handler is None:
+            handler = self.files[path] = _file_handler(path)
+        return handler
+
+    def handle(self, record):
+        if self.console is not None and record.levelno >= self.console.level:
+            self.console.handle(record)
+        with self.routes_lock:
+            paths = list(self.capture_all)
+            routed = self.routes.get(record.name)
+            if routed is not None and routed not in paths:
+                paths.append(routed)
+            handlers = [self._file(path) for path in paths]
+        for handler in handlers:
+            handler.handle(record)
+        return True
+
+    def emit(self, record):
+        self.handle(record)
+
+    def close(self):
+        with self.routes_lock:
+            handlers = list(self.files.values())
+            self.files.clear()
+        for handler in handlers:
+            handler.close()
+        super().close()
+
+
+class _DebugLimiter:
+    """Per-call-site token bucket for debug records, so a chatty loop cannot flood the queue."""
+
+    def __init__(self):
+        self.buckets = {}
+        self.lock = threading.Lock()
+
+    def allow(self, key, rate, burst):
+        now = time.monotonic()
+        with self.lock:
+            tokens, last, suppressed = self.buckets.get(key, (burst, now, 0))
+            tokens = min(burst, tokens + (now - last) * rate)
+            if tokens < 1:
+                self.buckets[key] = (tokens, now, suppressed + 1)
+                return False, 0
+            self.buckets[key] = (tokens - 1, now, 0)
+            return True, suppressed
+
+
+_settings = dict(DEFAULT_SETTINGS)
+_state_lock = threading.Lock()
+_listener = None
+_atexit_registered = False
+_queue_handler = None
+_dispatcher = None
+_context = threading.local()
+_debug_limiter = _DebugLimiter()
+
+
+def _context_fields():
+    return getattr(_context, 'fields', {})
+
+
+@contextmanager
+def log_context(**fields):
+    """Attach url, doc_name, version and/or stage to every record logged on this thread inside the block."""
+    previous = _context_fields()
+    _context.fields = dict(previous, **{k: v for k, v in fields.items() if v is not None})
     try:
-        old_content = "This is the old content.\nIt has multiple lines.\nSome lines will change."
-        new_content = "This is the new content.\nIt has multiple lines.\nSome lines have changed."
-
-        diff = generate_diff(old_content, new_content, "example_doc", "1.0")
-        print("Standard diff:", diff)
-
-        optimized_diff = generate_optimized_diff(old_content, new_content, "example_doc", "1.0")
-        print("Optimized diff:", optimized_diff)
-    except ScraperError as e:
-        log_error(logger, e)
-    except Exception as e:
-        log_error(logger, ScraperError(f"Unexpected error in diff generation: {str(e)}"))
+        yield
+    finally:
+        _context.fields = previous
+
+
+def _parse_level(level):
+    if isinstance(level, int):
+        return level
+    value = logging.getLevelName(str(level).upper())
+    return value if isinstance(value, int) else logging.INFO
+
+
+def _apply_levels():
+    logging.getLogger(ROOT_LOGGER_NAME).setLevel(_parse_level(_settings['level']))
+    for item in filter(None, (part.strip() for part in _settings['levels'].split(','))):
+        name, _, level = item.partition('=')
+        set_log_level(name.strip(), level.strip())
+    if _dispatcher is not None and _dispatcher.console is not None:
+        _dispatcher.console.setLevel(_parse_level(_settings['console_level']))
+
+
+def _ensure_handler():
+    """Attach the queue handler; cheap enough to run when a module calls setup_logging at import."""
+    global _queue_handler, _dispatcher
+    if _queue_handler is not None:
+        return
+    _dispatcher = _Dispatcher()
+    console = logging.StreamHandler(sys.stderr)
+    console.setFormatter(ConsoleFormatter())
+    _dispatcher.console = console
+
+    _queue_handler = _DroppingQueueHandler(queue.Queue(maxsize=_settings['queue_size']))
+    _queue_handler.addFilter(_ContextFilter())
+    root = logging.getLogger(ROOT_LOGGER_NAME)
+    root.addHandler(_queue_handler)
+    root.propagate = False
+    _apply_levels()
+
+
+def _start_listener():
+    """The listener thread is started by the first record, not by setup_logging."""
+    global _listener, _atexit_registered
+    with _state_lock:
+        if _listener is not None:
+            return
+        _listener = QueueListener(_queue_handler.queue, _dispatcher, respect_handler_level=False)
+        _listener.start()
+        if not _atexit_registered:
+            atexit.register(shutdown_logging)
+            _atexit_registered = True
+
+
+def _file_handler(path):
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    handler = RotatingFileHandler(path, maxBytes=_settings['max_bytes'], backupCount=_settings['backup_count'], encoding='utf-8', delay=True)
+    handler.setFormatter(JsonFormatter())
+    return handler
+
+
+def setup_logging(output_dir='logs', doc_name='scraper', version='v1', capture_all=False):
+    """Return the logger for one component or documentation run.
+
+    Records go through a queue and are written by a single listener thread, as
+    JSON lines to `<output_dir>/<doc_name>/<version>.jsonl` (rotated) and as text
+    to stderr. With capture_all the file also receives every other logger's records,
+    which is how main.py gets one complete log per documentation source and version.
+    """
+    name = f'{ROOT_LOGGER_NAME}.{doc_name}'
+    path = os.path.abspath(os.path.join(output_dir, str(doc_name), f'{version}.jsonl'))
+    with _state_lock:
+        _ensure_handler()
+        with _dispatcher.routes_lock:
+            _dispatcher.routes[name] = path
+            if capture_all and path not in _dispatcher.capture_all:
+                _dispatcher.capture_all.append(path)
+    return logging.getLogger(name)
+
+
+def configure_logging(level=None, levels=None, console_level=None, max_bytes=None, backup_count=None,
+                      debug_sample_rate=None, debug_rate_limit=None):
+    """Adjust levels and limits at runtime; `levels` is "component=LEVEL,..." as in SCRAPER_LOG_LEVELS."""
+    for key, value in (('level', level), ('levels', levels), ('console_level', console_level),
+                       ('max_bytes', max_bytes), ('backup_count', backup_count),
+                       ('debug_sample_rate', debug_sample_rate), ('debug_rate_limit', debug_rate_limit)):
+        if value is not None:
+            _settings[key] = value
+    with _state_lock:
+        _apply_levels()
+
+
+def set_log_level(name, level):
+    """Set the level of one component logger ('scraper_core' or 'scraper.scraper_core')."""
+    if name != ROOT_LOGGER_NAME and not name.startswith(ROOT_LOGGER_NAME + '.'):
+        name = f'{ROOT_LOGGER_NAME}.{name}'
+    logging.getLogger(name).setLevel(_parse_level(level))
+
+
+def dropped_records():
+    return _queue_handler.dropped if _queue_handler is not None else 0
+
+
+def shutdown_logging():
+    """Flush the queue and close the log files."""
+    global _listener
+    with _state_lock:
+        if _listener is None:
+            return
+        _listener.stop()
+        _listener = None
+        _dispatcher.close()
+        if _queue_handler is not None and _queue_handler.dropped:
+            sys.stderr.write(f"logger: dropped {_queue_handler.dropped} records because the log queue was full\n")
+
+
+def _resolve_logger(loggers, level):
+    """Accept what setup_logging returns, a plain Logger/LoggerAdapter, a {level name: logger} dict, or None."""
+    if isinstance(loggers, dict):
+        loggers = loggers.get(logging.getLevelName(level).lower()) or loggers.get('main') or next(iter(loggers.values()), None)
+    if loggers is None:
+        loggers = logging.getLogger(ROOT_LOGGER_NAME)
+    return loggers
+
+
+def _log(loggers, level, message, exc_info=None, stacklevel=3, **fields):
+    logger = _resolve_logger(loggers, level)
+    if not logger.isEnabledFor(level):
+        return
+
+    # Scraper exceptions carry their own URL and summary
+    if isinstance(message, BaseException):
+        error = message
+        message = error.log_message() if hasattr(error, 'log_message') else f"{type(error).__name__}: {error}"
+        if fields.get('url') is None and getattr(error, 'url', None):
+            fields['url'] = error.url
+        fields.setdefault('error_type', type(error).__name__)
+        if exc_info is True or (exc_info is None and level >= logging.ERROR and error.__traceback__ is not None):
+            exc_info = (type(error), error, error.__traceback__)
+
+    extra = {field: fields.pop(field) for field in CONTEXT_FIELDS if field in fields}
+    if fields:
+        extra['fields'] = fields
+    logger.log(level, message, exc_info=exc_info, extra=extra, stacklevel=stacklevel)
+
+
+def log_debug(loggers, message, sample_rate=None, rate_limit=None, **fields):
+    """Debug records are sampled and rate-limited per call site; suppressed counts ride on the next record."""
+    logger = _resolve_logger(loggers, logging.DEBUG)
+    if not logger.isEnabledFor(logging.DEBUG):
+        return
+    sample_rate = _settings['debug_sample_rate'] if sample_rate is None else sample_rate
+    if sample_rate < 1.0 and random.random() >= sample_rate:
+        return
+    rate_limit = _settings['debug_rate_limit'] if rate_limit is None else rate_limit
+    if rate_limit:
+        caller = sys._getframe(1)
+        allowed, suppressed = _debug_limiter.allow((caller.f_code.co_filename, caller.f_lineno), rate_limit, _settings['debug_burst'])
+        if not allowed:
+            return
+        if suppressed:
+            fields['suppressed'] = suppressed
+    _log(logger, logging.DEBUG, message, **fields)
+
+
+def log_info(loggers, message, **fields):
+    _log(loggers, logging.INFO, message, **fields)
+
+
+def log_warning(loggers, message, **fields):
+    _log(loggers, logging.WARNING, message, **fields)
+
+
+def log_error(loggers, message, **fields):
+    _log(loggers, logging.ERROR, message, **fields)
+
+
+def log_exception(loggers, message, **fields):
+    """log_error with the current exception's traceback."""
+    fields.setdefault('exc_info', True)
+    _log(loggers, logging.ERROR, message, **fields)
@@ -1,32 +1,128 @@
 # ./00_html_content_collector/main.py
-from config import MANIFEST, PROJECT_NAME, OUTPUT_DIR
+from config import get_manifest, get_output_dir
+import os
 import argparse
-from scraper import start_scraping_from
-from logger import setup_logging, log_error, log_info
+from logger import setup_logging, configure_logging, log_error, log_info
 from custom_exceptions import ScraperError, ConfigurationError, NetworkError
 
 def main():
-    parser = argparse.ArgumentParser(description=f"Web scraper for {PROJECT_NAME}")
+    parser = argparse.ArgumentParser(description="Web scraper for the documentation sources in core_manifest.yaml")
     parser.add_argument("doc_name", help="The name of the documentation to scrape (as specified in core_manifest.yaml)")
     parser.add_argument("version", help="The version of the documentation to scrape")
     parser.add_argument("--initial_delay", type=int, default=3, help="Initial delay between requests in seconds")
     parser.add_argument("--max_workers", type=int, default=5, help="Maximum number of concurrent workers")
+    parser.add_argument("--resume", action="store_true", help="Resume an interrupted scrape from its crawl journal")
+    parser.add_argument("--metrics_port", type=int, default=None, help="Serve Prometheus metrics on this local port")
+    parser.add_argument("--metrics_snapshot", default=None, help="Append periodic JSON metrics snapshots to this file")
+    parser.add_argument("--metrics_interval", type=int, default=30, help="Seconds between JSON metrics snapshots")
+    parser.add_argument("--profile", action="store_true", help="Profile scrape_single_page with cProfile and tracemalloc")
+    parser.add_argument("--profile_pattern", default=None, help="Only profile URLs matching this regular expression")
+    parser.add_argument("--profile_sample_rate", type=float, default=1.0, help="Fraction of eligible URLs to profile")
+    parser.add_argument("--profile_dir", default=None, help="Directory for profile dumps (default: <OUTPUT_DIR>/profiles)")
+    parser.add_argument("--renderer", choices=["selenium", "cdp"], default="selenium", help="selenium: one Chrome per worker; cdp: workers share tabs in a few Chrome processes")
+    parser.add_argument("--cdp_browsers", type=int, default=2, help="Chrome processes used by the cdp renderer")
+    parser.add_argument("--cdp_tabs_per_browser", type=int, default=16, help="Concurrent tabs per Chrome process for the cdp renderer")
+    parser.add_argument("--reuse_browser_responses", action="store_true", help="Save page assets from the bodies Chrome already downloaded instead of fetching them again")
+    parser.add_argument("--browser_cache", action="store_true", help="Keep a persistent Chrome disk cache per documentation source")
+    parser.add_argument("--browser_cache_size_mb", type=int, default=2048, help="Size limit for a source's persistent browser profiles")
+    parser.add_argument("--output_format", choices=["tree", "shards"], default="tree", help="tree: one file plus one metadata JSON per page; shards: rolling compressed JSONL shards with an offset index")
+    parser.add_argument("--shard_size_mb", type=int, default=256, help="Size at which a shard is finalized and a new one started")
+    parser.add_argument("--export_tree", default=None, metavar="DIR", help="Write the shards of this documentation version out as the tree layout under DIR, then exit")
+    parser.add_argument("--record_warc", action="store_true", help="Record raw responses and rendered pages to WARC files")
+    parser.add_argument("--replay", action="store_true", help="Serve every fetch from previously recorded WARC files; no network or browser")
+    parser.add_argument("--warc_dir", default=None, help="WARC directory (default: <OUTPUT_DIR>/warc/<doc_name>/<version>)")
+    parser.add_argument("--warc_size_mb", type=int, default=1024, help="Size at which a WARC file is finalized and a new one started")
+    parser.add_argument("--reprocess", action="store_true", help="Run stored pages through the processing pipeline again instead of crawling; only changed outputs are rewritten")
+    parser.add_argument("--reprocess_source", choices=["pages", "tree"], default="pages", help="pages: every page in the database; tree: the pages saved in the tree layout, from their raw bodies")
+    parser.add_argument("--reprocess_workers", type=int, default=None, help="Processes used by --reprocess (default: one per core)")
+    parser.add_argument("--log_level", default=None, help="Level for all scraper loggers (default: SCRAPER_LOG_LEVEL or INFO)")
+    parser.add_argument("--log_levels", default=None, help="Per-component levels, e.g. scraper_core=DEBUG,metrics=WARNING")
+    parser.add_argument("--debug_sample_rate", type=float, default=None, help="Fraction of debug records to keep")
     args = parser.parse_args()
+    if args.record_warc and args.replay:
+        parser.error("--record_warc and --replay cannot be combined")
+    if args.reprocess and args.record_warc:
+        parser.error("--reprocess does not fetch anything, so it cannot be combined with --record_warc")
 
+    configure_logging(level=args.log_level, levels=args.log_levels, debug_sample_rate=args.debug_sample_rate)
+
+    # The crawl pipeline is only imported once the arguments are known to be valid,
+    # so --help and usage errors do not pay for it
+    from scraper_core import start_scraping_from
+    from metrics import metrics, start_metrics_server, start_snapshot_writer
+    from profiler import profiler
+    from download_manager import response_store
+    from browser_profiles import browser_profiles
+    from shard_writer import shard_output, export_tree
+    from fetcher import fetcher
+
+    loggers = None
     try:
+        # Loads core_manifest.yaml and creates OUTPUT_DIR on first use
+        output_dir = get_output_dir()
+
         # Initialize logging for this specific documentation and version
-        loggers = setup_logging(OUTPUT_DIR, args.doc_name, args.version)
+        loggers = setup_logging(os.path.join(output_dir, 'logs'), args.doc_name, args.version, capture_all=True)
 
         # Get URL from manifest
-        doc_url = next((source['url'] for source in MANIFEST['documentation_sources'] if source['name'] == args.doc_name), None)
+        doc_url = next((source['url'] for source in get_manifest()['documentation_sources'] if source['name'] == args.doc_name), None)
 
         if not doc_url:
             raise ConfigurationError(f"Documentation source '{args.doc_name}' not found in core_manifest.yaml")
 
+        shard_dir = os.path.join(output_dir, 'docs', args.doc_name, args.version, 'shards')
+        if args.export_tree:
+            count = export_tree(shard_dir, args.export_tree)
+            log_info(loggers, f"Exported {count} pages of {args.doc_name} version {args.version} to {args.export_tree}")
+            return
+        if args.output_format == 'shards':
+            shard_output.enable(max_shard_bytes=args.shard_size_mb * 1024 * 1024)
+
+        renderer, initial_delay = args.renderer, args.initial_delay
+        warc_dir = args.warc_dir or os.path.join(output_dir, 'warc', args.doc_name, args.version)
+        if args.reprocess:
+            from reprocess import reprocess
+
+            # Workers serve asset and iframe fetches from the WARC directory if there is one, and never go online
+            counts = reprocess(args.doc_name, args.version, source=args.reprocess_source, max_workers=args.reprocess_workers,
+                               resume=args.resume, warc_dir=warc_dir)
+            log_info(loggers, f"Reprocessed {args.doc_name} version {args.version}: {counts['changed']} outputs rewritten")
+            return
+        if args.record_warc:
+            fetcher.enable_recording(warc_dir, max_file_bytes=args.warc_size_mb * 1024 * 1024)
+        if args.replay:
+            fetcher.enable_replay(warc_dir)
+            # Pages come from disk: no browser and no politeness delay
+            renderer, initial_delay = 'replay', 0
+
+        if args.browser_cache:
+            browser_profiles.enable(os.path.join(output_dir, 'browser_cache'), max_size_bytes=args.browser_cache_size_mb * 1024 * 1024)
+
+        if args.reuse_browser_responses:
+            response_store.enable()
+            metrics.register_gauge('captured_response_hits', lambda: response_store.hits)
+            metrics.register_gauge('captured_response_misses', lambda: response_store.misses)
+
+        if args.metrics_port is not None:
+            start_metrics_server(metrics, port=args.metrics_port)
+        if args.metrics_snapshot:
+            start_snapshot_writer(metrics, args.metrics_snapshot, interval=args.metrics_interval)
+
+        profiler.configure(
+            output_dir=args.profile_dir or os.path.join(output_dir, 'profiles'),
+            url_pattern=args.profile_pattern,
+            sample_rate=args.profile_sample_rate,
+        )
+        # kill -USR1 <pid> switches profiling on or off mid-crawl
+        profiler.install_signal_toggle()
+        if args.profile:
+            profiler.enable()
+
         # Start the scraping process
         log_info(loggers, f"Starting scrape for {args.doc_name} version {args.version} ({doc_url})")
 
-        start_scraping_from(doc_url, args.doc_name, args.version, initial_delay=args.initial_delay, max_workers=args.max_workers)
+        start_scraping_from(doc_url, args.doc_name, args.version, initial_delay=initial_delay, max_workers=args.max_workers, resume=args.resume,
+                            renderer=renderer, renderer_options={'browsers': args.cdp_browsers, 'tabs_per_browser': args.cdp_tabs_per_browser})
         log_info(loggers, f"Completed scrape for {args.doc_name} version {args.version}")
 
     except ConfigurationError as e:
@@ -39,7 +135,8 @@ def main():
         log_error(loggers, f"Unexpected error: {str(e)}")
         log_error(loggers, ScraperError(f"Scraping process for {args.doc_name} version {args.version} failed"))
     finally:
-        if 'loggers' in locals():
+        profiler.write_collapsed_stacks()
+        if loggers is not None:
             log_info(loggers, "Scraping process completed")
 
 
@@ -0,0 +1,32 @@
+# ./00_html_content_collector/modules/asset_module.py
+from base_module import ProcessingStage
+from metrics import metrics
+from fetcher import fetcher
+from scraper import extract_asset_links, download_assets, update_asset_references
+
+
+class AssetStage(ProcessingStage):
+    """Downloads stylesheets, scripts and images on the I/O pool and points the page at the local copies."""
+
+    name = 'assets'
+    kind = 'io'
+
+    def applies_to(self, page):
+        # Assets are stored per documentation version
+        return page.doc_name is not None and page.version is not None
+
+    def prepare(self, page):
+        assets = extract_asset_links(page.soup, page.url)
+        page.stage_data[self.name] = assets
+        # Offline (reprocessing without an archive) the references are still rewritten to the copies from the crawl
+        return assets, page.doc_name, page.version, not fetcher.offline
+
+    @staticmethod
+    def compute(payload):
+        assets, doc_name, version, download = payload
+        if download:
+            with metrics.timed('asset_download'):
+                download_assets(assets, doc_name, version)
+
+    def apply(self, page, result):
+        update_asset_references(page.soup, page.stage_data.pop(self.name), page.doc_name, page.version)
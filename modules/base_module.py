@@ -0,0 +1,68 @@
+# ./00_html_content_collector/modules/base_module.py
+
+# Where a stage runs: on the page's worker thread, on the shared I/O thread pool,
+# or on the shared process pool
+STAGE_KINDS = ('inline', 'io', 'cpu')
+
+
+class PageContext:
+    """What a processing stage sees of a page: the parsed soup plus where its output goes."""
+
+    def __init__(self, url, soup, directory, doc_name=None, version=None, html=None, content_type='text/html'):
+        self.url = url
+        self.soup = soup
+        self.directory = directory
+        self.doc_name = doc_name
+        self.version = version
+        self.content_type = content_type
+        # Per-page scratch space, e.g. the tags a stage found in prepare() and replaces in apply()
+        self.stage_data = {}
+        self._html = html
+        self._html_lower = None
+
+    @property
+    def html(self):
+        if self._html is None:
+            self._html = str(self.soup)
+        return self._html
+
+    @property
+    def html_lower(self):
+        # Markers are matched case-insensitively; lowered once per page, not once per stage
+        if self._html_lower is None:
+            self._html_lower = self.html.lower()
+        return self._html_lower
+
+
+class ProcessingStage:
+    """Base class for a step of the HTML processing pipeline.
+
+    Inline stages implement process(page). Stages with kind 'io' or 'cpu' split
+    their work in three: prepare(page) runs on the worker thread and returns a
+    picklable payload, compute(payload) runs on the executor and must not touch
+    the page, and apply(page, result) runs on the worker thread again once the
+    inline stages are done.
+    """
+
+    name = None
+    kind = 'inline'
+    # Stages whose output this one reads; it is prepared only after they have been applied
+    after = ()
+
+    def applies_to(self, page):
+        """Finer check after the registry's markers matched; still must not modify the page."""
+        return True
+
+    def process(self, page):
+        result = self.compute(self.prepare(page))
+        self.apply(page, result)
+
+    def prepare(self, page):
+        return None
+
+    @staticmethod
+    def compute(payload):
+        return None
+
+    def apply(self, page, result):
+        pass
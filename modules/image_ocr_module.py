@@ -0,0 +1,178 @@
+# ./00_html_content_collector/modules/image_ocr_module.py
+import os
+import hashlib
+from urllib.parse import urljoin, urlparse
+from base_module import ProcessingStage
+from config import get_manifest
+from db_manager import load_ocr_results, save_ocr_results
+from metrics import metrics
+from scraper import get_version_path, get_asset_path
+from custom_exceptions import ConfigurationError, DatabaseError
+from logger import setup_logging, log_info, log_error
+
+# Initialize loggers
+loggers = setup_logging(output_dir='logs', doc_name='image_ocr_module', version='v1')
+
+# Overridable per source with an `ocr:` mapping next to processing_stages
+OCR_DEFAULTS = {
+    'languages': 'eng',
+    'min_bytes': 4 * 1024,      # icons, bullets and spacers are smaller than this
+    'min_width': 120,
+    'min_height': 60,
+    'max_images_per_page': 40,
+    'timeout': 30,              # seconds per image
+}
+OCR_IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.gif', '.webp', '.bmp', '.tif', '.tiff')
+
+
+def get_ocr_settings(doc_name=None):
+    source = next((source for source in get_manifest().get('documentation_sources', []) if source.get('name') == doc_name), None)
+    overrides = (source or {}).get('ocr') or {}
+    if not isinstance(overrides, dict):
+        raise ConfigurationError(f"ocr settings for {doc_name} must be a mapping")
+    return {**OCR_DEFAULTS, **overrides}
+
+
+def is_decorative(img, settings):
+    """Images the markup itself marks as decoration, or declares too small to hold readable text."""
+    if img.get('role') in ('presentation', 'none') or img.get('aria-hidden') == 'true':
+        return True
+    if not urlparse(img['src']).path.lower().endswith(OCR_IMAGE_EXTENSIONS):
+        return True
+    for attribute, minimum in (('width', settings['min_width']), ('height', settings['min_height'])):
+        value = str(img.get(attribute, '')).strip().removesuffix('px')
+        if value.isdigit() and int(value) < minimum:
+            return True
+    return False
+
+
+def run_ocr(image, settings):
+    try:
+        import pytesseract
+    except ImportError:
+        raise ConfigurationError("The ocr stage needs pytesseract and the tesseract binary")
+    try:
+        text = pytesseract.image_to_string(image.convert('L'), lang=settings['languages'], timeout=settings['timeout'])
+    except pytesseract.TesseractNotFoundError:
+        raise ConfigurationError("The ocr stage needs the tesseract binary on PATH")
+    return ' '.join(text.split())
+
+
+class ImageOcrStage(ProcessingStage):
+    """Text in downloaded images (charts, screenshots, diagrams), recognized on the process pool.
+
+    All images of a page go to the pool as one batch. Results are cached in the
+    ocr_cache table by content hash, so an image shared by many pages or carried
+    over unchanged into a new version is recognized once. Similar-looking images
+    are not matched: text lives in details any downscaled hash throws away.
+    """
+
+    name = 'ocr'
+    kind = 'cpu'
+    after = ('assets',)
+
+    def __init__(self):
+        self.settings = {}
+
+    def applies_to(self, page):
+        return page.doc_name is not None and page.version is not None
+
+    def _settings(self, doc_name):
+        if doc_name not in self.settings:
+            self.settings[doc_name] = get_ocr_settings(doc_name)
+        return self.settings[doc_name]
+
+    def _local_path(self, src, page, version_path):
+        # The assets stage rewrites src to a path relative to the version directory
+        local_path = os.path.join(version_path, src)
+        if not urlparse(src).scheme and os.path.isfile(local_path):
+            return local_path
+        return get_asset_path(version_path, 'images', urljoin(page.url, src))
+
+    def prepare(self, page):
+        settings = self._settings(page.doc_name)
+        version_path = get_version_path(page.doc_name, page.version)
+        tags, paths = [], []
+        for img in page.soup.find_all('img', src=True):
+            if len(paths) >= settings['max_images_per_page']:
+                break
+            if is_decorative(img, settings):
+                continue
+            path = self._local_path(img['src'], page, version_path)
+            try:
+                if os.path.getsize(path) < settings['min_bytes']:
+                    continue
+            except OSError:
+                # Not downloaded (failed, or filtered by the asset rules)
+                continue
+            tags.append(img)
+            paths.append(path)
+        page.stage_data[self.name] = tags
+        return paths, settings
+
+    @staticmethod
+    def compute(payload):
+        """Returns (text, source, error) per image; source is cache, ocr or skipped."""
+        paths, settings = payload
+        if not paths:
+            return []
+        results = {}
+        images = {}
+        for path in paths:
+            try:
+                with open(path, 'rb') as f:
+                    images[path] = hashlib.sha256(f.read()).hexdigest()
+            except OSError as e:
+                results[path] = (None, 'error', str(e))
+
+        try:
+            cached = load_ocr_results(set(images.values()))
+        except DatabaseError:
+            cached = {}
+        misses = {}
+        for path, content_hash in images.items():
+            if content_hash in cached:
+                results[path] = (cached[content_hash], 'cache', None)
+            else:
+                misses[path] = content_hash
+
+        if misses:
+            from PIL import Image
+
+            # Recognized text is added to `recognized`, which also catches identical files within the batch
+            recognized = {}
+            new_rows = []
+            for path, content_hash in misses.items():
+                if content_hash in recognized:
+                    results[path] = (recognized[content_hash], 'cache', None)
+                    continue
+                try:
+                    image = Image.open(path)
+                    if image.width < settings['min_width'] or image.height < settings['min_height']:
+                        results[path] = (None, 'skipped', None)
+                        continue
+                    recognized[content_hash] = run_ocr(image, settings)
+                except ConfigurationError:
+                    raise
+                except Exception as e:
+                    results[path] = (None, 'error', str(e))
+                    continue
+                results[path] = (recognized[content_hash], 'ocr', None)
+                new_rows.append((content_hash, recognized[content_hash], image.width, image.height))
+            try:
+                save_ocr_results(new_rows)
+            except DatabaseError:
+                pass
+        return [results[path] for path in paths]
+
+    def apply(self, page, result):
+        sources = {}
+        for img, (text, source, error) in zip(page.stage_data.pop(self.name), result):
+            sources[source] = sources.get(source, 0) + 1
+            metrics.inc('ocr_images', source=source)
+            if error is not None:
+                log_error(loggers, f"OCR failed for {img['src']} on {page.url}: {error}")
+            elif text:
+                img['data-ocr-text'] = text
+        if sources:
+            log_info(loggers, f"OCR on {page.url}: " + ', '.join(f"{count} {source}" for source, count in sorted(sources.items())))
@@ -0,0 +1,24 @@
+# ./00_html_content_collector/modules/preserve_module.py
+from base_module import ProcessingStage
+from content_processor import preserve_latex, preserve_math_content, preserve_code_blocks
+
+
+class LatexStage(ProcessingStage):
+    name = 'latex'
+
+    def process(self, page):
+        preserve_latex(page.soup)
+
+
+class MathStage(ProcessingStage):
+    name = 'math'
+
+    def process(self, page):
+        preserve_math_content(page.soup)
+
+
+class CodeBlockStage(ProcessingStage):
+    name = 'code_blocks'
+
+    def process(self, page):
+        preserve_code_blocks(page.soup)
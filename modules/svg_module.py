@@ -0,0 +1,77 @@
+# ./00_html_content_collector/modules/svg_module.py
+import os
+import hashlib
+from urllib.parse import urljoin
+from base_module import ProcessingStage
+from content_processor import convert_svg_to_png, fetch_svg_from_iframe
+from logger import setup_logging, log_error, log_debug
+
+# Initialize loggers
+loggers = setup_logging(output_dir='logs', doc_name='svg_module', version='v1')
+
+
+def diagram_name(source):
+    # Named by content, not position: pages sharing a directory, and sections processed on their own, cannot collide
+    return hashlib.blake2b(source.encode('utf-8'), digest_size=8).hexdigest()
+
+
+def _replace_with_images(page, tags, results, label):
+    for index, (tag, (png_file, error)) in enumerate(zip(tags, results)):
+        if error is not None:
+            log_error(loggers, f"Error converting {label} {index} on {page.url}: {error}")
+            continue
+        img_tag = page.soup.new_tag('img', src=os.path.basename(png_file))
+        tag.replace_with(img_tag)
+        log_debug(loggers, f"Replaced {label} {index} with {img_tag}")
+
+
+class SvgStage(ProcessingStage):
+    """Inline <svg> diagrams are rendered to PNG on the process pool."""
+
+    name = 'svg'
+    kind = 'cpu'
+
+    def prepare(self, page):
+        svgs = page.soup.find_all('svg')
+        page.stage_data[self.name] = svgs
+        return page.directory, [str(svg) for svg in svgs]
+
+    @staticmethod
+    def compute(payload):
+        directory, svgs = payload
+        results = []
+        for svg_content in svgs:
+            try:
+                results.append((convert_svg_to_png(svg_content, directory, diagram_name(svg_content)), None))
+            except Exception as e:
+                results.append((None, str(e)))
+        return results
+
+    def apply(self, page, result):
+        _replace_with_images(page, page.stage_data.pop(self.name), result, 'SVG')
+
+
+class IframeSvgStage(ProcessingStage):
+    """SVGs embedded through iframes are downloaded and rendered on the I/O pool."""
+
+    name = 'iframe_svg'
+    kind = 'io'
+
+    def prepare(self, page):
+        iframes = page.soup.find_all('iframe', src=True)
+        page.stage_data[self.name] = iframes
+        return page.directory, [urljoin(page.url, iframe['src']) for iframe in iframes]
+
+    @staticmethod
+    def compute(payload):
+        directory, urls = payload
+        results = []
+        for url in urls:
+            try:
+                results.append((fetch_svg_from_iframe(url, directory, diagram_name(url)), None))
+            except Exception as e:
+                results.append((None, str(e)))
+        return results
+
+    def apply(self, page, result):
+        _replace_with_images(page, page.stage_data.pop(self.name), result, 'iframe')
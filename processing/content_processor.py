@@ -1,23 +1,150 @@
 # ./00_html_content_collector/content_processor.py
-from bs4 import BeautifulSoup
-import extruct
-from dateutil import parser
-from w3lib.html import get_base_url
-import bleach
+import os
+import re
+import html
+import functools
 from datetime import datetime
-from scraper import (
-    normalize_html_structure, normalize_urls, normalize_character_encoding,
-    basic_content_cleaning, normalize_whitespace, detect_language, extract_title,
-    preserve_latex, extract_and_convert_svgs, extract_and_convert_iframe_svgs,
-    preserve_katex, preserve_mathjax
-)
+from urllib.parse import urlparse, urljoin, urlunparse, parse_qs, urlencode
+from utils import retry_with_exponential_backoff
+from fetcher import fetcher
 from custom_exceptions import ParsingError, MetadataExtractionError, LanguageDetectionError
-from logger import setup_logging, log_error, log_info
+from logger import setup_logging, log_error, log_info, log_warning, log_debug
+
+# bs4, extruct, dateutil, w3lib, bleach, langdetect and cairosvg are imported by the
+# functions that use them, so importing this module stays cheap
 
 # Initialize loggers
 loggers = setup_logging(output_dir='logs', doc_name='content_processor', version='v1')
 
+def normalize_html_structure(soup):
+    # Ensure proper nesting and close unclosed tags
+    # BeautifulSoup does this automatically when parsing
+
+    # Remove empty tags
+    for tag in soup.find_all():
+        if len(tag.get_text(strip=True)) == 0 and len(tag.find_all()) == 0:
+            tag.extract()
+
+    return soup
+
+def normalize_whitespace(text):
+    # Remove excessive whitespace and normalize line breaks
+    return re.sub(r'\s+', ' ', text).strip()
+
+def normalize_character_encoding(soup):
+    # Replace HTML entities with Unicode equivalents
+    for text in soup.find_all(text=True):
+        text.replace_with(html.unescape(str(text)))
+
+    return soup
+
+def normalize_urls(soup, base_url):
+    for a in soup.find_all('a', href=True):
+        a['href'] = urljoin(base_url, a['href'])
+
+        # Remove tracking parameters
+        parsed = urlparse(a['href'])
+        qd = parse_qs(parsed.query, keep_blank_values=True)
+        filtered = {k: v for k, v in qd.items() if not k.startswith('utm_')}
+        parsed = parsed._replace(query=urlencode(filtered, doseq=True))
+        a['href'] = urlunparse(parsed)
+
+    return soup
+
+def basic_content_cleaning(soup):
+    from bs4 import Comment
+
+    # Remove HTML comments
+    for comment in soup.find_all(text=lambda text: isinstance(text, Comment)):
+        comment.extract()
+
+    # Strip out invisible text
+    for hidden in soup.find_all(style=re.compile(r'display:\s*none')):
+        hidden.extract()
+
+    return soup
+
+def detect_language(text):
+    from langdetect import detect
+
+    try:
+        return detect(text)
+    except Exception:
+        log_warning(loggers, "Failed to detect language", exc_info=True)
+        return None
+
+def handle_metadata_errors(func):
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        try:
+            return func(*args, **kwargs)
+        except AttributeError as e:
+            log_warning(loggers, f"Metadata extraction error: {str(e)}")
+            return None
+    return wrapper
+
+@handle_metadata_errors
+def extract_title(soup):
+    return soup.title.string
+
+def preserve_mathjax(content):
+    # Preserve inline math
+    content = re.sub(r'\$(.+?)\$', r'<span class="math-inline">\1</span>', content)
+    # Preserve block math
+    content = re.sub(r'\$\$(.+?)\$\$', r'<div class="math-block">\1</div>', content, flags=re.DOTALL)
+    return content
+
+def preserve_katex(content):
+    # Preserve inline KaTeX
+    content = re.sub(r'\\(.+?)\\', r'<span class="katex-inline">\1</span>', content)
+    # Preserve block KaTeX
+    content = re.sub(r'\\\[(.+?)\\\]', r'<div class="katex-block">\1</div>', content, flags=re.DOTALL)
+    return content
+
+def preserve_latex(soup):
+    for latex_element in soup.find_all('script', type='math/tex'):
+        latex_element['class'] = latex_element.get('class', []) + ['preserved-latex']
+        latex_element.string = f'$${latex_element.string}$$'
+
+def convert_svg_to_png(svg_content, base_dir, name):
+    """Render one SVG document to diagram_<name>.png in base_dir and return the PNG path."""
+    import cairosvg
+
+    os.makedirs(base_dir, exist_ok=True)
+    svg_file = os.path.join(base_dir, f'diagram_{name}.svg')
+    png_file = os.path.join(base_dir, f'diagram_{name}.png')
+    with open(svg_file, 'w') as file:
+        file.write(svg_content)
+    try:
+        cairosvg.svg2png(url=svg_file, write_to=png_file)
+    finally:
+        os.remove(svg_file)  # Clean up SVG file after conversion
+    return png_file
+
+@retry_with_exponential_backoff
+def fetch_svg_from_iframe(url, base_dir, name):
+    import cairosvg
+
+    response = fetcher.get(url)
+    response.raise_for_status()
+    svg_content = response.text
+
+    # Save the SVG content to a temporary file
+    svg_file = os.path.join(base_dir, f'temp_{name}.svg')
+    with open(svg_file, 'w') as file:
+        file.write(svg_content)
+
+    # Convert the SVG to PNG
+    png_file = os.path.join(base_dir, f'diagram_{name}.png')
+    cairosvg.svg2png(url=svg_file, write_to=png_file)
+    os.remove(svg_file)  # Clean up SVG file after conversion
+    log_debug(loggers, f"Converted iframe SVG to PNG: {svg_file} to {png_file}")
+
+    return png_file
+
 def clean_and_normalize_content(content, url):
+    from bs4 import BeautifulSoup
+
     try:
         soup = BeautifulSoup(content, 'html.parser')
 
@@ -41,6 +168,8 @@ def clean_and_normalize_content(content, url):
         raise
 
 def extract_and_normalize_metadata(soup):
+    from dateutil import parser
+
     metadata = {}
     try:
         for meta in soup.find_all('meta'):
@@ -62,6 +191,10 @@ def extract_and_normalize_metadata(soup):
         raise
 
 def extract_metadata(soup, url, html_content):
+    import extruct
+    from dateutil import parser
+    from w3lib.html import get_base_url
+
     try:
         metadata = {
             'url': url,
@@ -111,14 +244,14 @@ def extract_metadata(soup, url, html_content):
         log_error(loggers, MetadataExtractionError(f"Failed to extract metadata: {str(e)}", url=url, partial_metadata=metadata))
         raise
 
-def process_html_content(soup, url, directory):
+def process_html_content(soup, url, directory, doc_name=None, version=None, html=None):
+    # Stages (math, code blocks, SVGs, assets, ...) are plugins registered in module_loader
+    from module_loader import run_stages
+    from base_module import PageContext
+
     try:
-        preserve_latex(soup)
-        preserve_math_content(soup)
-        preserve_code_blocks(soup)
-        extract_and_convert_svgs(soup, directory)
-        extract_and_convert_iframe_svgs(soup, directory, url)
-        log_info(loggers, f"Successfully processed HTML content for URL: {url}")
+        stages = run_stages(PageContext(url, soup, directory, doc_name=doc_name, version=version, html=html))
+        log_info(loggers, f"Successfully processed HTML content for URL: {url}", stages=stages)
     except Exception as e:
         log_error(loggers, ParsingError(f"Failed to process HTML content: {str(e)}", url=url))
         raise
@@ -129,14 +262,11 @@ def preserve_math_content(soup):
         math_element.string = preserve_katex(str(math_element))
 
 def preserve_code_blocks(soup):
+    import bleach
+
     for code_block in soup.find_all(['pre', 'code']):
         code_block.string = bleach.clean(str(code_block), tags=['pre', 'code'], attributes={'class': []})
 
-# Note: Functions like extract_title, preserve_latex, extract_and_convert_svgs,
-# extract_and_convert_iframe_svgs, preserve_mathjax, and preserve_katex should be
-# updated similarly with proper error handling and logging.
-
-
 if __name__ == "__main__":
     # Example usage
     try:
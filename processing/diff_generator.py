@@ -1,4 +1,5 @@
 # ./00_html_content_collector/diff_generator.py
+import difflib
 import hashlib
 from datetime import datetime
 import logging
@@ -138,6 +139,50 @@ def generate_optimized_diff(old_content, new_content, doc_name, version, chunk_s
         log_error(logger, ParsingError(f"Error generating optimized diff: {str(e)}", doc_name=doc_name, version=version))
         raise
 
+def generate_section_diff(old_content, new_content, doc_name, version):
+    """Diff of two versions of a page that only looks inside the sections whose hashes differ.
+
+    Sections are matched by hash, so unchanged, moved or repeated sections cost
+    a hash comparison; the line diff runs on the changed ranges alone.
+    """
+    from bs4 import BeautifulSoup
+    from section_hasher import SectionTree
+
+    try:
+        old_tree = SectionTree(BeautifulSoup(old_content, 'html.parser'))
+        new_tree = SectionTree(BeautifulSoup(new_content, 'html.parser'))
+        formatted_diff = {
+            'metadata': {
+                'doc_name': doc_name,
+                'version': version,
+                'timestamp': datetime.now().isoformat(),
+                'old_root': old_tree.root,
+                'new_root': new_tree.root,
+                'shell_changed': old_tree.shell_hash != new_tree.shell_hash,
+            },
+            'sections': []
+        }
+
+        matcher = difflib.SequenceMatcher(None, old_tree.section_hashes, new_tree.section_hashes, autojunk=False)
+        for operation, old_start, old_end, new_start, new_end in matcher.get_opcodes():
+            if operation == 'equal':
+                continue
+            old_text = '\n'.join(old_tree.section_html(index) for index in range(old_start, old_end))
+            new_text = '\n'.join(new_tree.section_html(index) for index in range(new_start, new_end))
+            formatted_diff['sections'].append({
+                'operation': operation,
+                'old_sections': [old_start, old_end],
+                'new_sections': [new_start, new_end],
+                'operations': format_chunk_diff(myers_diff(old_text, new_text), old_text.splitlines(), new_text.splitlines()),
+            })
+
+        log_info(logger, f"Generated section diff for {doc_name} version {version}: "
+                         f"{len(formatted_diff['sections'])} changed ranges in {len(new_tree.sections)} sections")
+        return formatted_diff
+    except Exception as e:
+        log_error(logger, ParsingError(f"Error generating section diff: {str(e)}", doc_name=doc_name, version=version))
+        raise
+
 def format_chunk_diff(diff, old_chunk, new_chunk):
     try:
         formatted_ops = []
@@ -0,0 +1,120 @@
+# ./00_html_content_collector/fingerprint.py
+import re
+import hashlib
+from config import get_manifest
+from custom_exceptions import ConfigurationError
+from logger import setup_logging, log_warning
+
+# Initialize loggers
+loggers = setup_logging(output_dir='logs', doc_name='fingerprint', version='v1')
+
+# Site chrome, embeds and ad slots: none of it is documentation content
+DEFAULT_IGNORE_SELECTORS = (
+    'script', 'style', 'noscript', 'template', 'iframe', 'nav', 'header', 'footer', 'aside',
+    'input[type="hidden"]', 'ins.adsbygoogle', '[id^="google_ads"]', '[class*="advert"]',
+)
+# Attributes that change on every render; a trailing * matches a prefix
+DEFAULT_VOLATILE_ATTRIBUTES = (
+    'nonce', 'integrity', 'csrf-token', 'data-csrf', 'data-csrf-token', 'data-nonce', 'data-timestamp',
+    'data-build', 'data-build-id', 'data-request-id', 'data-reactid', 'data-reactroot', 'data-v-*', 'data-ad-*',
+)
+# Generated IDs (ember123, react-aria-5, :r1:) keep their shape but not their counter
+ID_ATTRIBUTES = frozenset(('id', 'for', 'headers', 'aria-labelledby', 'aria-describedby', 'aria-controls', 'aria-owns'))
+DIGITS_PATTERN = re.compile(r'\d+')
+FINGERPRINT_DIGEST_SIZE = 16
+
+
+def get_fingerprint_settings(doc_name=None):
+    """Ignore selectors and volatile attributes for a source: the defaults plus its `fingerprint:` additions.
+
+    Example core_manifest.yaml entry:
+
+        documentation_sources:
+          - name: numpy
+            url: https://numpy.org/doc/stable/
+            fingerprint:
+              ignore_selectors: ['.last-updated', '#feedback']
+              volatile_attributes: ['data-commit']
+    """
+    import soupsieve
+
+    source = next((source for source in get_manifest().get('documentation_sources', []) if source.get('name') == doc_name), None)
+    overrides = (source or {}).get('fingerprint') or {}
+    if not isinstance(overrides, dict):
+        raise ConfigurationError(f"fingerprint settings for {doc_name} must be a mapping")
+    selectors = DEFAULT_IGNORE_SELECTORS + tuple(overrides.get('ignore_selectors') or ())
+    attributes = DEFAULT_VOLATILE_ATTRIBUTES + tuple(overrides.get('volatile_attributes') or ())
+    try:
+        ignore = soupsieve.compile(', '.join(selectors))
+    except soupsieve.SelectorSyntaxError as e:
+        raise ConfigurationError(f"Invalid fingerprint ignore_selectors for {doc_name}: {str(e)}")
+    return {
+        'ignore': ignore,
+        'volatile_attributes': frozenset(name for name in attributes if not name.endswith('*')),
+        'volatile_prefixes': tuple(name[:-1] for name in attributes if name.endswith('*')),
+    }
+
+
+_settings_cache = {}
+
+
+def _settings(doc_name):
+    if doc_name not in _settings_cache:
+        _settings_cache[doc_name] = get_fingerprint_settings(doc_name)
+    return _settings_cache[doc_name]
+
+
+def _content_tokens(root, settings):
+    """Tags with their stable attributes and whitespace-normalized text, in document order."""
+    from bs4 import NavigableString, Tag
+
+    ignored = {id(element) for element in settings['ignore'].select(root)}
+    volatile_attributes, volatile_prefixes = settings['volatile_attributes'], settings['volatile_prefixes']
+    stack = [root]
+    while stack:
+        node = stack.pop()
+        if isinstance(node, Tag):
+            if id(node) in ignored:
+                continue
+            attributes = []
+            for name, value in node.attrs.items():
+                if name in volatile_attributes or name.startswith(volatile_prefixes):
+                    continue
+                value = ' '.join(value) if isinstance(value, list) else value
+                if name in ID_ATTRIBUTES:
+                    value = DIGITS_PATTERN.sub('0', value)
+                attributes.append(f'{name}={value}')
+            yield f"<{node.name} {' '.join(sorted(attributes))}>"
+            stack.extend(reversed(node.contents))
+        elif type(node) is NavigableString:
+            # Comments, doctypes and CDATA are subclasses and are skipped
+            text = ' '.join(node.split())
+            if text:
+                yield text
+
+
+def content_fingerprint(content, doc_name=None, soup=None, content_type='text/html'):
+    """Hash of a page's main content that ignores boilerplate, volatile attributes and whitespace.
+
+    One BLAKE2b hash serves both the checksum table and the content hash
+    manager. Pass `soup` when the page is already parsed.
+    """
+    if not content_type.startswith(('text/html', 'application/xhtml+xml')):
+        return hashlib.blake2b(' '.join(content.split()).encode('utf-8'), digest_size=FINGERPRINT_DIGEST_SIZE).hexdigest()
+    if soup is None:
+        from bs4 import BeautifulSoup
+
+        soup = BeautifulSoup(content, 'html.parser')
+    root = soup.find('main') or soup.find(attrs={'role': 'main'}) or soup.find('article') or soup.body or soup
+    digest = hashlib.blake2b(digest_size=FINGERPRINT_DIGEST_SIZE)
+    try:
+        for token in _content_tokens(root, _settings(doc_name)):
+            digest.update(token.encode('utf-8'))
+            digest.update(b'\x00')
+    except ConfigurationError:
+        raise
+    except Exception as e:
+        # Never lose change detection over a fingerprinting problem: fall back to the raw content
+        log_warning(loggers, f"Could not fingerprint the main content, hashing the whole page: {str(e)}")
+        digest = hashlib.blake2b(content.encode('utf-8'), digest_size=FINGERPRINT_DIGEST_SIZE)
+    return digest.hexdigest()
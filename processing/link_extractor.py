@@ -1,26 +1,77 @@
 # ./00_html_content_collector/link_extractor.py
-from bs4 import BeautifulSoup
-from selenium.webdriver.common.by import By
 import re
-from urllib.parse import urljoin
-from scraper import normalize_url, is_valid_link, get_canonical_url
+import requests
+from urllib.parse import urljoin, urlparse
+from utils import normalize_url, short_url_resolver
+from fetcher import fetcher
+from cache import caches
 from custom_exceptions import ParsingError
-from logger import setup_logging, log_error, log_info, log_debug
+from logger import setup_logging, log_error, log_info, log_debug, log_warning
 
 # Initialize loggers
 loggers = setup_logging(output_dir='logs', doc_name='link_extractor', version='v1')
 
+# is_valid_link checks every link of every page, and most pages share their navigation links
+canonical_url_cache = caches.create('canonical_urls', max_entries=50000, ttl=3600)
+
+def _head_canonical_url(url):
+    response = fetcher.head(url, allow_redirects=True)
+    if 'Link' in response.headers:
+        links = requests.utils.parse_header_links(response.headers['Link'])
+        for link in links:
+            if link.get('rel') == 'canonical':
+                return link.get('url')
+    return url
+
+def get_canonical_url_from_head(url):
+    # Failed requests are not cached
+    try:
+        return canonical_url_cache.get_or_load(url, lambda: _head_canonical_url(url))
+    except requests.RequestException:
+        log_warning(loggers, f"Error checking canonical URL for {url}")
+    return url
+
+def get_canonical_url(soup, url):
+    canonical_tag = soup.find('link', rel='canonical')
+    if canonical_tag and canonical_tag.get('href'):
+        canonical_url = canonical_tag['href']
+        # Ensure the canonical URL is absolute
+        return urljoin(url, canonical_url)
+    return url  # If no canonical URL is specified, return the original URLs
+
+def is_valid_link(url, base_domain, start_path):
+    normalized_url = normalize_url(url)
+    parsed_url = urlparse(normalized_url)
+    if parsed_url.scheme in ["http", "https"] and \
+       parsed_url.netloc == base_domain and \
+       parsed_url.path.startswith(start_path):
+        canonical_url = get_canonical_url_from_head(normalized_url)
+        if canonical_url != normalized_url:
+            log_debug(loggers, f"Using canonical URL: {canonical_url} instead of {normalized_url}")
+            return is_valid_link(canonical_url, base_domain, start_path)
+        log_debug(loggers, f"Valid link found: {normalized_url}")
+        return True
+    log_debug(loggers, f"Invalid link skipped: {normalized_url}")
+    return False
+
+LINK_TAGS = ('a', 'img', 'video', 'audio', 'source', 'iframe')
+
 def extract_links(url, content, base_domain, start_path):
+    from bs4 import BeautifulSoup
+
     try:
         if not isinstance(content, str):
             return set(), set()
         soup = BeautifulSoup(content, 'html.parser')
         links = set()
         pagination_links = extract_pagination_links(soup, url)
-        for link in soup.find_all(['a', 'img', 'video', 'audio', 'source', 'iframe'], href=True, src=True):
-            href = link.get('href') or link.get('src')
-            full_url = urljoin(url, href)
-            normalized_url = normalize_url(full_url)
+        # href or src; keyword filters would require both
+        full_urls = [urljoin(url, link.get('href') or link.get('src'))
+                     for link in soup.find_all(lambda tag: tag.name in LINK_TAGS and (tag.has_attr('href') or tag.has_attr('src')))]
+        # All short links of the page are expanded together, before normalizing
+        expanded = short_url_resolver.resolve_many(full_urls)
+        for full_url in full_urls:
+            normalized_url = normalize_url(expanded.get(full_url, full_url))
             if is_valid_link(normalized_url, base_domain, start_path):
                 links.add(normalized_url)
         log_debug(loggers, f"Links extracted: {links}")
@@ -58,16 +109,21 @@ def extract_pagination_links(soup, base_url):
         return set()
 
 def extract_links_selenium(driver, base_domain, start_path):
+    from bs4 import BeautifulSoup
+    from selenium.webdriver.common.by import By
+
     try:
         links = set()
         pagination_links = set()
-        for a in driver.find_elements(By.TAG_NAME, 'a'):
-            href = a.get_attribute('href')
+        anchors = [(a.get_attribute('href'), a.text) for a in driver.find_elements(By.TAG_NAME, 'a')]
+        expanded = short_url_resolver.resolve_many(href for href, _ in anchors if href)
+        for href, text in anchors:
+            href = expanded.get(href, href)
             if href and is_valid_link(href, base_domain, start_path):
                 soup = BeautifulSoup(driver.page_source, 'html.parser')
                 canonical_href = get_canonical_url(soup, href)
                 links.add(canonical_href)
-                if re.search(r'Next|Próximo|\d+', a.text):
+                if re.search(r'Next|Próximo|\d+', text):
                     pagination_links.add(canonical_href)
         log_info(loggers, f"Extracted {len(links)} links and {len(pagination_links)} pagination links using Selenium")
         return links, pagination_links
@@ -0,0 +1,130 @@
+# ./00_html_content_collector/near_duplicate.py
+import re
+import hashlib
+import threading
+from collections import Counter
+from config import get_manifest
+from db_manager import find_simhash_candidates, save_simhash
+from custom_exceptions import ConfigurationError, DatabaseError
+from logger import setup_logging, log_error, log_info
+
+# Initialize loggers
+loggers = setup_logging(output_dir='logs', doc_name='near_duplicate', version='v1')
+
+# Overridable per source with a `near_duplicates:` mapping
+NEAR_DUPLICATE_DEFAULTS = {
+    'enabled': True,
+    'max_distance': 3,   # differing SimHash bits; the 4 x 16-bit bands find every page this close
+    'shingle_size': 4,   # words per shingle
+    'min_words': 50,     # shorter pages are never treated as duplicates
+}
+SIMHASH_BITS = 64
+SIMHASH_BANDS = 4
+BAND_BITS = SIMHASH_BITS // SIMHASH_BANDS
+# Navigation and chrome shared by every page of a site, left out of the fingerprint
+BOILERPLATE_TAGS = frozenset(('script', 'style', 'noscript', 'template', 'nav', 'header', 'footer', 'aside'))
+WORD_PATTERN = re.compile(r'\w+')
+
+
+def get_near_duplicate_settings(doc_name=None):
+    source = next((source for source in get_manifest().get('documentation_sources', []) if source.get('name') == doc_name), None)
+    overrides = (source or {}).get('near_duplicates') or {}
+    if not isinstance(overrides, dict):
+        raise ConfigurationError(f"near_duplicates settings for {doc_name} must be a mapping")
+    settings = {**NEAR_DUPLICATE_DEFAULTS, **overrides}
+    if not 0 <= settings['max_distance'] < SIMHASH_BANDS:
+        raise ConfigurationError(f"near_duplicates max_distance for {doc_name} must be between 0 and {SIMHASH_BANDS - 1}")
+    return settings
+
+
+def page_words(soup):
+    """Lowercased words of the page's main content, without navigation, headers and footers."""
+    from bs4 import NavigableString
+
+    root = soup.find('main') or soup.find(attrs={'role': 'main'}) or soup.find('article') or soup.body or soup
+    words = []
+    for text in root.find_all(string=True):
+        # Comments, doctypes and CDATA are NavigableString subclasses
+        if type(text) is not NavigableString or any(parent.name in BOILERPLATE_TAGS for parent in text.parents):
+            continue
+        words.extend(WORD_PATTERN.findall(text.lower()))
+    return words
+
+
+def simhash(words, shingle_size=4):
+    """64-bit SimHash over the distinct word shingles of a text."""
+    shingles = {' '.join(words[i:i + shingle_size]) for i in range(max(len(words) - shingle_size + 1, 1))}
+    digests = [hashlib.blake2b(shingle.encode('utf-8'), digest_size=SIMHASH_BITS // 8).digest() for shingle in shingles]
+    # Count set bits per position byte by byte: one Counter pass per byte instead of 64 bit tests per shingle
+    value = 0
+    for position in range(SIMHASH_BITS // 8):
+        bit_counts = [0] * 8
+        for byte, count in Counter(digest[position] for digest in digests).items():
+            for bit in range(8):
+                if byte & (0x80 >> bit):
+                    bit_counts[bit] += count
+        for count in bit_counts:
+            value = (value << 1) | (count * 2 > len(digests))
+    return value
+
+
+def simhash_bands(value):
+    return [(value >> (BAND_BITS * band)) & ((1 << BAND_BITS) - 1) for band in range(SIMHASH_BANDS)]
+
+
+def hamming_distance(a, b):
+    return bin(a ^ b).count('1')
+
+
+def _to_signed(value):
+    # SQLite integers are signed 64-bit
+    return value - (1 << SIMHASH_BITS) if value >= 1 << (SIMHASH_BITS - 1) else value
+
+
+class NearDuplicateIndex:
+    """SimHash index of the pages processed per documentation version, kept in the page_simhashes table.
+
+    A page within max_distance bits of an already processed page is recorded as
+    a duplicate of it and not processed or stored again. Only original pages are
+    candidates, so every duplicate links directly to a processed page.
+    """
+
+    def __init__(self):
+        self.settings = {}
+        self.lock = threading.Lock()
+
+    def _settings(self, doc_name):
+        if doc_name not in self.settings:
+            self.settings[doc_name] = get_near_duplicate_settings(doc_name)
+        return self.settings[doc_name]
+
+    def check(self, soup, url, doc_name, version):
+        """The URL of a processed page this one nearly duplicates, or None; records the page either way."""
+        settings = self._settings(doc_name)
+        if not settings['enabled']:
+            return None
+        words = page_words(soup)
+        if len(words) < settings['min_words']:
+            return None
+        value = simhash(words, settings['shingle_size'])
+        bands = simhash_bands(value)
+        scope = f'{doc_name}/{version}'
+        try:
+            # Check and record together, so two copies fetched at once cannot both pass as originals
+            with self.lock:
+                match = None
+                for candidate_url, candidate in find_simhash_candidates(scope, bands, url):
+                    distance = hamming_distance(value, candidate & ((1 << SIMHASH_BITS) - 1))
+                    if distance <= settings['max_distance'] and (match is None or distance < match[1]):
+                        match = (candidate_url, distance)
+                save_simhash(scope, url, _to_signed(value), bands, *(match or (None, None)))
+        except DatabaseError as e:
+            log_error(loggers, f"Near-duplicate lookup failed for {url}, processing it: {e.log_message()}")
+            return None
+        if match is not None:
+            log_info(loggers, f"{url} is a near duplicate of {match[0]} ({match[1]} bits differ)")
+            return match[0]
+        return None
+
+
+near_duplicates = NearDuplicateIndex()
@@ -0,0 +1,171 @@
+# ./00_html_content_collector/section_hasher.py
+import re
+import hashlib
+from db_manager import load_page_sections, save_page_sections
+from custom_exceptions import DatabaseError
+from logger import setup_logging, log_error, log_info
+
+# Initialize loggers
+loggers = setup_logging(output_dir='logs', doc_name='section_hasher', version='v1')
+
+HEADING_TAGS = ('h1', 'h2', 'h3', 'h4', 'h5', 'h6')
+# Wrappers that are descended into when they hold headings somewhere below (Sphinx's div.section, <section>, ...)
+CONTAINER_TAGS = ('main', 'article', 'section', 'div', 'body')
+# Blocks that always form a section of their own
+STANDALONE_TAGS = ('pre', 'table', 'figure')
+SLOT_TAG = 'x-section-slot'
+BLOCK_TAG = 'x-section-block'
+SLOT_PATTERN = re.compile(rf'<{SLOT_TAG} data-slot="(\d+)"></{SLOT_TAG}>')
+
+
+def _hash(*parts):
+    digest = hashlib.blake2b(digest_size=16)
+    for part in parts:
+        digest.update(part.encode('utf-8'))
+        digest.update(b'\x00')
+    return digest.hexdigest()
+
+
+def _has_headings(tag):
+    if tag.find(HEADING_TAGS, recursive=False) is not None:
+        return True
+    return any(_has_headings(child) for child in tag.find_all(CONTAINER_TAGS, recursive=False))
+
+
+def _leaf_blocks(container):
+    from bs4 import NavigableString, Tag
+
+    blocks = []
+    for child in list(container.children):
+        if isinstance(child, Tag):
+            if child.name in CONTAINER_TAGS and _has_headings(child):
+                blocks.extend(_leaf_blocks(child))
+            else:
+                blocks.append(child)
+        elif type(child) is NavigableString and child.strip():
+            blocks.append(child)
+    return blocks
+
+
+class SectionTree:
+    """Merkle tree of a page: block hashes, section hashes over them, and a root over the sections and the shell.
+
+    Building it replaces every block of the main content with a numbered slot,
+    so `soup` is left as the page shell (head, navigation, footer). Sections
+    start at headings; code blocks, tables and figures are sections of their own.
+    """
+
+    def __init__(self, soup, salt=''):
+        from bs4 import Tag
+
+        self.soup = soup
+        root = soup.find('main') or soup.find(attrs={'role': 'main'}) or soup.find('article') or soup.body or soup
+        self.blocks = []
+        self.sections = []
+        current = None
+        for block in _leaf_blocks(root):
+            is_tag = isinstance(block, Tag)
+            if is_tag and block.name in HEADING_TAGS:
+                current = []
+                self.sections.append(current)
+            elif is_tag and (block.name in STANDALONE_TAGS or block.find(STANDALONE_TAGS) is not None):
+                self.sections.append([len(self.blocks)])
+                self.blocks.append(block)
+                current = None
+                continue
+            elif current is None:
+                current = []
+                self.sections.append(current)
+            current.append(len(self.blocks))
+            self.blocks.append(block)
+
+        # The salt (the stages that produced the stored outputs) goes into every block hash and the shell hash,
+        # so after a pipeline change no stored output matches and the whole page is processed again
+        self.block_hashes = [_hash(salt, str(block)) for block in self.blocks]
+        self.section_hashes = [_hash(*(self.block_hashes[index] for index in section)) for section in self.sections]
+        self.block_sections = {}
+        for section_index, section in enumerate(self.sections):
+            for index in section:
+                self.block_sections[index] = section_index
+        self.slots = [self.slot(index) for index in range(len(self.blocks))]
+        for block, slot in zip(self.blocks, self.slots):
+            block.replace_with(slot)
+        self.shell_hash = _hash(salt, str(soup))
+        self.root = _hash(self.shell_hash, *self.section_hashes)
+
+    def section_html(self, section_index):
+        return ''.join(str(self.blocks[index]) for index in self.sections[section_index])
+
+    def slot(self, index):
+        return self.soup.new_tag(SLOT_TAG, attrs={'data-slot': str(index)})
+
+
+def _pipeline_salt(doc_name):
+    from module_loader import stage_registry
+
+    return ','.join(spec.name for spec in stage_registry.specs_for(doc_name))
+
+
+def process_sections(soup, url, doc_name, version, process, reuse=True):
+    """Run `process(work_soup)` on the changed parts of a page only; returns (html, section metadata).
+
+    Block outputs from the previous run of this URL are taken from the
+    page_sections table; only blocks with a new hash, plus the shell if it
+    changed, go through `process`. With reuse=False everything is processed
+    again, e.g. after a pipeline change, and the stored outputs are refreshed.
+    """
+    from bs4 import BeautifulSoup
+
+    tree = SectionTree(soup, _pipeline_salt(doc_name))
+    scope = f'{doc_name}/{version}'
+    try:
+        stored = load_page_sections(scope, url) if reuse else {}
+    except DatabaseError as e:
+        log_error(loggers, f"Could not load stored sections for {url}, processing the whole page: {e.log_message()}")
+        stored = {}
+    stored_sections = {section_hash for section_hash, _ in stored.values()}
+    changed_blocks = [index for index, block_hash in enumerate(tree.block_hashes) if block_hash not in stored]
+    shell_changed = tree.shell_hash not in stored
+
+    if shell_changed:
+        # Changed blocks go back into their slots; unchanged ones stay slots and are never seen by the stages
+        work = soup
+        for index in changed_blocks:
+            wrapper = work.new_tag(BLOCK_TAG, attrs={'data-block': str(index)})
+            tree.slots[index].replace_with(wrapper)
+            wrapper.append(tree.blocks[index])
+    else:
+        work = BeautifulSoup('<html><body></body></html>', 'html.parser')
+        for index in changed_blocks:
+            wrapper = work.new_tag(BLOCK_TAG, attrs={'data-block': str(index)})
+            wrapper.append(tree.blocks[index])
+            work.body.append(wrapper)
+    if shell_changed or changed_blocks:
+        process(work)
+
+    outputs = {}
+    for wrapper in work.find_all(BLOCK_TAG):
+        index = int(wrapper['data-block'])
+        outputs[index] = wrapper.decode_contents()
+        if shell_changed:
+            wrapper.replace_with(tree.slot(index))
+    shell_output = str(work) if shell_changed else stored[tree.shell_hash][1]
+    for index, block_hash in enumerate(tree.block_hashes):
+        if index not in outputs:
+            outputs[index] = stored[block_hash][1]
+    html = SLOT_PATTERN.sub(lambda match: outputs[int(match.group(1))], shell_output)
+
+    new_rows = [(tree.block_hashes[index], tree.section_hashes[tree.block_sections[index]], outputs[index]) for index in changed_blocks]
+    if shell_changed:
+        new_rows.append((tree.shell_hash, None, shell_output))
+    if new_rows or len(stored) != len(set(tree.block_hashes)) + 1:
+        try:
+            save_page_sections(scope, url, new_rows, tree.block_hashes + [tree.shell_hash])
+        except DatabaseError as e:
+            log_error(loggers, f"Could not store sections for {url}: {e.log_message()}")
+
+    changed_sections = [index for index, section_hash in enumerate(tree.section_hashes) if section_hash not in stored_sections]
+    if stored:
+        log_info(loggers, f"{url}: {len(changed_sections)} of {len(tree.sections)} sections changed, "
+                          f"{len(changed_blocks)} of {len(tree.blocks)} blocks processed" + (", shell changed" if shell_changed else ""))
+    return html, {'root': tree.root, 'count': len(tree.sections), 'changed': changed_sections, 'shell_changed': shell_changed}
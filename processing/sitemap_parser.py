@@ -0,0 +1,188 @@
+# ./00_html_content_collector/sitemap_parser.py
+import gzip
+import queue
+import threading
+import concurrent.futures
+import xml.etree.ElementTree as ET
+from collections import namedtuple
+from datetime import datetime, timezone
+from requests.exceptions import RequestException
+from utils import get_custom_headers, normalize_url
+from fetcher import fetcher
+from logger import setup_logging, log_error, log_info, log_debug
+
+# Initialize loggers
+loggers = setup_logging(output_dir='logs', doc_name='sitemap_parser', version='v1')
+
+SitemapEntry = namedtuple('SitemapEntry', ['loc', 'lastmod', 'priority', 'changefreq'])
+
+_DONE = object()
+
+
+def _local_name(tag):
+    return tag.rsplit('}', 1)[-1]
+
+
+def parse_lastmod(value):
+    """Parse a W3C datetime from <lastmod> into a naive UTC datetime, or None."""
+    if not value:
+        return None
+    value = value.strip()
+    if value.endswith('Z'):
+        value = value[:-1] + '+00:00'
+    try:
+        parsed = datetime.fromisoformat(value)
+    except ValueError:
+        log_debug(loggers, f"Unparseable lastmod: {value}")
+        return None
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+    return parsed
+
+
+def _parse_priority(value):
+    try:
+        return float(value) if value else None
+    except ValueError:
+        return None
+
+
+def _open_stream(response, url):
+    """Return a file-like object yielding the decompressed XML bytes."""
+    raw = response.raw
+    # Lets urllib3 undo any Content-Encoding the server applied
+    raw.decode_content = True
+    content_type = response.headers.get('Content-Type', '')
+    if url.endswith('.gz') or 'gzip' in content_type:
+        return gzip.GzipFile(fileobj=raw)
+    return raw
+
+
+def iter_sitemap_document(stream):
+    """Incrementally parse one sitemap document.
+
+    Yields ('url', SitemapEntry) for <urlset> entries and ('sitemap', loc) for
+    <sitemapindex> children. Elements are discarded as soon as they have been
+    read, so memory stays flat regardless of the number of entries.
+    """
+    root = None
+    for event, elem in ET.iterparse(stream, events=('start', 'end')):
+        if event == 'start':
+            if root is None:
+                root = elem
+            continue
+
+        name = _local_name(elem.tag)
+        if name not in ('url', 'sitemap'):
+            continue
+
+        fields = {_local_name(child.tag): (child.text or '').strip() for child in elem}
+        loc = fields.get('loc')
+        if loc:
+            if name == 'url':
+                yield 'url', SitemapEntry(
+                    loc=loc,
+                    lastmod=parse_lastmod(fields.get('lastmod')),
+                    priority=_parse_priority(fields.get('priority')),
+                    changefreq=fields.get('changefreq') or None,
+                )
+            else:
+                yield 'sitemap', loc
+        # Drop parsed children from the tree
+        root.clear()
+
+
+def _fetch_and_parse(sitemap_url, session, emit, submit):
+    try:
+        with session.get(sitemap_url, stream=True, timeout=30, headers=get_custom_headers()) as response:
+            response.raise_for_status()
+            count = 0
+            for kind, value in iter_sitemap_document(_open_stream(response, sitemap_url)):
+                if kind == 'url':
+                    if not emit(value):
+                        return
+                    count += 1
+                else:
+                    submit(value)
+            log_debug(loggers, f"Read {count} entries from sitemap {sitemap_url}")
+    except RequestException as e:
+        log_error(loggers, f"Error fetching sitemap from {sitemap_url}: {e}")
+    except (ET.ParseError, OSError, EOFError) as e:
+        log_error(loggers, f"Error parsing sitemap XML from {sitemap_url}: {e}")
+
+
+def iter_sitemap_entries(sitemap_url, max_workers=4, session=None, buffer_size=1000):
+    """Yield every SitemapEntry reachable from sitemap_url.
+
+    Sitemap index children are fetched concurrently; entries are handed over
+    through a bounded buffer so a slow consumer applies back-pressure instead
+    of letting parsed entries pile up in memory.
+    """
+    session = session or fetcher.new_session()
+    entries = queue.Queue(maxsize=buffer_size)
+    stop = threading.Event()
+    pending_lock = threading.Lock()
+    pending = [0]
+    seen = set()
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
+
+        def emit(entry):
+            while not stop.is_set():
+                try:
+                    entries.put(entry, timeout=0.5)
+                    return True
+                except queue.Full:
+                    continue
+            return False
+
+        def finished(_future):
+            with pending_lock:
+                pending[0] -= 1
+                if pending[0] == 0:
+                    entries.put(_DONE)
+
+        def submit(url):
+            with pending_lock:
+                if url in seen or stop.is_set():
+                    return
+                seen.add(url)
+                pending[0] += 1
+            future = executor.submit(_fetch_and_parse, url, session, emit, submit)
+            future.add_done_callback(finished)
+
+        submit(sitemap_url)
+        try:
+            while True:
+                item = entries.get()
+                if item is _DONE:
+                    break
+                yield item
+        finally:
+            # Unblock producers if the caller stopped iterating early
+            stop.set()
+            while not entries.empty():
+                entries.get_nowait()
+    log_info(loggers, f"Finished reading {len(seen)} sitemap(s) from {sitemap_url}")
+
+
+def filter_changed_entries(entries, last_updated, skipped=None):
+    """Skip entries whose lastmod is not newer than our stored copy.
+
+    last_updated maps normalized URL -> naive UTC datetime of the last time we saved it.
+    Entries without a lastmod, or that we have never stored, are always kept. The
+    normalized URLs of skipped entries are added to `skipped` if given.
+    """
+    skipped_count = 0
+    for entry in entries:
+        if entry.lastmod is not None:
+            url = normalize_url(entry.loc)
+            stored = last_updated.get(url)
+            if stored is not None and entry.lastmod <= stored:
+                skipped_count += 1
+                if skipped is not None:
+                    skipped.add(url)
+                continue
+        yield entry
+    if skipped_count:
+        log_info(loggers, f"Skipped {skipped_count} sitemap URLs unchanged since last scrape")
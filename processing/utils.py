@@ -4,115 +4,187 @@ import idna
 import requests
 import os
 import re
-import hashlib
+import time
 import random
 import logging
-from custom_exceptions import NetworkError, ParsingError
+import functools
+import threading
+import concurrent.futures
+from custom_exceptions import ParsingError
+from fetcher import fetcher
+from fingerprint import content_fingerprint
 
 logger = logging.getLogger(__name__)
 
-def normalize_url(url):
-    try:
-        if url.startswith('//'):
-            url = 'http:' + url
+SHORTENER_DOMAINS = frozenset(['bit.ly', 'tinyurl.com', 't.co', 'goo.gl'])
 
-        url = expand_shortened_url(url)
+# One alternation instead of eight separate patterns, evaluated once per query parameter
+SESSION_ID_PATTERN = re.compile(
+    r'^(?:session|sid|s|sess)$|sessionid|phpsessid|jsessionid|aspsessionid|cfid|cftoken',
+    re.IGNORECASE
+)
+MULTIPLE_SLASHES_PATTERN = re.compile(r'//+')
 
-        url, _ = urldefrag(url)
+# Selenium is not imported here, so its exceptions are recognised by class name
+RETRY_DELAY_FACTORS = {
+    'TimeoutException': ('Timeout', 1.5),
+    'WebDriverException': ('WebDriver', 3),
+}
 
-        parsed = urlparse(url)
 
-        scheme = parsed.scheme.lower()
-        netloc = parsed.netloc.lower()
+class ShortURLResolver:
+    """Expands shortened URLs with a bounded cache of resolved targets.
 
-        try:
-            netloc = netloc.encode('idna').decode('ascii')
-        except idna.IDNAError:
-            logger.warning(f"Failed to encode IDN: {netloc}")
-
-        if netloc.startswith('www.'):
-            netloc = 'www.' + netloc.replace('www.', '')
-        elif netloc.startswith('www1.') or netloc.startswith('www2.'):
-            netloc = 'www.' + netloc[5:]
-
-        if (scheme == 'http' and parsed.port == 80) or (scheme == 'https' and parsed.port == 443):
-            netloc = parsed.hostname
-
-        path = parsed.path
-
-        segments = path.split('/')
-        resolved_segments = []
-        for segment in segments:
-            if segment == '.':
-                continue
-            elif segment == '..':
-                if resolved_segments:
-                    resolved_segments.pop()
-            else:
-                resolved_segments.append(segment)
-        path = '/'.join(resolved_segments)
+    Link extractors call `resolve_many` once per page, before normalizing, so a
+    page's short links are expanded concurrently on a small thread pool. A link
+    that cannot be expanded resolves to itself, and that result is cached too.
+    """
 
-        path = re.sub(r'//+', '/', path)
+    def __init__(self, domains=SHORTENER_DOMAINS, cache_size=4096, timeout=5, max_workers=4):
+        self.domains = frozenset(domains)
+        self.timeout = timeout
+        self.max_workers = max_workers
+        self._executor = None
+        self._executor_lock = threading.Lock()
+        self.resolve = functools.lru_cache(maxsize=cache_size)(self._resolve)
 
-        if path:
-            _, ext = os.path.splitext(path)
-            if not ext:
-                path = path.rstrip('/') + '/'
-            else:
-                path = path.rstrip('/')
-        else:
-            path = '/'
-
-        path = unquote(path)
-        path = quote(path, safe='/:@&=+$,')
-
-        query = parsed.query
-        if query:
-            query_params = parse_qsl(query)
-            query_params = sorted((k, v) for k, v in query_params if v and not is_session_id(k))
-            query = urlencode(query_params)
-
-        normalized = urlunparse((
-            scheme,
-            netloc,
-            path,
-            parsed.params,
-            query,
-            ''
-        ))
-
-        return normalized
-    except Exception as e:
-        logger.error(f"Error normalizing URL {url}: {str(e)}")
-        raise ParsingError(f"Failed to normalize URL: {str(e)}", url=url)
+    def is_shortened(self, url):
+        return urlparse(url).netloc in self.domains
 
-def expand_shortened_url(url):
-    shortener_domains = ['bit.ly', 'tinyurl.com', 't.co', 'goo.gl']
-    parsed = urlparse(url)
-    if parsed.netloc in shortener_domains:
+    def _resolve(self, url):
         try:
-            response = requests.head(url, allow_redirects=True, timeout=5)
+            response = fetcher.head(url, allow_redirects=True, timeout=self.timeout)
             return response.url
         except requests.RequestException as e:
-            logger.warning(f"Failed to expand shortened URL {url}: {str(e)}")
-            raise NetworkError(f"Failed to expand shortened URL: {str(e)}", url=url)
+            logger.warning(f"Failed to expand shortened URL {url}, keeping it: {str(e)}")
+            return url
+
+    def _get_executor(self):
+        with self._executor_lock:
+            if self._executor is None:
+                self._executor = concurrent.futures.ThreadPoolExecutor(max_workers=self.max_workers)
+            return self._executor
+
+    def resolve_many(self, urls):
+        """{short URL: expanded URL} for the shortened URLs among urls."""
+        shortened = sorted({url for url in urls if self.is_shortened(url)})
+        if len(shortened) <= 1:
+            return {url: self.resolve(url) for url in shortened}
+        return dict(zip(shortened, self._get_executor().map(self.resolve, shortened)))
+
+
+class URLNormalizer:
+    """Normalizes URLs with precompiled patterns and a bounded LRU memo.
+
+    Documentation pages repeat the same navigation links on every page, so most
+    calls are answered from the memo without re-parsing the URL. Normalizing never
+    touches the network; short links are expanded beforehand by ShortURLResolver.
+    """
+
+    def __init__(self, cache_size=50000):
+        self.normalize = functools.lru_cache(maxsize=cache_size)(self._normalize)
+
+    def cache_info(self):
+        return self.normalize.cache_info()
+
+    def cache_clear(self):
+        self.normalize.cache_clear()
+
+    def _normalize(self, url):
+        try:
+            if url.startswith('//'):
+                url = 'http:' + url
+
+            url, _ = urldefrag(url)
+
+            parsed = urlparse(url)
+
+            scheme = parsed.scheme.lower()
+            netloc = parsed.netloc.lower()
+
+            if not netloc.isascii():
+                try:
+                    netloc = netloc.encode('idna').decode('ascii')
+                except (UnicodeError, idna.IDNAError):
+                    logger.warning(f"Failed to encode IDN: {netloc}")
+
+            if netloc.startswith('www.'):
+                netloc = 'www.' + netloc.replace('www.', '')
+            elif netloc.startswith('www1.') or netloc.startswith('www2.'):
+                netloc = 'www.' + netloc[5:]
+
+            if (scheme == 'http' and parsed.port == 80) or (scheme == 'https' and parsed.port == 443):
+                netloc = parsed.hostname
+
+            path = parsed.path
+
+            if '.' in path:
+                segments = path.split('/')
+                resolved_segments = []
+                for segment in segments:
+                    if segment == '.':
+                        continue
+                    elif segment == '..':
+                        if resolved_segments:
+                            resolved_segments.pop()
+                    else:
+                        resolved_segments.append(segment)
+                path = '/'.join(resolved_segments)
+
+            if '//' in path:
+                path = MULTIPLE_SLASHES_PATTERN.sub('/', path)
+
+            if path:
+                _, ext = os.path.splitext(path)
+                if not ext:
+                    path = path.rstrip('/') + '/'
+                else:
+                    path = path.rstrip('/')
+            else:
+                path = '/'
+
+            path = unquote(path)
+            path = quote(path, safe='/:@&=+$,')
+
+            query = parsed.query
+            if query:
+                query_params = parse_qsl(query)
+                query_params = sorted((k, v) for k, v in query_params if v and not is_session_id(k))
+                query = urlencode(query_params)
+
+            normalized = urlunparse((
+                scheme,
+                netloc,
+                path,
+                parsed.params,
+                query,
+                ''
+            ))
+
+            return normalized
+        except Exception as e:
+            logger.error(f"Error normalizing URL {url}: {str(e)}")
+            raise ParsingError(f"Failed to normalize URL: {str(e)}", url=url)
+
+
+short_url_resolver = ShortURLResolver()
+url_normalizer = URLNormalizer()
+
+
+def normalize_url(url):
+    return url_normalizer.normalize(url)
+
+def expand_shortened_url(url):
+    if short_url_resolver.is_shortened(url):
+        return short_url_resolver.resolve(url)
     return url
 
 def is_session_id(param):
-    session_id_patterns = [
-        r'^(session|sid)$',
-        r'.*sessionid.*',
-        r'^(s|sess)$',
-        r'.*phpsessid.*',
-        r'.*jsessionid.*',
-        r'.*aspsessionid.*',
-        r'.*cfid.*',
-        r'.*cftoken.*',
-    ]
-    return any(re.match(pattern, param, re.IGNORECASE) for pattern in session_id_patterns)
+    return SESSION_ID_PATTERN.search(param) is not None
 
-def calculate_checksum(content):
-    return hashlib.md5(content.encode()).hexdigest()
+def calculate_checksum(content, doc_name=None, soup=None):
+    # Main-content fingerprint, shared with VersionedContentHashManager; build stamps and nonces do not change it
+    return content_fingerprint(content, doc_name, soup)
 
 def get_custom_headers():
     user_agents = [
@@ -132,3 +204,41 @@ def get_custom_headers():
         'Upgrade-Insecure-Requests': '1'
     }
     return headers
+
+
+class RetryExhaustedException(Exception):
+    pass
+
+def _retry_delay(error):
+    if isinstance(error, requests.RequestException):
+        return 'Network', 2
+    # Walk the MRO so TimeoutException wins over its WebDriverException base
+    for cls in type(error).__mro__:
+        if cls.__name__ in RETRY_DELAY_FACTORS:
+            return RETRY_DELAY_FACTORS[cls.__name__]
+    return None
+
+def retry_with_exponential_backoff(func, max_retries=5, initial_delay=1, max_delay=60):
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        retries = 0
+        delay = initial_delay
+        while retries < max_retries:
+            try:
+                return func(*args, **kwargs)
+            except Exception as e:
+                retry = _retry_delay(e)
+                if retry is None:
+                    logger.error(f"Unexpected error occurred: {str(e)}")
+                    raise
+                kind, delay_factor = retry
+                logger.warning(f"{kind} error occurred: {str(e)}")
+
+            retries += 1
+            if retries == max_retries:
+                raise RetryExhaustedException(f"Max retries reached for {func.__name__}")
+
+            wait_time = min(delay * (delay_factor ** retries), max_delay)
+            logger.warning(f"Retrying in {wait_time:.2f} seconds...")
+            time.sleep(wait_time)
+    return wrapper